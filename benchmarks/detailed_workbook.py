@@ -0,0 +1,84 @@
+"""
+    Measures the peak memory of writing a branch sized DETAILED workbook with and without
+    the low memory (constant_memory) mode.
+
+    Each mode runs in its own process so the peak RSS of one does not hide the other.
+
+    Usage: python -m benchmarks.detailed_workbook [rows_per_tab]
+"""
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from src.model.taxinvoice import TaxInvoice, LOW_MEMORY_ENV, get_error_format, get_header_format
+from src.model.taxinvoice_branch import VBIDataRow, HEADER_VBI
+
+TABS = ['Summary', 'RCTI', 'Tax Invoice', 'Upfront Data', 'Trail Data']
+DEFAULT_ROWS = 20000
+
+
+class BenchInvoice(TaxInvoice):
+
+    def __init__(self, directory, filename):
+        TaxInvoice.__init__(self, directory, filename)
+        self.pair = None
+
+
+def new_row(index, commission):
+    return VBIDataRow(f'Broker {index % 50}', 'Lender', f'Client {index}', index, 250000 + index, '2020-07-01',
+                      commission, commission / 10, 0.8, 0, commission, commission * 0.8, 0, commission * 0.2, index)
+
+
+def write_workbook(directory, rows, low_memory, queue):
+    os.environ[LOW_MEMORY_ENV] = '1' if low_memory else '0'
+    invoice = BenchInvoice(directory, f"bench_{'low' if low_memory else 'default'}.xls")
+    invoice.pair = BenchInvoice(directory, 'bench_pair.xls')
+
+    start = time.perf_counter()
+    workbook = invoice.create_workbook(directory)
+    fmt_table_header = get_header_format(workbook)
+    fmt_error = get_error_format(workbook)
+    for tab in TABS:
+        worksheet = workbook.add_worksheet(tab)
+        for index, item in enumerate(HEADER_VBI):
+            worksheet.write(0, index, item, fmt_table_header)
+            worksheet.write(0, 16 + index, item, fmt_table_header)
+        for row in range(1, rows + 1):
+            self_row = new_row(row, 1000 + row)
+            # Every tenth row is off by a cent so some cells get the error format
+            pair_row = new_row(row, 1000 + row + (0.01 if row % 10 == 0 else 0))
+            self_row.pair = pair_row
+            pair_row.pair = self_row
+            VBIDataRow.write_row(worksheet, invoice, pair_row, row, fmt_error, tab, 'right', write_errors=False)
+            VBIDataRow.write_row(worksheet, invoice, self_row, row, fmt_error, tab)
+    workbook.close()
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on linux
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def run(rows):
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        directory += '/'
+        for low_memory in (False, True):
+            queue = context.Queue()
+            process = context.Process(target=write_workbook, args=(directory, rows, low_memory, queue))
+            process.start()
+            results[low_memory] = queue.get()
+            process.join()
+
+    print(f'{len(TABS)} tabs x {rows} rows x {2 * len(HEADER_VBI)} columns')
+    for low_memory, (elapsed, peak) in results.items():
+        mode = 'constant_memory' if low_memory else 'default'
+        print(f'{mode:>16}: {elapsed:7.2f}s  peak RSS {peak:8.1f} MB')
+    return results
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS)
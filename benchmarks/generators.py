@@ -0,0 +1,400 @@
+"""
+    Writes synthetic Loankit and Infynity commission files laid out the way each parser expects them.
+
+    Every generator writes the same records twice, once for each system, and changes about
+    mismatch_rate of the records on the Infynity side: an amount above the margin, a missing row
+    or an extra row. The counts of each change are returned so the number of errors a comparison
+    finds can be checked against them.
+
+    The branch, broker and executive summary files are real .xls files, writing them needs xlwt.
+"""
+import os
+import random
+
+import xlwt
+
+from src.model.taxinvoice_branch import (HEADER_VBI, HEADER_TRAIL, HEADER_TAXINVOICE, HEADER_RCTI, TAB_SUMMARY,
+                                         TAB_RCTI, TAB_TAX_INVOICE, TAB_UPFRONT_DATA, TAB_TRAIL_DATA, TAB_VBI_DATA)
+from src.model.taxinvoice_referrer import HEADER_REFERRER
+from src.model.executive_summary import HEADER_DE
+
+LOANKIT_PROCESS_ID = '22369'
+INFYNITY_PROCESS_ID = '15034'
+# Amounts of mismatched rows move by this much, well above any margin the comparers are run with
+MISMATCH_AMOUNT = 5.0
+
+HEADER_BROKER = ['Commission Type', 'Client', 'Commission Ref ID', 'Bank', 'Loan Balance', 'Amount Paid', 'GST Paid',
+                 'Total Amount Paid', 'Comments']
+HEADER_ES_LENDER = ['Bank', 'Bank Detailed Name', 'Settlement Amount', 'Commission Amount (Excl GST)', 'GST',
+                    'Commission Amount Incl. GST']
+HEADER_ES_BRANCH = ['Branch ID', 'Branch Name', 'Upfront Commission Excl. GST', 'Trail Commission Excl. GST',
+                    'VBI Commission Excl. GST', 'Total Commission Received']
+HEADER_ES_BROKER = ['Broker ID', 'Broker Name', 'Opening Carried Forward Balance', 'Total Banked Amount',
+                    'Closing Carried Forward Balance']
+HEADER_ES_REFERRER = ['Branch ID', 'Branch Company Name', 'Referrer Name', 'Referrer Key',
+                      'Opening Carried Forward Balance', 'Commission Amount Paid Excl. GST',
+                      'Commission Amount Paid GST', 'Commission Amount Paid Incl. GST', 'Total Banked Amount',
+                      'Closing Carried Forward Balance']
+LENDERS = ['ANZ', 'CBA', 'NAB', 'Westpac', 'Macquarie', 'ING', 'Suncorp', 'Bankwest']
+COMMISSION_TYPES = ['Upfront', 'Trail', 'VBI']
+ES_LENDER_TABS = ['Lender Upfront Records', 'Lender Trail Records', 'Lender VBI Records']
+
+
+class Mismatches:
+    """
+        Counts the changes made to the Infynity side of the generated files.
+    """
+
+    def __init__(self):
+        self.amount = 0
+        self.missing = 0
+        self.extra = 0
+
+    @property
+    def total(self):
+        return self.amount + self.missing + self.extra
+
+    def serialize(self):
+        return {'amount': self.amount, 'missing': self.missing, 'extra': self.extra}
+
+
+def mismatched(rnd: random.Random, rows: list, mismatch_rate, amount_columns: list, mismatches: Mismatches,
+               new_row=None) -> list:
+    """
+        Returns a copy of rows where about mismatch_rate of them have an amount moved above the margin,
+        are missing or, when new_row is given, are followed by an extra row built by new_row(row).
+    """
+    result = []
+    for row in rows:
+        if rnd.random() >= mismatch_rate:
+            result.append(row)
+            continue
+
+        kind = rnd.choice(('amount', 'missing', 'extra') if new_row is not None else ('amount', 'missing'))
+        if kind == 'amount':
+            row = list(row)
+            column = rnd.choice(amount_columns)
+            row[column] = round(row[column] + MISMATCH_AMOUNT, 2)
+            result.append(row)
+            mismatches.amount += 1
+        elif kind == 'missing':
+            mismatches.missing += 1
+        else:
+            result.append(row)
+            result.append(new_row(row))
+            mismatches.extra += 1
+    return result
+
+
+def changes(rnd: random.Random, mismatch_rate, mismatches: Mismatches):
+    """
+        Returns a change(rows, amount_columns, new_row=None) function that applies mismatched() with rnd.
+        The records are generated with a random generator of their own so the mismatches do not
+        change the records that follow them.
+    """
+    def change(rows, amount_columns, new_row=None):
+        return mismatched(rnd, rows, mismatch_rate, amount_columns, mismatches, new_row)
+    return change
+
+
+def unchanged(rows, amount_columns, new_row=None):
+    return rows
+
+
+def write_xls(path, sheets: dict):
+    """
+        Writes {sheet name: rows} to an .xls file. Empty strings and None leave the cell blank.
+    """
+    workbook = xlwt.Workbook()
+    for name, rows in sheets.items():
+        worksheet = workbook.add_sheet(name)
+        for index, row in enumerate(rows):
+            for col, value in enumerate(row):
+                if value is not None and value != '':
+                    worksheet.write(index, col, value)
+    workbook.save(path)
+
+
+def amount(rnd: random.Random, low, high):
+    return round(rnd.uniform(low, high), 2)
+
+
+# region Branch
+def branch_filename(branch_id, process_id):
+    # Only the first five parts identify the branch, see BranchTaxInvoice._generate_key
+    return f'Branch_{branch_id}_Commission_RCTI_2020-07_{process_id}.xls'
+
+
+def branch_data_row(rnd: random.Random, index):
+    loan = amount(rnd, 100000, 900000)
+    commission = amount(rnd, 50, 5000)
+    gst = round(commission / 10, 2)
+    paid_to_broker = round(commission * 0.8, 2)
+    return [f'Broker {index % 40}', rnd.choice(LENDERS), f'Client {index}', f'R{index:06d}', loan, '01/07/2020',
+            commission, gst, 0.8, 0, commission + gst, paid_to_broker, 0, round(commission - paid_to_broker, 2)]
+
+
+def branch_extra_row(row):
+    return [row[0], row[1], row[2] + ' B', row[3] + 'B'] + row[4:]
+
+
+def branch_line_row(rnd: random.Random, description):
+    value = amount(rnd, 10, 10000)
+    gst = round(value / 10, 2)
+    return [description, value, gst, round(value + gst, 2)]
+
+
+def branch_tabs(rnd: random.Random, rows, change):
+    data_tabs = {}
+    for tab in (TAB_VBI_DATA, TAB_TRAIL_DATA, TAB_UPFRONT_DATA):
+        data = change([branch_data_row(rnd, index) for index in range(rows)], [6, 7, 11], branch_extra_row)
+        header = HEADER_TRAIL if tab == TAB_TRAIL_DATA else HEADER_VBI
+        data_tabs[tab] = [header] + data
+
+    section_rows = max(rows // 20, 2)
+    invoice_a = change([branch_line_row(rnd, f'Commission {index}') + ['Paid'] for index in range(section_rows)],
+                       [1, 3])
+    invoice_b = [branch_line_row(rnd, f'Software Fee {index}') + [''] for index in range(section_rows)]
+    rcti = change([branch_line_row(rnd, f'Broker {index} commission') for index in range(section_rows)], [1, 3])
+    summaries = [[branch_line_row(rnd, f'{name} {index}') for index in range(section_rows)]
+                 for name in ('Broker', 'Referrer', 'Broker fee', 'Referrer fee')]
+
+    tax_invoice = [['Tax Invoice Summary'], ['From:', 'Finsure Finance'], ['Date:', '31/07/2020'],
+                   ['From ABN:', '72 164 928 415'], ['To:', 'Branch Pty Ltd'], ['To ABN:', '51 824 753 556'],
+                   HEADER_TAXINVOICE]
+    tax_invoice += invoice_a + [['Total', 0, 0, 0]]
+    tax_invoice += [['Finsure Software Fee Breakdown']] + invoice_b + [['Total', 0, 0, 0]]
+
+    rcti_tab = [['RCTI'], ['Recipient Created Tax Invoice'], ['From:', 'Branch Pty Ltd'],
+                ['From ABN:', '51 824 753 556'], ['To:', 'Finsure Finance'], ['To ABN:', '72 164 928 415'],
+                ['Date:', '31/07/2020'], HEADER_RCTI] + rcti
+
+    summary = [['Summary'], ['Commission Summary'], ['From:', 'Finsure Finance'], ['To:', 'Branch Pty Ltd'],
+               ['Carried Forward Balance', 0, 0, 0], branch_line_row(rnd, 'Commission received'),
+               ['# of Admin IDs', 3, 0, 0]]
+    titles = ['Payment to Brokers from Finsure', 'Payment to Referrers from Finsure', 'Money owed by Brokers to Branch',
+              'Money owed by Referrers to Branch']
+    for title, section in zip(titles, summaries):
+        summary += [[title]] + section + [['Total', 0, 0, 0]]
+
+    return dict(data_tabs, **{TAB_TAX_INVOICE: tax_invoice, TAB_RCTI: rcti_tab, TAB_SUMMARY: summary})
+
+
+def write_branch(dir_loankit, dir_infynity, files, rows, mismatch_rate, seed=0) -> Mismatches:
+    """
+        Writes files branch RCTIs with the six tabs to each directory, rows rows in each data tab.
+    """
+    mismatches = Mismatches()
+    for index in range(files):
+        branch_id = 1000 + index
+        change = changes(random.Random(-seed - index), mismatch_rate, mismatches)
+        write_xls(dir_loankit + branch_filename(branch_id, LOANKIT_PROCESS_ID),
+                  branch_tabs(random.Random(seed + index), rows, unchanged))
+        write_xls(dir_infynity + branch_filename(branch_id, INFYNITY_PROCESS_ID),
+                  branch_tabs(random.Random(seed + index), rows, change))
+    return mismatches
+# endregion
+
+
+# region Broker
+def broker_filename(broker_id, process_id):
+    # The process ID and the date stamp are the last six parts, see BrokerTaxInvoice.__generate_key
+    return f'Broker_{broker_id}_Commission_RCTI_{process_id}_Tue_Jul_14_2020_1.xls'
+
+
+def broker_row(rnd: random.Random, index):
+    paid = amount(rnd, 20, 3000)
+    gst = round(paid / 10, 2)
+    return [rnd.choice(COMMISSION_TYPES), f'Client {index}', f'REF{index:07d}', rnd.choice(LENDERS),
+            amount(rnd, 100000, 900000), paid, gst, round(paid + gst, 2), '']
+
+
+def broker_extra_row(row):
+    return row[:1] + [row[1] + ' B', row[2] + 'B'] + row[3:]
+
+
+def broker_rows(rnd: random.Random, broker_id, rows, change):
+    data = change([broker_row(rnd, index) for index in range(rows)], [5, 6, 7], broker_extra_row)
+    # From, To and ABN are read from the third to fifth rows under the first one and the
+    # header of the commission rows from the ninth
+    info = [['Recipient Created Tax Invoice'], ['Commission Statement'], ['Finsure Finance'], ['From', 'Finsure Finance'],
+            ['To', f'Broker {broker_id}'], ['ABN', '51 824 753 556'], ['Date', '31/07/2020'], ['Period', 'July 2020'],
+            ['Details', 'Commission']]
+    account = [['', 'Paid to account: (062-000/1234' + str(broker_id) + ')']]
+    return info + [HEADER_BROKER] + data + account
+
+
+def write_broker(dir_loankit, dir_infynity, files, rows, mismatch_rate, seed=0) -> Mismatches:
+    """
+        Writes files broker RCTIs to each directory with rows commission rows each.
+    """
+    mismatches = Mismatches()
+    for index in range(files):
+        broker_id = 2000 + index
+        change = changes(random.Random(-seed - index), mismatch_rate, mismatches)
+        write_xls(dir_loankit + broker_filename(broker_id, LOANKIT_PROCESS_ID),
+                  {'Sheet1': broker_rows(random.Random(seed + index), broker_id, rows, unchanged)})
+        write_xls(dir_infynity + broker_filename(broker_id, INFYNITY_PROCESS_ID),
+                  {'Sheet1': broker_rows(random.Random(seed + index), broker_id, rows, change)})
+    return mismatches
+# endregion
+
+
+# region Referrer
+def referrer_filename(referrer_id, year_month, process_id):
+    # The year-month before "Referrer" and the last five parts are not part of the key,
+    # see ReferrerTaxInvoice.__generate_key
+    return f'Referrer_{referrer_id}_{year_month}_Referrer_RCTI_{process_id}_Tue_Jul_14_2020.html'
+
+
+def referrer_row(rnd: random.Random, index):
+    paid = amount(rnd, 10, 2000)
+    gst = round(paid / 10, 2)
+    return [rnd.choice(COMMISSION_TYPES), f'Client {index}', f'Referrer {index % 7}', paid, gst, round(paid + gst, 2)]
+
+
+def referrer_extra_row(row):
+    return row[:1] + [row[1] + ' B'] + row[2:]
+
+
+def referrer_html(referrer_id, rows: list):
+    total = sum(row[5] for row in rows)
+    lines = ['<html>', '<body>',
+             f'<p>From: Referrer {referrer_id} ABN: 51 824 753 556 To: Finsure Finance ABN: 72 164 928 415 '
+             f'Date: 31/07/2020</p>',
+             f'<p>BSB: 062-000 - Account: 1234{referrer_id}/ Total: ${total:,.2f}</p>',
+             '<table>',
+             '<tr>' + ''.join(f'<th>{item}</th>' for item in HEADER_REFERRER) + '</tr>']
+    for row in rows:
+        lines.append('<tr>' + ''.join(f'<td>{item}</td>' for item in row) + '</tr>')
+    lines += ['</table>', '</body>', '</html>']
+    return '\n'.join(lines)
+
+
+def write_referrer(dir_loankit, dir_infynity, files, rows, mismatch_rate, seed=0) -> Mismatches:
+    """
+        Writes files referrer RCTIs in HTML to each directory with rows commission rows each.
+    """
+    mismatches = Mismatches()
+    for index in range(files):
+        referrer_id = 3000 + index
+        rnd = random.Random(seed + index)
+        data = [referrer_row(rnd, row) for row in range(rows)]
+        data_infynity = mismatched(rnd, data, mismatch_rate, [3, 4, 5], mismatches, referrer_extra_row)
+        with open(dir_loankit + referrer_filename(referrer_id, '2020-07', LOANKIT_PROCESS_ID), 'w') as file:
+            file.write(referrer_html(referrer_id, data))
+        with open(dir_infynity + referrer_filename(referrer_id, '2020-08', INFYNITY_PROCESS_ID), 'w') as file:
+            file.write(referrer_html(referrer_id, data_infynity))
+    return mismatches
+# endregion
+
+
+# region Executive Summary
+def es_lender_row(rnd: random.Random, index):
+    commission = amount(rnd, 100, 50000)
+    gst = round(commission / 10, 2)
+    return [LENDERS[index % len(LENDERS)], f'{LENDERS[index % len(LENDERS)]} Home Loans {index}',
+            amount(rnd, 1e6, 5e7), commission, gst, round(commission + gst, 2)]
+
+
+def es_tabs(rnd: random.Random, rows, change):
+    tabs = {}
+    for tab in ES_LENDER_TABS:
+        data = change([es_lender_row(rnd, index) for index in range(rows)], [2, 3, 4, 5])
+        tabs[tab] = [[tab], HEADER_ES_LENDER] + data
+
+    branches = [[5000 + index, f'Branch {index}', amount(rnd, 0, 9e4), amount(rnd, 0, 9e4), amount(rnd, 0, 9e3),
+                 amount(rnd, 0, 2e5)] for index in range(rows)]
+    tabs['Branch Summary Report'] = [['Branch Summary Report'], HEADER_ES_BRANCH] + change(branches, [2, 3, 4, 5])
+    tabs['Branch Fee Summary Report'] = [['Branch Fee Summary Report'], HEADER_ES_BRANCH] + branches
+
+    brokers = [[6000 + index, f'Broker {index}', amount(rnd, 0, 9e3), amount(rnd, 0, 9e4), amount(rnd, 0, 9e3)]
+               for index in range(rows)]
+    tabs['Broker Summary Report'] = [['Broker Summary Report'], ['July 2020'], HEADER_ES_BROKER] + \
+        change(brokers, [2, 3, 4])
+    tabs['Broker Fee Summary Report'] = [['Broker Fee Summary Report'], HEADER_ES_BROKER] + brokers
+
+    summary = [[f'Line {index}', amount(rnd, 0, 1e6)] for index in range(max(rows // 10, 5))]
+    tabs['Executive Summary Report'] = [['Description', 'Value']] + change(summary, [1])
+    tabs['Fee Summary Report'] = [['Description', 'Value']] + [[f'Fee {index}', amount(rnd, 0, 1e4)]
+                                                              for index in range(max(rows // 10, 5))]
+
+    referrers = []
+    for index in range(rows):
+        paid = amount(rnd, 0, 5000)
+        referrers.append([5000 + index % 50, f'Branch {index % 50}', f'Referrer {index}', f'R{index}',
+                          amount(rnd, 0, 500), paid, round(paid / 10, 2), round(paid * 1.1, 2), round(paid * 1.1, 2),
+                          0])
+    tabs['Referrer Summary Report'] = [['Referrer Summary Report'], ['Finsure Finance'], ['July 2020'],
+                                       ['Period ending 31/07/2020'],
+                                       HEADER_ES_REFERRER] + change(referrers, [4, 7, 8])
+
+    for tab in ('DE File Entries', 'DE File - Amount Not Paid'):
+        entries = [['Finsure', '062-000', '12345678', 5000 + index % 50, 'Broker', f'Company {index}',
+                    f'Account {index}', '063-000', f'{10000000 + index}', amount(rnd, 10, 20000)]
+                   for index in range(rows)]
+        tabs[tab] = [['Num#'] + HEADER_DE] + [[index + 1] + row for index, row in enumerate(change(entries, [9]))]
+    return tabs
+
+
+def write_executive_summary(file_loankit, file_infynity, rows, mismatch_rate, seed=0) -> Mismatches:
+    """
+        Writes an executive summary workbook for each system with rows rows in each tab.
+    """
+    mismatches = Mismatches()
+    write_xls(file_loankit, es_tabs(random.Random(seed), rows, unchanged))
+    write_xls(file_infynity, es_tabs(random.Random(seed), rows, changes(random.Random(-seed), mismatch_rate, mismatches)))
+    return mismatches
+# endregion
+
+
+# region ABA
+def aba_descriptive_record():
+    return ('0' + ' ' * 17 + '01' + 'CBA' + ' ' * 7 + 'FINSURE FINANCE'.ljust(26) + '301500' +
+            'COMMISSION'.ljust(12) + '310720' + ' ' * 40)
+
+
+def aba_detail_record(bsb, account, cents, title, reference):
+    return ('1' + bsb + account.rjust(9) + ' ' + '50' + f'{cents:010d}' + title.ljust(32)[:32] +
+            reference.ljust(18) + '062-000' + '12345678'.rjust(9) + 'FINSURE FINANCE'.ljust(16) + '0' * 8)
+
+
+def aba_total_record(records: list):
+    total = sum(int(record[20:30]) for record in records)
+    return ('7' + '999-999' + ' ' * 12 + f'{total:010d}' + f'{total:010d}' + f'{0:010d}' + ' ' * 24 +
+            f'{len(records):06d}' + ' ' * 40)
+
+
+def write_aba(file_loankit, file_infynity, records, mismatch_rate, seed=0) -> Mismatches:
+    """
+        Writes an ABA file for each system with records detail records and their trailer.
+        Amounts are changed by whole dollars on the Infynity side so the trailer totals differ too.
+    """
+    rnd = random.Random(seed)
+    mismatches = Mismatches()
+    # The totals have to fit in the 10 digits of the file total record, mismatched amounts included
+    cents_max = min(5000000, (10 ** 10 - 1) // max(records, 1) - int(MISMATCH_AMOUNT * 100))
+    details = [('063-000', str(10000000 + index), rnd.randint(1000, cents_max), f'Payee {index}', f'RCTI{index:08d}')
+               for index in range(records)]
+    details_infynity = []
+    for bsb, account, cents, title, reference in details:
+        if rnd.random() >= mismatch_rate:
+            details_infynity.append((bsb, account, cents, title, reference))
+        elif rnd.random() < 0.5:
+            details_infynity.append((bsb, account, cents + int(MISMATCH_AMOUNT * 100), title, reference))
+            mismatches.amount += 1
+        else:
+            mismatches.missing += 1
+
+    for file, rows in ((file_loankit, details), (file_infynity, details_infynity)):
+        records_detail = [aba_detail_record(*row) for row in rows]
+        lines = [aba_descriptive_record()] + records_detail + [aba_total_record(records_detail)]
+        with open(file, 'w') as aba:
+            aba.write('\n'.join(lines) + '\n')
+    return mismatches
+# endregion
+
+
+def create_dirs(*dirs):
+    for dir_ in dirs:
+        os.makedirs(dir_, exist_ok=True)
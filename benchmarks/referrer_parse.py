@@ -0,0 +1,121 @@
+"""
+    Measures parsing a directory of referrer RCTIs, 5,000 generated files by default.
+
+    The header of a referrer RCTI used to be searched for in a BeautifulSoup tree and split once
+    for each of its seven fields, ReferrerHeader splits each paragraph of a ReferrerDocument once
+    and shares the parts between the fields. The header is timed both ways from the file text,
+    and the split alone on documents that are already parsed. Then the whole directory is read with
+    read_invoices() as the referrer comparison does, with the parse cache off.
+
+    Usage: python -m benchmarks.referrer_parse [files] [rows_per_file]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks import generators as g
+from src.model.parse_cache import CACHE_ENV
+from src.model.taxinvoice import read_invoices
+from src.model.taxinvoice_referrer import ReferrerTaxInvoice, ReferrerDocument, ReferrerHeader
+
+DEFAULT_FILES = 5000
+DEFAULT_ROWS = 30
+SEED = 2020
+
+
+def write_files(directory, files, rows):
+    rnd = random.Random(SEED)
+    for index in range(files):
+        referrer_id = 3000 + index
+        data = [g.referrer_row(rnd, row) for row in range(rows)]
+        filename = g.referrer_filename(referrer_id, '2020-07', g.LOANKIT_PROCESS_ID)
+        with open(os.path.join(directory, filename), 'w') as file:
+            file.write(g.referrer_html(referrer_id, data))
+
+
+class SoupParagraphs:
+    """
+        Finds the paragraphs in the tree again on every access, as the header fields used to.
+    """
+
+    def __init__(self, text):
+        self.soup = BeautifulSoup(text, 'html.parser')
+
+    @property
+    def paragraphs(self):
+        paragraph = self.soup.find('body').find('p')
+        return [paragraph.text, paragraph.find_next('p').text]
+
+
+def parts_info(document):
+    return ' '.join(document.paragraphs[0].split()).split(':')
+
+
+def parts_account(document):
+    return ' '.join(document.paragraphs[1].split()).split(':')
+
+
+def header_per_field(document):
+    # The header fields the way they were read before ReferrerHeader, one search and split each
+    return (
+        parts_info(document)[1][:-4].strip(),
+        parts_info(document)[2][:-3].strip(),
+        parts_info(document)[3][:-4].strip(),
+        parts_info(document)[4][:-5].strip(),
+        parts_account(document)[1].split(' - ')[0].strip(),
+        parts_account(document)[2].split('/')[0].strip(),
+        parts_account(document)[3].strip(),
+    )
+
+
+def header_model(document):
+    header = ReferrerHeader(document)
+    return (header._from, header.from_abn, header.to, header.to_abn, header.bsb, header.account,
+            header.final_total)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def run(files, rows):
+    os.environ[CACHE_ENV] = '0'
+    with tempfile.TemporaryDirectory() as directory:
+        write_files(directory, files, rows)
+        filenames = sorted(os.listdir(directory))
+        texts = []
+        for filename in filenames:
+            with open(os.path.join(directory, filename)) as file:
+                texts.append(file.read())
+        print(f'{files} referrer files of {rows} rows')
+
+        elapsed_soup, soup_fields = timed(lambda: [header_per_field(SoupParagraphs(text)) for text in texts])
+        elapsed_document, documents = timed(lambda: [ReferrerDocument(text) for text in texts])
+        elapsed_fields, fields = timed(lambda: [header_per_field(document) for document in documents])
+        elapsed_model, model = timed(lambda: [header_model(document) for document in documents])
+        assert soup_fields == fields == model
+        elapsed_read, _ = timed(read_invoices, ReferrerTaxInvoice, [(directory + '/', filenames)])
+
+    results = {
+        'soup per field': elapsed_soup,
+        'document + model': elapsed_document + elapsed_model,
+        'header per field': elapsed_fields,
+        'header model': elapsed_model,
+        'read_invoices': elapsed_read,
+    }
+    for name, elapsed in results.items():
+        print(f'{name:>16}: {elapsed:7.2f}s')
+    print(f'{"speedup":>16}: x{elapsed_soup / (elapsed_document + elapsed_model):.2f} from the text, '
+          f'x{elapsed_fields / elapsed_model:.2f} splitting the header')
+    return results
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_FILES,
+        int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_ROWS)
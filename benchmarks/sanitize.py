@@ -0,0 +1,88 @@
+"""
+    Measures the time spent comparing a branch file with itself with and without the
+    sanitize() cache.
+
+    Only the comparison is timed, it is where the row keys, equals() and the equal_* properties
+    sanitize the same names over and over. Matching takes rows out of the pair, so each mode
+    parses the file again. Without a file synthetic Trail Data rows are compared instead.
+
+    Usage: python -m benchmarks.sanitize [branch_file | rows]
+"""
+import os
+import sys
+import time
+
+from src import utils as u
+from src.model.parse_cache import CACHE_ENV
+from src.model.taxinvoice import TaxInvoice
+from src.model.taxinvoice_branch import BranchTaxInvoice, TrailDataRow
+
+DEFAULT_ROWS = 20000
+
+
+class BenchInvoice(TaxInvoice):
+
+    def __init__(self, directory, filename):
+        TaxInvoice.__init__(self, directory, filename)
+        self.pair = None
+
+
+def new_row(index):
+    return TrailDataRow(f'Broker {index % 50}', 'Lender', f'Client {index % 2000}', f'R{index}', 250000 + index,
+                        '2020-07-01', 100 + index, 10, 0.8, 0, 100, 80, 0, 20, index)
+
+
+def parse_branch(path):
+    directory, filename = os.path.split(os.path.abspath(path))
+    invoice = BranchTaxInvoice(directory + '/', filename)
+    invoice.pair = BranchTaxInvoice(directory + '/', filename)
+    invoice.pair.pair = invoice
+    return invoice
+
+
+def compare_branch(invoice):
+    invoice.compare(0)
+    return invoice.summary_errors
+
+
+def compare_rows(rows):
+    invoice = BenchInvoice('./', 'bench.xls')
+    invoice.pair = BenchInvoice('./', 'bench_pair.xls')
+    datarows = {row.key_full: row for row in map(new_row, range(rows))}
+    datarows_pair = {row.key_full: row for row in map(new_row, range(rows))}
+    pairs = invoice.match_rows(datarows, datarows_pair, 0)
+    return [self_row for self_row, pair_row in pairs if self_row is None or not self_row.equals(pair_row)]
+
+
+def timed(compare, new_subject, cached):
+    sanitize = u.sanitize
+    if not cached:
+        u.sanitize = sanitize.__wrapped__
+    sanitize.cache_clear()
+    subject = new_subject()
+    try:
+        start = time.perf_counter()
+        compare(subject)
+        return time.perf_counter() - start
+    finally:
+        u.sanitize = sanitize
+
+
+def run(arg):
+    os.environ[CACHE_ENV] = '0'
+    if os.path.isfile(arg):
+        results = {cached: timed(compare_branch, lambda: parse_branch(arg), cached) for cached in (False, True)}
+        print(arg)
+    else:
+        results = {cached: timed(compare_rows, lambda: int(arg), cached) for cached in (False, True)}
+        print(f'{arg} synthetic Trail Data rows')
+
+    for cached, elapsed in results.items():
+        mode = 'cached' if cached else 'uncached'
+        print(f'{mode:>9}: {elapsed:7.2f}s')
+    print(f'{"hits":>9}: {u.sanitize.cache_info().hits}')
+    return results
+
+
+if __name__ == '__main__':
+    run(sys.argv[1] if len(sys.argv) > 1 else str(DEFAULT_ROWS))
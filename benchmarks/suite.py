@@ -0,0 +1,278 @@
+"""
+    Times every comparer on synthetic Loankit and Infynity files written by benchmarks.generators
+    and saves the timings to a JSON file so runs can be compared with each other.
+
+    Each comparer is timed in three phases:
+        parse   reading both sides into invoices
+        match   compare() on every pair of files
+        render  the DETAILED files of the pairs with errors and the summary workbook
+
+    The scale multiplies the number of branch, broker and referrer files and the number of rows of
+    the executive summary and ABA files. The parse cache is off so every run parses the files.
+    When a baseline JSON of an earlier run is given the change of each phase is printed too.
+
+    A comparer that fails is recorded in the JSON with its error and the run exits with status 1,
+    as does a comparer that ran in only one of the current and the baseline runs.
+
+    Usage: python -m benchmarks.suite [scale] [output_json] [baseline_json]
+"""
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from benchmarks import generators as g
+from src import utils as u
+from src.model.parse_cache import CACHE_ENV
+from src.model.taxinvoice import (read_invoices, create_dirs, SummaryWriter, OUTPUT_DIR_SUMMARY, LOW_MEMORY_ENV)
+from src.model.taxinvoice_branch import BranchTaxInvoice, VECTOR_ENGINE_ENV
+from src.model.taxinvoice_broker import BrokerTaxInvoice
+from src.model.taxinvoice_referrer import ReferrerTaxInvoice
+from src.model.executive_summary import ExecutiveSummary, read_file_exec_summary
+from src.model.aba import read_file_aba
+
+DEFAULT_SCALE = 1
+DEFAULT_OUTPUT = 'benchmark_suite.json'
+MARGIN = 0.01
+MISMATCH_RATE = 0.05
+SEED = 2020
+PHASES = ['parse', 'match', 'render']
+# A phase slower than the baseline by more than this ratio is reported as a regression
+REGRESSION_RATIO = 1.2
+
+# Files and rows of each comparer at scale 1
+SIZES = {
+    'branch': (4, 500),
+    'broker': (20, 100),
+    'referrer': (50, 30),
+    'executive_summary': (1, 300),
+    'aba': (1, 5000),
+}
+
+
+class PhaseTimer:
+    """
+        Adds the time spent inside each `with timer.phase(name):` block to timings[name].
+    """
+
+    def __init__(self):
+        self.timings = {phase: 0.0 for phase in PHASES}
+        self._name = None
+        self._start = None
+
+    def phase(self, name):
+        self._name = name
+        return self
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.timings[self._name] += time.perf_counter() - self._start
+        return False
+
+
+def compare_dirs(cls, dir_loankit, dir_infynity, summary_filename, timer: PhaseTimer):
+    """
+        Runs the comparison rcti_compare_broker, rcti_compare_branch and rcti_compare_referrer do
+        with each phase timed on its own. Returns the number of errors found.
+    """
+    with timer.phase('parse'):
+        invoices_loankit, invoices_infynity = read_invoices(
+            cls, [(dir_loankit, sorted(os.listdir(dir_loankit))), (dir_infynity, sorted(os.listdir(dir_infynity)))])
+
+    for key, invoice in invoices_loankit.items():
+        if key in invoices_infynity:
+            invoice.pair = invoices_infynity[key]
+            invoices_infynity[key].pair = invoice
+
+    paired = [invoice for invoice in invoices_loankit.values() if invoice.pair is not None]
+    with timer.phase('match'):
+        for invoice in paired:
+            invoice.compare(MARGIN)
+
+    with timer.phase('render'):
+        summary = SummaryWriter(f'{OUTPUT_DIR_SUMMARY}{summary_filename}.xlsx', summary_filename, dir_loankit,
+                                dir_infynity)
+        for invoice in paired:
+            if len(invoice.summary_errors) > 0:
+                invoice.write_detailed()
+            summary.extend(invoice.summary_errors)
+        summary.close()
+    return summary.count
+
+
+def compare_files(read_file, file_loankit, file_infynity, summary_filename, timer: PhaseTimer):
+    """
+        Runs the comparison rcti_compare_executive_summary and rcti_compare_aba do with each phase
+        timed on its own. Returns the number of errors found.
+    """
+    with timer.phase('parse'):
+        infynity = read_file(file_infynity)
+        loankit = read_file(file_loankit)
+        infynity.pair = loankit
+        loankit.pair = infynity
+        if isinstance(infynity, ExecutiveSummary):
+            infynity.parse_compared_tabs()  # Tabs are parsed lazily otherwise, inside compare()
+
+    with timer.phase('match'):
+        infynity.compare(MARGIN)
+
+    with timer.phase('render'):
+        if len(infynity.summary_errors) > 0:
+            infynity.write_detailed()
+        summary = SummaryWriter(f'{OUTPUT_DIR_SUMMARY}{summary_filename}.xlsx', 'Summary', infynity.directory,
+                                loankit.directory)
+        summary.extend(infynity.summary_errors)
+        summary.close()
+    return summary.count
+
+
+def bench_branch(directory, files, rows, timer):
+    dir_loankit, dir_infynity = directory + 'loankit/', directory + 'infynity/'
+    g.create_dirs(dir_loankit, dir_infynity)
+    mismatches = g.write_branch(dir_loankit, dir_infynity, files, rows, MISMATCH_RATE, SEED)
+    return mismatches, compare_dirs(BranchTaxInvoice, dir_loankit, dir_infynity, 'branch_rcti_summary', timer)
+
+
+def bench_broker(directory, files, rows, timer):
+    dir_loankit, dir_infynity = directory + 'loankit/', directory + 'infynity/'
+    g.create_dirs(dir_loankit, dir_infynity)
+    mismatches = g.write_broker(dir_loankit, dir_infynity, files, rows, MISMATCH_RATE, SEED)
+    return mismatches, compare_dirs(BrokerTaxInvoice, dir_loankit, dir_infynity, 'broker_rcti_summary', timer)
+
+
+def bench_referrer(directory, files, rows, timer):
+    dir_loankit, dir_infynity = directory + 'loankit/', directory + 'infynity/'
+    g.create_dirs(dir_loankit, dir_infynity)
+    mismatches = g.write_referrer(dir_loankit, dir_infynity, files, rows, MISMATCH_RATE, SEED)
+    return mismatches, compare_dirs(ReferrerTaxInvoice, dir_loankit, dir_infynity, 'referrer_rcti_summary', timer)
+
+
+def bench_executive_summary(directory, files, rows, timer):
+    file_loankit, file_infynity = directory + 'es_loankit.xls', directory + 'es_infynity.xls'
+    mismatches = g.write_executive_summary(file_loankit, file_infynity, rows, MISMATCH_RATE, SEED)
+    return mismatches, compare_files(read_file_exec_summary, file_loankit, file_infynity, 'Final Summary', timer)
+
+
+def bench_aba(directory, files, rows, timer):
+    file_loankit, file_infynity = directory + 'loankit.aba', directory + 'infynity.aba'
+    mismatches = g.write_aba(file_loankit, file_infynity, rows, MISMATCH_RATE, SEED)
+    return mismatches, compare_files(read_file_aba, file_loankit, file_infynity, 'ABA Summary', timer)
+
+
+BENCHMARKS = {
+    'branch': bench_branch,
+    'broker': bench_broker,
+    'referrer': bench_referrer,
+    'executive_summary': bench_executive_summary,
+    'aba': bench_aba,
+}
+
+
+def sizes(scale):
+    """
+        Files and rows of each comparer, the single file comparers grow in rows instead of files.
+    """
+    result = {}
+    for name, (files, rows) in SIZES.items():
+        if files == 1:
+            result[name] = (1, rows * scale)
+        else:
+            result[name] = (files * scale, rows)
+    return result
+
+
+def bench(name, files, rows):
+    """
+        Generates the files of a comparer in a temporary directory and times its comparison there,
+        the Output directory is created inside it too. Returns the result of the comparer.
+    """
+    timer = PhaseTimer()
+    result = {'files': files, 'rows': rows}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            create_dirs()
+            mismatches, errors = BENCHMARKS[name](directory + '/', files, rows, timer)
+            result.update(mismatches=mismatches.serialize(), errors=errors, seconds=timer.timings)
+        except Exception as e:
+            # A broken comparer is recorded instead of stopping the other ones
+            result.update(error=f'{type(e).__name__}: {e}', seconds=timer.timings)
+        finally:
+            os.chdir(cwd)
+    return result
+
+
+def compare_results(baseline: dict, results: dict):
+    """
+        Prints the change of each phase against a baseline run, flagging the regressions.
+        Returns the names of the comparers that could not be compared with the baseline.
+    """
+    print(f'Against baseline from {baseline.get("date", "unknown date")}')
+    missing = []
+    for name, result in results['comparers'].items():
+        result_baseline = baseline.get('comparers', {}).get(name)
+        if result_baseline is None or 'error' in result or 'error' in result_baseline:
+            print(f'{name:>18}: not timed in both runs  MISSING')
+            missing.append(name)
+            continue
+        for phase in PHASES:
+            before, after = result_baseline['seconds'][phase], result['seconds'][phase]
+            if before <= 0:
+                continue
+            ratio = after / before
+            flag = '  REGRESSION' if ratio > REGRESSION_RATIO else ''
+            print(f'{name:>18} {phase:>6}: {before:7.2f}s -> {after:7.2f}s  x{ratio:5.2f}{flag}')
+    return missing
+
+
+def run(scale, output, baseline=None):
+    os.environ[CACHE_ENV] = '0'
+    results = {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'scale': scale,
+        'margin': MARGIN,
+        'mismatch_rate': MISMATCH_RATE,
+        'seed': SEED,
+        'settings': {
+            VECTOR_ENGINE_ENV: os.environ.get(VECTOR_ENGINE_ENV, '0'),
+            LOW_MEMORY_ENV: os.environ.get(LOW_MEMORY_ENV, '1'),
+            u.MONEY_CENTS_ENV: '1' if u.MONEY_CENTS else '0',
+        },
+        'comparers': {},
+    }
+
+    for name, (files, rows) in sizes(scale).items():
+        result = bench(name, files, rows)
+        results['comparers'][name] = result
+        seconds = '  '.join(f'{phase} {result["seconds"][phase]:7.2f}s' for phase in PHASES)
+        if 'error' in result:
+            print(f'{name:>18}: {seconds}  failed with {result["error"]}')
+        else:
+            print(f'{name:>18}: {seconds}  {result["errors"]} errors for {result["mismatches"]} mismatches')
+
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'Results written to {output}')
+
+    results['failed'] = [name for name, result in results['comparers'].items() if 'error' in result]
+    if baseline is not None:
+        with open(baseline) as file:
+            results['failed'] += [name for name in compare_results(json.load(file), results)
+                                  if name not in results['failed']]
+    return results
+
+
+if __name__ == '__main__':
+    results = run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SCALE,
+                  sys.argv[2] if len(sys.argv) > 2 else DEFAULT_OUTPUT,
+                  sys.argv[3] if len(sys.argv) > 3 else None)
+    if results['failed']:
+        print(f'Not timed: {", ".join(results["failed"])}')
+        sys.exit(1)
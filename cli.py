@@ -1,17 +1,25 @@
+import cProfile
+import functools
+import inspect
 import os
+import pstats
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 import click
 import pdb
-import xlsxwriter
 
-from src.model.taxinvoice import (create_dirs, new_error, write_errors, get_header_format,
-                                  get_title_format, PID, OUTPUT_DIR_SUMMARY)
-from src.model.taxinvoice_referrer import read_files_referrer
-from src.model.taxinvoice_broker import read_files_broker
-from src.model.taxinvoice_branch import read_files_branch
-from src.model.executive_summary import read_file_exec_summary
-from src.model.aba import read_file_aba
-from src.utils import bcolors
+from src.model.taxinvoice import (create_dirs, new_error, read_invoices, SummaryWriter, PARSE_CACHE, PID,
+                                  PID_ENV, OUTPUT_DIR_PID, OUTPUT_DIR_SUMMARY)
+from src.model.metrics import METRICS
+from src.model.manifest import ComparisonManifest
+from src.model.taxinvoice_referrer import ReferrerTaxInvoice
+from src.model.taxinvoice_broker import BrokerTaxInvoice
+from src.model.taxinvoice_branch import BranchTaxInvoice, VECTOR_ENGINE_ENV
+from src.model.executive_summary import ExecutiveSummary, read_file_exec_summary
+from src.model.aba import read_file_aba, stream_comparison, split_path
+from src.utils import bcolors, set_money_cents
+from src import utils as u
 
 
 # Constants
@@ -19,6 +27,55 @@ INFYNITY = 'Infynity'
 LOANKIT = 'Loankit'
 
 DESC_LOOSE = 'Margin of error for a comparison between two numbers to be considered correct.'
+DESC_WORKERS = 'Number of processes used to parse and compare the files in parallel.'
+DESC_NO_CACHE = 'Parse every file again instead of loading unchanged files from the parse cache.'
+DESC_ALWAYS_WRITE_DETAIL = 'Write the DETAILED file of every pair, even the ones without differences.'
+DESC_VECTORISED = 'Compare the Upfront, Trail and VBI tabs as whole tables, only creating rows for the differences.'
+DESC_MONEY_CENTS = 'Compare money as whole cents instead of floats, the margin is rounded to cents too.'
+DESC_METRICS = 'Write the time spent in each phase and the counters of the run to a JSON file next to the summary.'
+DESC_PROFILE = ('Run the comparison under cProfile and write the .prof file and a report of the slowest functions '
+                'to the output directory. Only the main process is profiled.')
+DESC_TABS = 'Only compare this executive summary tab, can be given more than once. All tabs are compared by default.'
+DESC_INCREMENTAL = ('Only parse and compare the pairs whose files changed since the last run in the same output '
+                    'directory, whose PID is set in RCTI_COMPARISON_PID, and reuse the results of the others.')
+DESC_STREAM = ('Compare the ABA files in a single pass, keeping only the Loankit records in memory. '
+               'No DETAILED file is written.')
+
+# Number of functions listed in each table of the profile report
+PROFILE_TOP = 40
+
+
+def profiled(command):
+    """
+        Runs a comparison command under cProfile when it is called with profile set, then writes
+        the .prof file and a report of the slowest functions into the PID output directory.
+    """
+    signature = inspect.signature(command)
+
+    @functools.wraps(command)
+    def wrapper(*args, **kwargs):
+        if not signature.bind(*args, **kwargs).arguments.get('profile', False):
+            return command(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(command, *args, **kwargs)
+        finally:
+            write_profile(profiler, command.__name__)
+    return wrapper
+
+
+def write_profile(profiler, name):
+    create_dirs()
+    file = f"{OUTPUT_DIR_PID}{name}.prof"
+    file_report = f"{OUTPUT_DIR_PID}{name}_profile.txt"
+    profiler.dump_stats(file)
+
+    with open(file_report, 'w') as report:
+        stats = pstats.Stats(profiler, stream=report)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(PROFILE_TOP)
+    print(f"Profile written to {bcolors.BLUE}{file}{bcolors.ENDC} and {bcolors.BLUE}{file_report}{bcolors.ENDC}")
 
 
 @click.group()
@@ -28,15 +85,31 @@ def rcti():
 
 # @click.command('compare_referrer')
 # @click.option('-l', '--loose', type=float, default=0, help=DESC_LOOSE)
+# @click.option('-w', '--workers', type=int, default=1, help=DESC_WORKERS)
+# @click.option('--no-cache', 'cache', flag_value=False, default=True, help=DESC_NO_CACHE)
+# @click.option('--always-write-detail', is_flag=True, default=False, help=DESC_ALWAYS_WRITE_DETAIL)
+# @click.option('--money-cents', is_flag=True, default=False, help=DESC_MONEY_CENTS)
+# @click.option('--metrics', is_flag=True, default=False, help=DESC_METRICS)
+# @click.option('--profile', is_flag=True, default=False, help=DESC_PROFILE)
+# @click.option('--incremental', is_flag=True, default=False, help=DESC_INCREMENTAL)
 # @click.argument('loankit_dir', required=True, type=click.Path(exists=True))
 # @click.argument('infynity_dir', required=True, type=click.Path(exists=True))
-def rcti_compare_referrer(loose, loankit_dir, infynity_dir):
+@profiled
+def rcti_compare_referrer(loose, loankit_dir, infynity_dir, workers=1, cache=True, always_write_detail=False,
+                          money_cents=False, metrics=False, profile=False, incremental=False):
     print_start_message('referrer')
+    PARSE_CACHE.enabled = cache
+    set_money_cents(money_cents)
+    METRICS.reset()
     loankit_files = list_files(loankit_dir)
     infynity_files = list_files(infynity_dir)
+    manifest = None
+    if incremental:
+        manifest = new_manifest('referrer_rcti_summary', loose, always_write_detail)
+        loankit_files, infynity_files = manifest.reuse(loankit_dir, loankit_files, infynity_dir, infynity_files)
 
-    invoices_loankit = read_files_referrer(loankit_dir, loankit_files)
-    invoices_infynity = read_files_referrer(infynity_dir, infynity_files)
+    invoices_loankit, invoices_infynity = read_invoices(
+        ReferrerTaxInvoice, [(loankit_dir, loankit_files), (infynity_dir, infynity_files)], workers)
 
     run_comparison(
         invoices_loankit,
@@ -45,22 +118,42 @@ def rcti_compare_referrer(loose, loankit_dir, infynity_dir):
         'referrer_rcti_summary',
         'Commission Referrer RCTI Summary',
         loankit_dir,
-        infynity_dir)
+        infynity_dir,
+        workers,
+        always_write_detail,
+        metrics,
+        manifest)
 
     print_done_message()
 
 
 # @click.command('compare_broker')
 # @click.option('-l', '--loose', type=float, default=0, help=DESC_LOOSE)
+# @click.option('-w', '--workers', type=int, default=1, help=DESC_WORKERS)
+# @click.option('--no-cache', 'cache', flag_value=False, default=True, help=DESC_NO_CACHE)
+# @click.option('--always-write-detail', is_flag=True, default=False, help=DESC_ALWAYS_WRITE_DETAIL)
+# @click.option('--money-cents', is_flag=True, default=False, help=DESC_MONEY_CENTS)
+# @click.option('--metrics', is_flag=True, default=False, help=DESC_METRICS)
+# @click.option('--profile', is_flag=True, default=False, help=DESC_PROFILE)
+# @click.option('--incremental', is_flag=True, default=False, help=DESC_INCREMENTAL)
 # @click.argument('loankit_dir', required=True, type=click.Path(exists=True))
 # @click.argument('infynity_dir', required=True, type=click.Path(exists=True))
-def rcti_compare_broker(loose, loankit_dir, infynity_dir):
+@profiled
+def rcti_compare_broker(loose, loankit_dir, infynity_dir, workers=1, cache=True, always_write_detail=False,
+                        money_cents=False, metrics=False, profile=False, incremental=False):
     print_start_message('broker')
+    PARSE_CACHE.enabled = cache
+    set_money_cents(money_cents)
+    METRICS.reset()
     files_loankit = list_files(loankit_dir)
     files_infynity = list_files(infynity_dir)
+    manifest = None
+    if incremental:
+        manifest = new_manifest('broker_rcti_summary', loose, always_write_detail)
+        files_loankit, files_infynity = manifest.reuse(loankit_dir, files_loankit, infynity_dir, files_infynity)
 
-    invoices_loankit = read_files_broker(loankit_dir, files_loankit)
-    invoices_infynity = read_files_broker(infynity_dir, files_infynity)
+    invoices_loankit, invoices_infynity = read_invoices(
+        BrokerTaxInvoice, [(loankit_dir, files_loankit), (infynity_dir, files_infynity)], workers)
 
     run_comparison(
         invoices_loankit,
@@ -69,22 +162,44 @@ def rcti_compare_broker(loose, loankit_dir, infynity_dir):
         'broker_rcti_summary',
         'Commission Broker RCTI Summary',
         loankit_dir,
-        infynity_dir)
+        infynity_dir,
+        workers,
+        always_write_detail,
+        metrics,
+        manifest)
 
     print_done_message()
 
 
 # @click.command('compare_branch')
 # @click.option('-l', '--loose', type=float, default=0, help=DESC_LOOSE)
+# @click.option('-w', '--workers', type=int, default=1, help=DESC_WORKERS)
+# @click.option('--no-cache', 'cache', flag_value=False, default=True, help=DESC_NO_CACHE)
+# @click.option('--always-write-detail', is_flag=True, default=False, help=DESC_ALWAYS_WRITE_DETAIL)
+# @click.option('--money-cents', is_flag=True, default=False, help=DESC_MONEY_CENTS)
+# @click.option('--metrics', is_flag=True, default=False, help=DESC_METRICS)
+# @click.option('--profile', is_flag=True, default=False, help=DESC_PROFILE)
+# @click.option('--vectorised', is_flag=True, default=False, help=DESC_VECTORISED)
+# @click.option('--incremental', is_flag=True, default=False, help=DESC_INCREMENTAL)
 # @click.argument('loankit_dir', required=True, type=click.Path(exists=True))
 # @click.argument('infynity_dir', required=True, type=click.Path(exists=True))
-def rcti_compare_branch(loose, loankit_dir, infynity_dir):
+@profiled
+def rcti_compare_branch(loose, loankit_dir, infynity_dir, workers=1, cache=True, always_write_detail=False,
+                        vectorised=False, money_cents=False, metrics=False, profile=False, incremental=False):
     print_start_message('branch')
+    PARSE_CACHE.enabled = cache
+    set_money_cents(money_cents)
+    METRICS.reset()
+    os.environ[VECTOR_ENGINE_ENV] = '1' if vectorised else '0'
     files_loankit = list_files(loankit_dir)
     files_infynity = list_files(infynity_dir)
+    manifest = None
+    if incremental:
+        manifest = new_manifest('branch_rcti_summary', loose, always_write_detail)
+        files_loankit, files_infynity = manifest.reuse(loankit_dir, files_loankit, infynity_dir, files_infynity)
 
-    invoices_loankit = read_files_branch(loankit_dir, files_loankit)
-    invoices_infynity = read_files_branch(infynity_dir, files_infynity)
+    invoices_loankit, invoices_infynity = read_invoices(
+        BranchTaxInvoice, [(loankit_dir, files_loankit), (infynity_dir, files_infynity)], workers)
 
     run_comparison(
         invoices_loankit,
@@ -93,77 +208,120 @@ def rcti_compare_branch(loose, loankit_dir, infynity_dir):
         'branch_rcti_summary',
         'Commission Branch RCTI Summary',
         loankit_dir,
-        infynity_dir)
+        infynity_dir,
+        workers,
+        always_write_detail,
+        metrics,
+        manifest)
 
     print_done_message()
 
 
 # @click.command('compare_executive_summary')
 # @click.option('-l', '--loose', type=float, default=0, help=DESC_LOOSE)
+# @click.option('--no-cache', 'cache', flag_value=False, default=True, help=DESC_NO_CACHE)
+# @click.option('--always-write-detail', is_flag=True, default=False, help=DESC_ALWAYS_WRITE_DETAIL)
+# @click.option('--money-cents', is_flag=True, default=False, help=DESC_MONEY_CENTS)
+# @click.option('--metrics', is_flag=True, default=False, help=DESC_METRICS)
+# @click.option('--profile', is_flag=True, default=False, help=DESC_PROFILE)
+# @click.option('--tabs', multiple=True, help=DESC_TABS)
 # @click.argument('loankit_file', required=True, type=click.File(exists=True))
 # @click.argument('infynity_file', required=True, type=click.File(exists=True))
-def rcti_compare_executive_summary(loose, loankit_file, infynity_file):
+@profiled
+def rcti_compare_executive_summary(loose, loankit_file, infynity_file, cache=True, always_write_detail=False,
+                                   money_cents=False, metrics=False, profile=False, tabs=()):
     print_start_message('executive summary')
-    exec_summary_infynity = read_file_exec_summary(infynity_file)
-    exec_summary_loankit = read_file_exec_summary(loankit_file)
+    PARSE_CACHE.enabled = cache
+    set_money_cents(money_cents)
+    METRICS.reset()
+    tabs = selected_tabs(tabs)
+    exec_summary_infynity = read_file_exec_summary(infynity_file, tabs)
+    exec_summary_loankit = read_file_exec_summary(loankit_file, tabs)
 
     exec_summary_infynity.pair = exec_summary_loankit
     exec_summary_infynity.margin = loose
     create_dirs()
-    summary_errors = exec_summary_infynity.process_comparison(margin=loose)
+    with METRICS.phase('process_comparison'):
+        summary_errors = exec_summary_infynity.process_comparison(
+            margin=loose, always_write_detail=always_write_detail)
 
     # Create summary based on errors
     file = f"{OUTPUT_DIR_SUMMARY}{'Final Summary'}.xlsx"
-    workbook = xlsxwriter.Workbook(file)
-    worksheet = workbook.add_worksheet('Summary')
-    fmt_title = get_title_format(workbook)
-    fmt_table_header = get_header_format(workbook)
-    worksheet.merge_range('A1:I1', 'Summary', fmt_title)
-    row = 1
-    col = 0
-    worksheet.write(row, col, f"Number of issues: {str(len(summary_errors))}")
-    row += 2
-    worksheet = write_errors(summary_errors, worksheet, row, col, fmt_table_header,
-                             exec_summary_infynity.directory, exec_summary_loankit.directory)
-    workbook.close()
+    summary = SummaryWriter(file, 'Summary', exec_summary_infynity.directory, exec_summary_loankit.directory)
+    summary.extend(summary_errors)
+    summary.close()
+    report_metrics('Final Summary', metrics)
 
     print_done_message()
 
 
 # @click.command('compare_aba')
+# @click.option('--no-cache', 'cache', flag_value=False, default=True, help=DESC_NO_CACHE)
+# @click.option('--always-write-detail', is_flag=True, default=False, help=DESC_ALWAYS_WRITE_DETAIL)
+# @click.option('--money-cents', is_flag=True, default=False, help=DESC_MONEY_CENTS)
+# @click.option('--metrics', is_flag=True, default=False, help=DESC_METRICS)
+# @click.option('--profile', is_flag=True, default=False, help=DESC_PROFILE)
+# @click.option('--stream', is_flag=True, default=False, help=DESC_STREAM)
 # @click.argument('loankit_file', required=True, type=click.File(exists=True))
 # @click.argument('infynity_file', required=True, type=click.File(exists=True))
-def rcti_compare_aba(loankit_file, infynity_file):
+@profiled
+def rcti_compare_aba(loankit_file, infynity_file, cache=True, always_write_detail=False, money_cents=False,
+                     metrics=False, profile=False, stream=False):
     print_start_message('aba files')
+    PARSE_CACHE.enabled = cache
+    set_money_cents(money_cents)
+    METRICS.reset()
+    if stream:
+        create_dirs()
+        file = f"{OUTPUT_DIR_SUMMARY}{'ABA Summary'}.xlsx"
+        summary = SummaryWriter(file, 'Summary', split_path(infynity_file)[0], split_path(loankit_file)[0],
+                                sheet_name='ABA Comparison Results')
+        with METRICS.phase('process_comparison'):
+            summary.extend(stream_comparison(infynity_file, loankit_file))
+        summary.close()
+        report_metrics('ABA Summary', metrics)
+        print_done_message()
+        return
+
     aba_infynity = read_file_aba(infynity_file)
     aba_loankit = read_file_aba(loankit_file)
 
     aba_infynity.pair = aba_loankit
     create_dirs()
-    summary_errors = aba_infynity.process_comparison()
+    with METRICS.phase('process_comparison'):
+        summary_errors = aba_infynity.process_comparison(always_write_detail=always_write_detail)
 
     # Create summary based on errors
     file = f"{OUTPUT_DIR_SUMMARY}{'ABA Summary'}.xlsx"
-    workbook = xlsxwriter.Workbook(file)
-    worksheet = workbook.add_worksheet('ABA Comparison Results')
-    fmt_title = get_title_format(workbook)
-    fmt_table_header = get_header_format(workbook)
-    worksheet.merge_range('A1:I1', 'Summary', fmt_title)
-    row = 1
-    col = 0
-    worksheet.write(row, col, f"Number of issues: {str(len(summary_errors))}")
-    row += 2
-    worksheet = write_errors(summary_errors, worksheet, row, col, fmt_table_header,
-                             aba_infynity.directory, aba_loankit.directory)
-    workbook.close()
+    summary = SummaryWriter(file, 'Summary', aba_infynity.directory, aba_loankit.directory,
+                            sheet_name='ABA Comparison Results')
+    summary.extend(summary_errors)
+    summary.close()
+    report_metrics('ABA Summary', metrics)
 
     print_done_message()
 
 
-def run_comparison(files_a, files_b, margin, summary_filname, summary_title, filepath_a, filepath_b):
+def selected_tabs(tabs) -> list:
+    """
+        Executive summary tabs picked with --tabs, None when all of them are compared.
+    """
+    if not tabs:
+        return None
+    names = [tab for tab, _ in ExecutiveSummary.TAB_PARSERS.values()]
+    unknown = [tab for tab in tabs if tab not in names]
+    if unknown:
+        raise click.BadParameter(f"unknown tabs {unknown}, the tabs are {names}", param_hint='--tabs')
+    return list(tabs)
+
+
+def run_comparison(files_a, files_b, margin, summary_filname, summary_title, filepath_a, filepath_b, workers=1,
+                   always_write_detail=False, metrics=False, manifest: ComparisonManifest = None):
     create_dirs()
 
-    summary_errors = []
+    # Errors are written to the summary as they are found instead of being kept in a list
+    file = f"{OUTPUT_DIR_SUMMARY}{summary_filname}.xlsx"
+    summary = SummaryWriter(file, summary_title, filepath_a, filepath_b)
 
     # Set each invoice pair
     for key in files_a.keys():
@@ -174,37 +332,88 @@ def run_comparison(files_a, files_b, margin, summary_filname, summary_title, fil
             # Log in the summary files that don't have a match
             msg = 'No corresponding commission file found'
             error = new_error(files_a[key].filename, '', msg)
-            summary_errors.append(error)
+            summary.add(error)
 
     # Find all Infynity files that don't have a match
     alone_keys_infynity = set(files_b.keys()) - set(files_a.keys())
     for key in alone_keys_infynity:
         msg = 'No corresponding commission file found'
         error = new_error('', files_b[key].filename, msg)
-        summary_errors.append(error)
+        summary.add(error)
 
     counter = 1
-    for key in files_a.keys():
-        print(f'Processing {counter} of {len(files_a)} files', end='\r')
-        errors = files_a[key].process_comparison(margin)
-        if errors is not None:
-            summary_errors = summary_errors + errors
-        counter += 1
+    with METRICS.phase('process_comparison'):
+        for invoice, errors in zip(files_a.values(), compare_invoices(files_a, margin, workers, always_write_detail)):
+            print(f'Processing {counter} of {len(files_a)} files', end='\r')
+            if manifest is not None:
+                # The errors of the pairs reused from the previous run keep their place in the summary
+                summary.extend(manifest.reused_errors(invoice.filename))
+                if errors is not None:
+                    manifest.add(invoice, errors)
+            if errors is not None:
+                summary.extend(errors)
+            counter += 1
     print()
 
+    if manifest is not None:
+        summary.extend(manifest.reused_errors())
+        manifest.write()
+
     # Create summary based on errors
-    file = f"{OUTPUT_DIR_SUMMARY}{summary_filname}.xlsx"
-    workbook = xlsxwriter.Workbook(file)
-    worksheet = workbook.add_worksheet('Summary')
-    fmt_title = get_title_format(workbook)
-    fmt_table_header = get_header_format(workbook)
-    worksheet.merge_range('A1:I1', summary_title, fmt_title)
-    row = 1
-    col = 0
-    worksheet.write(row, col, f"Number of issues: {str(len(summary_errors))}")
-    row += 2
-    worksheet = write_errors(summary_errors, worksheet, row, col, fmt_table_header, filepath_a, filepath_b)
-    workbook.close()
+    summary.close()
+    report_metrics(summary_filname, metrics)
+
+
+def compare_invoices(invoices: dict, margin, workers=1, always_write_detail=False):
+    """
+        Yields the errors of each invoice comparison in the same order as the invoices dict.
+        With more than one worker the pairs are compared in a process pool, each worker
+        writing its own DETAILED file.
+    """
+    if workers <= 1:
+        for invoice in invoices.values():
+            yield invoice.process_comparison(margin, always_write_detail)
+        return
+
+    os.environ[PID_ENV] = PID  # Make the workers write into this run's output directory
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(process_invoice, invoices.values(), repeat(margin), repeat(always_write_detail))
+        for invoice, (errors, metrics, detailed_file) in zip(invoices.values(), results):
+            METRICS.merge(metrics)
+            invoice.detailed_file = detailed_file
+            yield errors
+
+
+def process_invoice(invoice, margin, always_write_detail=False):
+    # Each task sends back only its own metrics, the worker may have run other tasks before
+    METRICS.reset()
+    errors = invoice.process_comparison(margin, always_write_detail)
+    return errors, METRICS.serialize(), invoice.detailed_file
+
+
+def new_manifest(summary_filename, margin, always_write_detail=False) -> ComparisonManifest:
+    """
+        Manifest of the previous run of a directory comparison in this PID output directory. Only a
+        run with the same settings is reused, they all change the errors found.
+    """
+    create_dirs()
+    settings = {
+        'margin': margin,
+        'money_cents': u.MONEY_CENTS,
+        'always_write_detail': always_write_detail,
+        'vectorised': os.environ.get(VECTOR_ENGINE_ENV, '0'),
+    }
+    return ComparisonManifest(f"{OUTPUT_DIR_PID}{summary_filename}_manifest.json", settings)
+
+
+def report_metrics(summary_filename, metrics=False):
+    """
+        Prints the time spent in each phase of the run and its counters. With metrics set they are
+        also written to a JSON file next to the summary.
+    """
+    METRICS.report()
+    if metrics:
+        METRICS.write(f"{OUTPUT_DIR_SUMMARY}{summary_filename}_metrics.json")
 
 
 # Add subcommands to the CLI
@@ -224,7 +433,7 @@ def print_done_message():
 
 def list_files(dir_: str) -> list:
     files = []
-    with os.scandir(dir_) as it:
+    with METRICS.phase('list_files'), os.scandir(dir_) as it:
         for entry in it:
             if not entry.name.startswith('.') and not entry.name.startswith('~') and entry.is_file():
                 files.append(entry.name)
@@ -237,6 +446,16 @@ if __name__ == '__main__':
     #loankit_process_id = input("Please enter LoanKit Run Date\n")
     #infynity_process_id = input("Please enter infynity Run Date\n")
     loose = 1
+    workers = 1
+    cache = True
+    always_write_detail = False
+    vectorised = False
+    money_cents = False
+    metrics = False
+    profile = False
+    tabs = ()
+    stream = False
+    incremental = False
     loankit_process_id = "22369"
     infynity_process_id = "15034_Tue_Jul_14_2020"
     referrer_loankit_dir = f"""/home/qaisar/rcti_comparison/commission-comparer-infynity/inputs/loankit/{loankit_process_id}/referrers"""
@@ -257,22 +476,56 @@ if __name__ == '__main__':
     rcti_compare_referrer(
          loose,
          referrer_loankit_dir,
-         referrer_infynity_dir)
+         referrer_infynity_dir,
+         workers,
+         cache,
+         always_write_detail,
+         money_cents,
+         metrics,
+         profile,
+         incremental)
     rcti_compare_broker(
          loose,
          broker_loankit_dir,
-         broker_infynity_dir)
+         broker_infynity_dir,
+         workers,
+         cache,
+         always_write_detail,
+         money_cents,
+         metrics,
+         profile,
+         incremental)
     rcti_compare_branch(
          loose,
          branch_loankit_dir,
-         branch_infynity_dir)
+         branch_infynity_dir,
+         workers,
+         cache,
+         always_write_detail,
+         vectorised,
+         money_cents,
+         metrics,
+         profile,
+         incremental)
     rcti_compare_executive_summary(
          loose,
          loankit_es_file,
-         infynity_es_file)
+         infynity_es_file,
+         cache,
+         always_write_detail,
+         money_cents,
+         metrics,
+         profile,
+         tabs)
     rcti_compare_aba(
          loankit_aba_file,
-         infynity_aba_file)
+         infynity_aba_file,
+         cache,
+         always_write_detail,
+         money_cents,
+         metrics,
+         profile,
+         stream)
 
     # rcti_compare_referrer(
     #rcti_compare_referrer(
@@ -1,7 +1,30 @@
-from src.model.taxinvoice import TaxInvoice, new_error, OUTPUT_DIR_ABA, get_error_format
+import mmap
+import os
+
+import numpy
+
+from src.model.taxinvoice import TaxInvoice, new_error, OUTPUT_DIR_ABA, ENCODING, get_error_format, count_parsed
+from src.model.metrics import METRICS
 from src.utils import bcolors
 import src.utils as u
 
+# Indexes of the amount fields of each record type, in whole cents. In money cents mode they
+# are compared as numbers so the padding of the field does not matter.
+AMOUNT_FIELDS = {'1': (5, 11), '7': (3, 4, 5)}
+# (start, end) of the fields of each record type within its line
+RECORD_FIELDS = {
+    '0': ((0, 1), (1, 17), (18, 19), (20, 22), (23, 29), (30, 55), (56, 61), (62, 73), (74, 79), (80, 119)),
+    '1': ((0, 1), (1, 7), (8, 16), (17, 18), (18, 19), (20, 29), (30, 61), (62, 79), (80, 86), (87, 95), (96, 111),
+          (112, 119)),
+    '7': ((0, 1), (1, 7), (8, 19), (20, 29), (30, 39), (40, 49), (50, 73), (74, 79), (80, 120)),
+}
+# The control totals are added up from the fields at their offsets in the ABA specification,
+# (start, end) of the transaction code and amount of a detail record and of each file total
+DETAIL_TRANSACTION_CODE = (18, 20)
+DETAIL_AMOUNT = (20, 30)
+TRAILER_TOTALS = (('net', 20, 30), ('credit', 30, 40), ('debit', 40, 50), ('count', 74, 80))
+DEBIT_TRANSACTION_CODE = b'13'
+
 
 class ABAFile(TaxInvoice):
 
@@ -10,76 +33,73 @@ class ABAFile(TaxInvoice):
         self.pair = None
         self.datarows = {}
         self.summary_errors = []
-        self.parse()
+        self.pairs = []
+        self.totals = ControlTotals()
+        self.parse_cached()
 
     def parse(self):
-        file = open(self.full_path, 'r')
-
-        for index, line in enumerate(file.readlines()):
-            if line.startswith('0'):
-                aba_line = self.parse_line_type_0(line)
-                key = u.sanitize(''.join(aba_line))
-                self.datarows[key] = aba_line
-            elif line.startswith('1'):
-                aba_line = self.parse_line_type_1(line)
-                key = u.sanitize(aba_line[7])
-                self.datarows[key] = aba_line
-            elif line.startswith('7'):
-                aba_line = self.parse_line_type_7(line)
-                key = u.sanitize(''.join(aba_line))
-                self.datarows[key] = aba_line
-            else:
+        for index, record in iter_records(self.full_path):
+            key = record_key(record)
+            if key is None:
                 msg = f'There is an invalid ABA line on line {index}'
                 error = new_error(self.filename, self.pair.filename, msg)
                 self.summary_errors.append(error)
+                continue
+            self.totals.add(record)
+            self.datarows[key] = record
 
-    def parse_line_type_0(self, line):
-        return [
-            line[0],
-            line[1:17],
-            line[18:19],
-            line[20:22],
-            line[23:29],
-            line[30:55],
-            line[56:61],
-            line[62:73],
-            line[74:79],
-            line[80:119]
-        ]
-
-    def parse_line_type_1(self, line):
-        return [
-            line[0],
-            line[1:7],
-            line[8:16],
-            line[17],
-            line[18:19],
-            line[20:29],
-            line[30:61],
-            line[62:79],
-            line[80:86],
-            line[87:95],
-            line[96:111],
-            line[112:119]
-        ]
-
-    def parse_line_type_7(self, line):
-        return [
-            line[0],
-            line[1:7],
-            line[8:19],
-            line[20:29],
-            line[30:39],
-            line[40:49],
-            line[50:73],
-            line[74:79],
-            line[80:120]
-        ]
-
-    def process_comparison(self):
-        if self.pair is None:
-            return None
+    def compare(self, margin):
+        # ABA values are compared as text, the margin is not used
+        keys_unmatched = set(self.pair.datarows.keys()) - set(self.datarows.keys())
+        self.pairs = [(self.datarows[key], self.pair.datarows.get(key, None)) for key in self.datarows.keys()]
+        self.pairs += [(None, self.pair.datarows[key]) for key in self.pair.datarows.keys() if key in keys_unmatched]
 
+        batched, differences = self.compare_details()
+        for position, (self_row, pair_row) in enumerate(self.pairs):
+            if pair_row is None:
+                error = new_error(self.filename, self.pair.filename, f'No match found for row', '', '', ' '.join(self_row))
+                self.summary_errors.append(error)
+            elif self_row is None:
+                error = new_error(self.filename, self.pair.filename, f'No match found for row', '', '', '', ' '.join(pair_row))
+                self.summary_errors.append(error)
+            elif self_row.line == pair_row.line:  # Records with the same bytes have nothing to decode
+                continue
+            elif position in batched:
+                if position in differences:
+                    self.summary_errors += field_errors(
+                        self.filename, self.pair.filename, self_row.fields(), pair_row.fields(), differences[position])
+            else:
+                self_row, pair_row = self_row.fields(), pair_row.fields()
+                self.summary_errors += field_errors(
+                    self.filename, self.pair.filename, self_row, pair_row, different_fields(self_row, pair_row))
+
+        self.summary_errors += self.totals.errors(self.filename, self.pair.filename)
+        self.summary_errors += self.pair.totals.errors(self.filename, self.pair.filename, side='b')
+
+    def compare_details(self):
+        """
+            Compares the pairs of detail (type 1) records that are not the same bytes, already joined
+            on their lodgement reference by the keys of datarows, as columns instead of record by
+            record. Returns the positions in pairs compared this way and the indexes of the fields that
+            differ of each of them with differences. Records that are not ASCII are left to the record
+            by record comparison, their fields do not start at a fixed byte.
+        """
+        positions = [position for position, (self_row, pair_row) in enumerate(self.pairs)
+                     if self_row is not None and pair_row is not None and self_row.line != pair_row.line
+                     and self_row.type_ == pair_row.type_ == '1' and self_row.line.isascii()
+                     and pair_row.line.isascii()]
+        if len(positions) == 0:
+            return set(), {}
+
+        table = detail_table([self.pairs[position][0] for position in positions])
+        table_pair = detail_table([self.pairs[position][1] for position in positions])
+        unequal = unequal_details(table, table_pair)
+        differences = {}
+        for row, index in zip(*(array.tolist() for array in numpy.nonzero(unequal))):
+            differences.setdefault(positions[row], []).append(index)
+        return set(positions), differences
+
+    def write_detailed(self):
         workbook = self.create_workbook(OUTPUT_DIR_ABA)
         worksheet = workbook.add_worksheet('ABA Comparison Results')
         fmt_error = get_error_format(workbook)
@@ -88,43 +108,26 @@ class ABAFile(TaxInvoice):
         col_a = 0
         col_b = 13
 
-        keys_unmatched = set(self.pair.datarows.keys()) - set(self.datarows.keys())
-
-        for key in self.datarows.keys():
-            self_row = self.datarows[key]
-            pair_row = self.pair.datarows.get(key, None)
-
+        for self_row, pair_row in self.pairs:
             if pair_row is None:
                 worksheet.write_row(row, col_a, self_row, fmt_error)
-                error = new_error(self.filename, self.pair.filename, f'No match found for row', '', '', ' '.join(self_row))
-                self.summary_errors.append(error)
+            elif self_row is None:
+                worksheet.write_row(row, col_b, pair_row, fmt_error)
             else:
+                self_row, pair_row = self_row.fields(), pair_row.fields()
                 for index, value in enumerate(self_row):
-                    format_ = None if u.sanitize(value) == u.sanitize(pair_row[index]) else fmt_error
+                    equal = equal_amounts(self_row, pair_row, index)
+                    if equal is None:
+                        equal = u.sanitize(value) == u.sanitize(pair_row[index])
+                    format_ = None if equal else fmt_error
                     worksheet.write(row, index, value, format_)
                     worksheet.write(row, index + col_b, pair_row[index], format_)
-
-                    if value != pair_row[index]:
-                        column = self.get_column(value[0], index)
-                        error = new_error(self.filename, self.pair.filename, f'Values of {column} does not match', '', '', value, pair_row[index])
-                        self.summary_errors.append(error)
-
             row += 1
 
-        for key in keys_unmatched:
-            worksheet.write_row(row, col_b, self.pair.datarows[key], fmt_error)
-            error = new_error(self.filename, self.pair.filename, f'No match found for row', '', '', '', ' '.join(self.pair.datarows[key]))
-            self.summary_errors.append(error)
+        workbook.close()
 
-            row += 1
-
-        if len(self.summary_errors) > 0:
-            workbook.close()
-        else:
-            del workbook
-        return self.summary_errors
-
-    def get_column(self, type_, index):
+    @staticmethod
+    def get_column(type_, index):
         c0 = ["Record Type", "Blank1", "Reel Sequence Number", "Name of User's Financial Institution",
                 "Blank2", "Name of Use supplying file1", "Name of Use supplying file2",
                 "Description of entries on file", "Date to be processed", "Blank3"]
@@ -144,8 +147,271 @@ class ABAFile(TaxInvoice):
             return c7[index]
 
 
-def read_file_aba(file: str):
-    print(f'Parsing executive summary file {bcolors.BLUE}{file}{bcolors.ENDC}')
+class ABARecord:
+    """
+        A record of an ABA file kept as the bytes of its line, its fields are only decoded when they
+        are read. It reads like the list of the fields of its record type.
+    """
+    __slots__ = ('line', 'type_')
+
+    def __init__(self, line: bytes):
+        self.line = line
+        self.type_ = chr(line[0]) if line else ''
+
+    def __getitem__(self, index):
+        start, end = RECORD_FIELDS[self.type_][index]
+        if self.line.isascii():
+            return self.line[start:end].decode(ENCODING)
+        return self.line.decode(ENCODING)[start:end]  # Offsets are in characters, not bytes
+
+    def __len__(self):
+        return len(RECORD_FIELDS[self.type_])
+
+    def __iter__(self):
+        return iter(self.fields())
+
+    def fields(self):
+        text = self.line.decode(ENCODING)
+        return [text[start:end] for start, end in RECORD_FIELDS[self.type_]]
+
+    def __repr__(self):
+        return f'ABARecord({self.line!r})'
+
+
+def iter_records(path):
+    """
+        Yields the line number and the ABARecord of each line of an ABA file, one at a time, so the
+        file does not have to fit in memory. The file is memory mapped and only the bytes of the line
+        being yielded are copied. Lines end in LF, CR LF or a lone CR and are all kept ending in LF,
+        as when the file is read as text.
+    """
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            index = 0
+            start = 0
+            size = len(mapped)
+            # Next LF and CR at or after start, size when there is none. Each is only looked for
+            # again once it is passed, so a file without any CR is not searched to its end per line.
+            lf = cr = -1
+            while start < size:
+                if lf < start:
+                    lf = mapped.find(b'\n', start)
+                    lf = size if lf == -1 else lf
+                if cr < start:
+                    cr = mapped.find(b'\r', start)
+                    cr = size if cr == -1 else cr
+                end = min(lf, cr)
+                if end == size:
+                    line = bytes(view[start:size])
+                else:
+                    line = bytes(view[start:end]) + b'\n'
+                yield index, ABARecord(line)
+                index += 1
+                start = end + 2 if end == cr and lf == cr + 1 else end + 1
+
+
+class ControlTotals:
+    """
+        Credit and debit totals and the count of the detail records of an ABA file, added up as the
+        records are read, and the totals its file total (type 7) record declares for them.
+        The net total is the difference between the credit and debit totals.
+    """
+
+    def __init__(self):
+        self.credit = 0
+        self.debit = 0
+        self.count = 0
+        self.unreadable = 0  # Detail records whose amount is not a number
+        self.trailer = None  # Totals of the file total record as they are written in it
+
+    @property
+    def net(self):
+        return abs(self.credit - self.debit)
+
+    def add(self, record):
+        if record.type_ == '1':
+            self.count += 1
+            amount = record.line[DETAIL_AMOUNT[0]:DETAIL_AMOUNT[1]].strip()
+            if not amount.isdigit():
+                self.unreadable += 1
+            elif record.line[DETAIL_TRANSACTION_CODE[0]:DETAIL_TRANSACTION_CODE[1]] == DEBIT_TRANSACTION_CODE:
+                self.debit += int(amount)
+            else:
+                self.credit += int(amount)
+        elif record.type_ == '7':
+            self.trailer = {name: record.line[start:end].decode(ENCODING).strip() for name, start, end in TRAILER_TOTALS}
+
+    def errors(self, file_a, file_b, side='a'):
+        """
+            Errors for the totals of the file total record that are not the ones of the detail records,
+            with the value of the record in the column of the side of the file, a or b.
+        """
+        def error(msg, value):
+            return new_error(file_a, file_b, msg, '', '', *((value, '') if side == 'a' else ('', value)))
+
+        if self.trailer is None:
+            return [error('No file total record found', '')]
+        errors = []
+        if self.unreadable > 0:
+            errors.append(error('Amount of detail records is not a number', self.unreadable))
+        for name, _, _ in TRAILER_TOTALS:
+            total = getattr(self, name)
+            value = self.trailer[name]
+            if not value.isdigit() or int(value) != total:
+                errors.append(error(f'File {name} total does not match the {total} of the detail records', value))
+        return errors
+
+
+def record_key(record):
+    """
+        Key records are matched on, the lodgement reference of detail records and the whole record
+        for the others. None for lines that are not an ABA record.
+    """
+    if record.type_ == '1':
+        return u.sanitize(record[7])
+    if record.type_ in RECORD_FIELDS:
+        return u.sanitize(''.join(record))
+    return None
+
+
+def different_fields(self_row: list, pair_row: list) -> list:
+    indexes = []
+    for index, value in enumerate(self_row):
+        equal = equal_amounts(self_row, pair_row, index)
+        if equal is None:
+            equal = value == pair_row[index]
+        if not equal:
+            indexes.append(index)
+    return indexes
+
+
+def field_errors(file_a, file_b, self_row: list, pair_row: list, indexes) -> list:
+    errors = []
+    for index in indexes:
+        value = self_row[index]
+        column = ABAFile.get_column(value[0], index)
+        errors.append(new_error(file_a, file_b, f'Values of {column} does not match', '', '', value, pair_row[index]))
+    return errors
+
+
+def stream_comparison(file: str, file_pair: str):
+    """
+        Compares two ABA files in a single pass over file, yielding the errors as they are found.
+        Only the bytes of the records of file_pair are kept, indexed by key, each record of file is
+        compared with its pair as it is read and neither is kept afterwards. The control totals of
+        both files are added up along the way and checked against their file total records at the end.
+
+        The errors are the ones ABAFile.compare finds, except for a key repeated in file: each of its
+        records is compared instead of only the last one, so the repeats are reported as unmatched.
+    """
+    filename, filename_pair = split_path(file)[1], split_path(file_pair)[1]
+    totals, totals_pair = ControlTotals(), ControlTotals()
+
+    lines_pair = {}
+    for index, record in iter_records(file_pair):
+        key = record_key(record)
+        if key is None:
+            yield new_error(filename, filename_pair, f'There is an invalid ABA line on line {index}', '', index)
+            continue
+        totals_pair.add(record)
+        lines_pair[key] = record.line
+    METRICS.count('rows_parsed', len(lines_pair))
+
+    rows = 0
+    for index, record in iter_records(file):
+        key = record_key(record)
+        if key is None:
+            yield new_error(filename, filename_pair, f'There is an invalid ABA line on line {index}', index, '')
+            continue
+        totals.add(record)
+        rows += 1
+        line_pair = lines_pair.pop(key, None)
+        if line_pair is None:
+            yield new_error(filename, filename_pair, f'No match found for row', '', '', ' '.join(record))
+        elif record.line != line_pair:
+            self_row, pair_row = record.fields(), ABARecord(line_pair).fields()
+            yield from field_errors(filename, filename_pair, self_row, pair_row, different_fields(self_row, pair_row))
+    METRICS.count('rows_parsed', rows)
+    METRICS.count('files_parsed', 2)
+
+    for line_pair in lines_pair.values():
+        yield new_error(filename, filename_pair, f'No match found for row', '', '', '', ' '.join(ABARecord(line_pair)))
+    yield from totals.errors(filename, filename_pair)
+    yield from totals_pair.errors(filename, filename_pair, side='b')
+
+
+def split_path(file: str):
     filename = file.split('/')[-1]
     dir_ = '/'.join(file.split('/')[:-1]) + '/'
-    return ABAFile(dir_, filename)
+    return dir_, filename
+
+
+def detail_table(records: list):
+    """
+        Decodes detail (type 1) records in bulk into a NumPy structured array with a fixed width bytes
+        column for each of their fields. The records must be ASCII so the field offsets are bytes.
+    """
+    fields = RECORD_FIELDS['1']
+    width = max([len(record.line) for record in records] + [fields[-1][1]])
+    dtype = numpy.dtype({
+        'names': [f'field{index}' for index in range(len(fields))],
+        'formats': [f'S{end - start}' for start, end in fields],
+        'offsets': [start for start, _ in fields],
+        'itemsize': width,
+    })
+    return numpy.array([record.line for record in records], dtype=f'S{width}').view(dtype)
+
+
+def amount_cents(column):
+    """
+        Whole cents of each value of an amount column and whether the value is made of digits only,
+        the cents of the other values are 0.
+    """
+    stripped = numpy.char.strip(column)
+    digits = numpy.char.isdigit(stripped)
+    cents = numpy.zeros(len(column), dtype=numpy.int64)
+    cents[digits] = stripped[digits].astype(numpy.int64)
+    return cents, digits
+
+
+def unequal_details(table, table_pair):
+    """
+        Fields that differ between the detail records at the same position of two tables, as a
+        (records, fields) boolean array. Fields are compared as bytes, in money cents mode the amounts
+        made of digits on both sides are compared as integer cents as equal_amounts() does.
+    """
+    names = table.dtype.names
+    unequal = numpy.empty((len(table), len(names)), dtype=bool)
+    for index, name in enumerate(names):
+        unequal[:, index] = table[name] != table_pair[name]
+    if u.MONEY_CENTS:
+        for index in AMOUNT_FIELDS['1']:
+            cents, digits = amount_cents(table[names[index]])
+            cents_pair, digits_pair = amount_cents(table_pair[names[index]])
+            both = digits & digits_pair
+            unequal[both, index] = cents[both] != cents_pair[both]
+    return unequal
+
+
+def equal_amounts(self_row, pair_row, index):
+    """
+        Compares the index-th field of two records of the same type as whole cents when it is an
+        amount and money cents mode is on. Returns None when the field can not be compared that way.
+    """
+    if not u.MONEY_CENTS or self_row[0] != pair_row[0] or index not in AMOUNT_FIELDS.get(self_row[0], ()):
+        return None
+    value, value_pair = self_row[index].strip(), pair_row[index].strip()
+    if not value.isdigit() or not value_pair.isdigit():
+        return None
+    return int(value) == int(value_pair)
+
+
+def read_file_aba(file: str):
+    print(f'Parsing executive summary file {bcolors.BLUE}{file}{bcolors.ENDC}')
+    dir_, filename = split_path(file)
+    with METRICS.phase('read_files'):
+        invoice = ABAFile(dir_, filename)
+    count_parsed(invoice)
+    return invoice
@@ -1,12 +1,12 @@
 
 import numpy
-import pandas
 import xlrd
 import copy
-import hashlib
 
-from src.model.taxinvoice import (TaxInvoice, InvoiceRow, ENCODING, new_error, OUTPUT_DIR_EXEC_SUMMARY,
-                                  get_header_format, get_error_format)
+from src.model.taxinvoice import (TaxInvoice, InvoiceRow, WorkbookReader, new_error, OUTPUT_DIR_EXEC_SUMMARY,
+                                  NULL_WORKSHEET, PARSE_CACHE, get_header_format, get_error_format, write_pairs,
+                                  row_key, row_key_full)
+from src.model.metrics import METRICS
 from src import utils as u
 from src.utils import bcolors
 
@@ -28,24 +28,41 @@ class ExecutiveSummary(TaxInvoice):
         'Branch Fee Summary Report': 'Branch Summary Report'
     }
 
-    def __init__(self, directory, filename):
+    # Attribute holding the rows of each tab, with the tab and the method that parses it.
+    # Tabs are only parsed the first time their attribute is read, see __getattr__
+    TAB_PARSERS = {
+        'datarows_lender_upfront': ('Lender Upfront Records', 'parse_lender'),
+        'datarows_lender_trail': ('Lender Trail Records', 'parse_lender'),
+        'datarows_lender_vbi': ('Lender VBI Records', 'parse_lender'),
+        'datarows_branch_summary': ('Branch Summary Report', 'parse_branch'),
+        'datarows_branch_fee_summary': ('Branch Fee Summary Report', 'parse_branch'),
+        'datarows_broker_summary': ('Broker Summary Report', 'parse_broker'),
+        'datarows_broker_fee_summary': ('Broker Fee Summary Report', 'parse_broker'),
+        'datarows_executive_summary': ('Executive Summary Report', 'parse_executive_summary'),
+        'datarows_referrer': ('Referrer Summary Report', 'parse_referrer'),
+        'datarows_de_file_entries': ('DE File Entries', 'parse_de'),
+        'datarows_de_file_notpaid': ('DE File - Amount Not Paid', 'parse_de'),
+        'datarows_fee': ('Fee Summary Report', 'parse_executive_summary'),
+    }
+
+    def __init__(self, directory, filename, tabs=None):
         TaxInvoice.__init__(self, directory, filename)
-        self.datarows_branch_summary = {}
-        self.datarows_branch_fee_summary = {}
-        self.datarows_broker_summary = {}
-        self.datarows_broker_fee_summary = {}
-        self.datarows_lender_upfront = {}
-        self.datarows_lender_trail = {}
-        self.datarows_lender_vbi = {}
-        self.datarows_executive_summary = {}
-        self.datarows_referrer = {}
-        self.datarows_de_file_entries = {}
-        self.datarows_de_file_notpaid = {}
-        self.datarows_fee = {}
+        self.tabs = tabs  # Tabs compared, all of them when None
         self.summary_errors = []  # List of errors found during the comparison
+        self.pairs = {}  # Pairs of rows found by compare() for each tab
         self.pair = None
         self.margin = 0  # margin of error acceptable for numeric comprisons
-        self.parse()
+        self._reader = None
+        self._cache_key = None
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set, which for the datarows_* ones means the tab
+        # was not parsed yet
+        if name not in ExecutiveSummary.TAB_PARSERS:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        rows = self.parse_tab(name)
+        setattr(self, name, rows)
+        return rows
 
     def __add_datarow(self, datarows_dict, counter_dict, row):
         if row.key_full in datarows_dict.keys():  # If the row already exists
@@ -57,19 +74,54 @@ class ExecutiveSummary(TaxInvoice):
             datarows_dict[row.key_full] = row  # Add row to the list
 
     def parse(self):
-        xl = pandas.ExcelFile(self.full_path)
-        self.datarows_lender_upfront = self.parse_lender(xl, 'Lender Upfront Records')
-        self.datarows_lender_trail = self.parse_lender(xl, 'Lender Trail Records')
-        self.datarows_lender_vbi = self.parse_lender(xl, 'Lender VBI Records')
-        self.datarows_branch_summary = self.parse_branch(xl, 'Branch Summary Report')
-        self.datarows_branch_fee_summary = self.parse_branch(xl, 'Branch Fee Summary Report')
-        self.datarows_broker_summary = self.parse_broker(xl, 'Broker Summary Report')
-        self.datarows_broker_fee_summary = self.parse_broker(xl, 'Broker Fee Summary Report')
-        self.datarows_executive_summary = self.parse_executive_summary(xl, 'Executive Summary Report')
-        self.datarows_referrer = self.parse_referrer(xl, 'Referrer Summary Report')
-        self.datarows_de_file_entries = self.parse_de(xl, 'DE File Entries')
-        self.datarows_de_file_notpaid = self.parse_de(xl, 'DE File - Amount Not Paid')
-        self.datarows_fee = self.parse_executive_summary(xl, 'Fee Summary Report')
+        # Parses every tab now instead of when they are first read
+        for attr in ExecutiveSummary.TAB_PARSERS:
+            getattr(self, attr)
+
+    def parse_tab(self, attr):
+        """
+            Parses the tab behind a datarows_* attribute. Each tab has its own parse cache entry so
+            only the tabs that are read get parsed or loaded.
+        """
+        tab, parser = ExecutiveSummary.TAB_PARSERS[attr]
+        with METRICS.phase('read_files'):
+            if not PARSE_CACHE.enabled:
+                rows = getattr(self, parser)(self.reader, tab)
+            else:
+                key = PARSE_CACHE.sub_key(self.cache_key, attr)
+                rows = PARSE_CACHE.load(key)
+                if rows is None:
+                    rows = getattr(self, parser)(self.reader, tab)
+                    PARSE_CACHE.store(key, rows)
+        METRICS.count('rows_parsed', len(rows))
+        return rows
+
+    def parse_compared_tabs(self):
+        """
+            Parses the tabs compare() reads from this file and from its pair, which otherwise
+            happens as compare() reaches them.
+        """
+        for _, attr, attr_pair, _, _ in self.comparison_tabs():
+            getattr(self, attr)
+            getattr(self.pair, attr_pair)
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            self._reader = WorkbookReader(self.full_path)
+        return self._reader
+
+    def close_reader(self):
+        if self._reader is not None:
+            self._reader.close()
+        self._reader = None
+
+    @property
+    def cache_key(self):
+        if self._cache_key is None:
+            # Rows keep their numbers as whole cents in money cents mode, so each mode has its own entries
+            self._cache_key = PARSE_CACHE.key(self.full_path, type(self), 'cents' if u.MONEY_CENTS else '')
+        return self._cache_key
 
     def parse_referrer(self, xl, tab):
         df = xl.parse(tab)
@@ -190,9 +242,7 @@ class ExecutiveSummary(TaxInvoice):
                 except KeyError:
                     pass
 
-            for index, row in df.iterrows():
-                drow = df.loc[df['Branch ID'] == row['Branch ID']].to_dict(orient='records')[0]
-                drow['line'] = index
+            for drow in self.records_by_id(df, 'Branch ID'):
                 if drow['Branch ID'] not in ['Total', '']:
                     drow['Branch ID'] = int(drow['Branch ID'])
                 rows[drow['Branch ID']] = drow
@@ -242,25 +292,13 @@ class ExecutiveSummary(TaxInvoice):
                     pass
 
             if 'Broker Name (ID)' in list(df):
-                df['Broker Name'] = ''
-                df['Broker ID'] = ''
-                df['Branch Name'] = ''
-                df['Branch ID'] = ''
-                for index, row in df.iterrows():
-                    try:
-                        row['Broker Name'] = row['Broker Name (ID)'].rsplit('(', 1)[0].strip()
-                        row['Broker ID'] = row['Broker Name (ID)'].rsplit('(', 1)[1][:-1]
-                        row['Branch Name'] = row['Branch Name (ID)'].rsplit('(', 1)[0].strip()
-                        row['Branch ID'] = row['Branch Name (ID)'].rsplit('(', 1)[1][:-1]
-                    except IndexError:
-                        row['Broker Name'] = 'Total'
-                        row['Broker ID'] = 'Total'
-                        row['Branch Name'] = 'Total'
-                        row['Branch ID'] = 'Total'
-                    df.loc[index].at['Broker Name'] = row['Broker Name']
-                    df.loc[index].at['Broker ID'] = row['Broker ID']
-                    df.loc[index].at['Branch Name'] = row['Branch Name']
-                    df.loc[index].at['Branch ID'] = row['Branch ID']
+                broker_name, broker_id = self.split_name_id(df['Broker Name (ID)'])
+                branch_name, branch_id = self.split_name_id(df['Branch Name (ID)'])
+                total = broker_id.isna() | branch_id.isna()  # The total row has no IDs
+                df['Broker Name'] = broker_name.mask(total, 'Total')
+                df['Broker ID'] = broker_id.mask(total, 'Total')
+                df['Branch Name'] = branch_name.mask(total, 'Total')
+                df['Branch ID'] = branch_id.mask(total, 'Total')
                 df = df.drop(['Broker Name (ID)'], axis=1)
                 df = df.drop(['Branch Name (ID)'], axis=1)
 
@@ -272,9 +310,7 @@ class ExecutiveSummary(TaxInvoice):
             df = self.replace_keys(replaces, df)
 
             field_id = 'Broker ID'
-            for index, row in df.iterrows():
-                drow = df.loc[df[field_id] == row[field_id]].to_dict(orient='records')[0]
-                drow['line'] = index
+            for drow in self.records_by_id(df, field_id):
                 rows[drow[field_id]] = drow
         except xlrd.biffh.XLRDError:
             print(f"{bcolors.YELLOW}No sheet named {tab} found in {bcolors.BLUE}{self.full_path}{bcolors.ENDC}")
@@ -337,77 +373,75 @@ class ExecutiveSummary(TaxInvoice):
                 del df[key]
         return df
 
-    def process_comparison(self, margin=0.000001):
-        assert type(self.pair) == type(self), "self.pair is not of the correct type"
+    def comparison_tabs(self):
+        """
+            Tabs in the order they are written to the DETAILED file as
+            (tab, datarows attribute, pair datarows attribute, row class, header).
+            Tabs without a row class are compared column by column with comapre_dicts.
+            Only the selected tabs are returned when the file was opened with a list of tabs.
+        """
+        tabs = [
+            ('Executive Summary Report', 'datarows_executive_summary', 'datarows_executive_summary',
+             ExecutiveSummaryRow, HEADER_EXECUTIVE_SUMMARY),
+            ('Fee Summary Report', 'datarows_fee', 'datarows_fee', ExecutiveSummaryRow, HEADER_EXECUTIVE_SUMMARY),
+            ('Lender Upfront Records', 'datarows_lender_upfront', 'datarows_lender_upfront',
+             LenderExecutiveSummaryRow, HEADER_LENDER),
+            ('Lender Trail Records', 'datarows_lender_trail', 'datarows_lender_trail',
+             LenderExecutiveSummaryRow, HEADER_LENDER),
+            ('Lender VBI Records', 'datarows_lender_vbi', 'datarows_lender_vbi', LenderExecutiveSummaryRow, HEADER_LENDER),
+            ('Branch Summary Report', 'datarows_branch_summary', 'datarows_branch_summary', None, None),
+            ('Branch Fee Summary Report', 'datarows_branch_fee_summary', 'datarows_branch_summary', None, None),
+            ('Broker Summary Report', 'datarows_broker_summary', 'datarows_broker_summary', None, None),
+            ('Broker Fee Summary Report', 'datarows_broker_fee_summary', 'datarows_broker_summary', None, None),
+            ('Referrer Summary Report', 'datarows_referrer', 'datarows_referrer', ReferrerExecutiveSummaryRow, HEADER_REFERRER),
+            ('DE File Entries', 'datarows_de_file_entries', 'datarows_de_file_entries', DEExecutiveSummaryRow, HEADER_DE),
+            ('DE File - Amount Not Paid', 'datarows_de_file_notpaid', 'datarows_de_file_notpaid',
+             DEExecutiveSummaryRow, HEADER_DE),
+        ]
+        if self.tabs is None:
+            return tabs
+        return [item for item in tabs if item[0] in self.tabs]
+
+    def compare(self, margin):
+        self.margin = margin
+        self.pairs = {}
+        for tab, attr, attr_pair, cls, _ in self.comparison_tabs():
+            datarows = getattr(self, attr)
+            datarows_pair = getattr(self.pair, attr_pair)
+            if cls is None:
+                self.pairs[tab] = self.compare_generic(tab, datarows, datarows_pair)
+            else:
+                self.pairs[tab] = self.compare_specific(tab, datarows, datarows_pair, cls)
+
+        # Every tab compared is parsed by now
+        self.close_reader()
+        self.pair.close_reader()
 
-        if self.pair is None:
-            return None
+    def compare_generic(self, tab, dict_a, dict_b):
+        keys_unmatched = set(dict_b.keys()) - set(dict_a.keys())
+        pairs = [(dict_a[key], dict_b.get(key, None)) for key in dict_a.keys()]
+        pairs += [(None, dict_b[key]) for key in dict_b.keys() if key in keys_unmatched]
 
-        workbook = self.create_workbook(OUTPUT_DIR_EXEC_SUMMARY)
+        for self_row, pair_row in pairs:
+            self.summary_errors += comapre_dicts(
+                NULL_WORKSHEET, 0, self_row, pair_row, self.margin, self.filename, self.pair.filename, None, tab)
+        return pairs
 
-        self.process_specific(
-            workbook, 'Executive Summary Report',
-            self.datarows_executive_summary, self.pair.datarows_executive_summary,
-            ExecutiveSummaryRow, HEADER_EXECUTIVE_SUMMARY)
-
-        self.process_specific(
-            workbook, 'Fee Summary Report',
-            self.datarows_fee, self.pair.datarows_fee,
-            ExecutiveSummaryRow, HEADER_EXECUTIVE_SUMMARY)
-
-        self.process_specific(
-            workbook, 'Lender Upfront Records',
-            self.datarows_lender_upfront, self.pair.datarows_lender_upfront,
-            LenderExecutiveSummaryRow, HEADER_LENDER)
-
-        self.process_specific(
-            workbook, 'Lender Trail Records',
-            self.datarows_lender_trail, self.pair.datarows_lender_trail,
-            LenderExecutiveSummaryRow, HEADER_LENDER)
-
-        self.process_specific(
-            workbook, 'Lender VBI Records',
-            self.datarows_lender_vbi, self.pair.datarows_lender_vbi,
-            LenderExecutiveSummaryRow, HEADER_LENDER)
-
-        self.process_generic(
-            workbook, 'Branch Summary Report',
-            self.datarows_branch_summary, self.pair.datarows_branch_summary)
-
-        self.process_generic(
-            workbook, 'Branch Fee Summary Report',
-            self.datarows_branch_fee_summary, self.pair.datarows_branch_summary)
-
-        self.process_generic(
-            workbook, 'Broker Summary Report',
-            self.datarows_broker_summary, self.pair.datarows_broker_summary)
-
-        self.process_generic(
-            workbook, 'Broker Fee Summary Report',
-            self.datarows_broker_fee_summary, self.pair.datarows_broker_summary)
-
-        self.process_specific(
-            workbook, 'Referrer Summary Report',
-            self.datarows_referrer, self.pair.datarows_referrer,
-            ReferrerExecutiveSummaryRow, HEADER_REFERRER)
-
-        self.process_specific(
-            workbook, 'DE File Entries',
-            self.datarows_de_file_entries, self.pair.datarows_de_file_entries,
-            DEExecutiveSummaryRow, HEADER_DE)
-
-        self.process_specific(
-            workbook, 'DE File - Amount Not Paid',
-            self.datarows_de_file_notpaid, self.pair.datarows_de_file_notpaid,
-            DEExecutiveSummaryRow, HEADER_DE)
-
-        if len(self.summary_errors) > 0:
-            workbook.close()
-        else:
-            del workbook
-        return self.summary_errors
+    def compare_specific(self, tab, datarows, datarows_pair, cls):
+        pairs = self.match_rows(datarows, datarows_pair, self.margin)
+        self.summary_errors += write_pairs(NULL_WORKSHEET, self, pairs, 0, None, cls.write_row)
+        return pairs
+
+    def write_detailed(self):
+        workbook = self.create_workbook(OUTPUT_DIR_EXEC_SUMMARY)
+        for tab, attr, _, cls, header in self.comparison_tabs():
+            if cls is None:
+                self.write_generic(workbook, tab, getattr(self, attr), self.pairs[tab])
+            else:
+                self.write_specific(workbook, tab, self.pairs[tab], cls, header)
+        workbook.close()
 
-    def process_generic(self, workbook, tab, dict_a, dict_b):
+    def write_generic(self, workbook, tab, dict_a, pairs):
         worksheet = workbook.add_worksheet(tab)
         fmt_table_header = get_header_format(workbook)
         fmt_error = get_error_format(workbook)
@@ -425,25 +459,13 @@ class ExecutiveSummary(TaxInvoice):
             worksheet.write(row, col_b + index, item, fmt_table_header)
         row += 1
 
-        keys_unmatched = set(dict_b.keys()) - set(dict_a.keys())
-
-        for key in dict_a.keys():
-            self_row = dict_a[key]
-            pair_row = dict_b.get(key, None)
-
-            self.summary_errors += comapre_dicts(
+        for self_row, pair_row in pairs:
+            comapre_dicts(
                 worksheet, row, self_row, pair_row, self.margin, self.filename, self.pair.filename,
                 fmt_error, tab)
             row += 1
 
-        # Write unmatched records
-        for key in keys_unmatched:
-            self.summary_errors += comapre_dicts(
-                worksheet, row, None, dict_b[key], self.margin,
-                self.filename, self.pair.filename, fmt_error, tab)
-            row += 1
-
-    def process_specific(self, workbook, tab, datarows, datarows_pair, cls, header):
+    def write_specific(self, workbook, tab, pairs, cls, header):
         worksheet = workbook.add_worksheet(tab)
         fmt_table_header = get_header_format(workbook)
         fmt_error = get_error_format(workbook)
@@ -457,56 +479,7 @@ class ExecutiveSummary(TaxInvoice):
             worksheet.write(row, col_b + index, item, fmt_table_header)
         row += 1
 
-        keys_unmatched = set(datarows_pair.keys()) - set(datarows.keys())
-
-        # Code below is just to find the errors and write them into the spreadsheets
-        for key_full in datarows.keys():
-            self_row = datarows[key_full]
-            self_row.margin = self.margin
-
-            pair_row = self.find_pair_row(datarows_pair, self_row)
-            self_row.pair = pair_row
-
-            if pair_row is not None:
-                # delete from pair list so it doesn't get matched again
-                del datarows_pair[pair_row.key_full]
-                # Remove the key from the keys_unmatched if it is there
-                if pair_row.key_full in keys_unmatched:
-                    keys_unmatched.remove(pair_row.key_full)
-
-                pair_row.margin = self.margin
-                pair_row.pair = self_row
-                self.summary_errors += cls.write_row(
-                    worksheet, self, pair_row, row, fmt_error, 'right', write_errors=False)
-
-            self.summary_errors += cls.write_row(worksheet, self, self_row, row, fmt_error)
-            row += 1
-
-        # Write unmatched records
-        for key in keys_unmatched:
-            self.summary_errors += cls.write_row(
-                worksheet, self, datarows_pair[key], row, fmt_error, 'right', write_errors=False)
-            row += 1
-
-    def find_pair_row(self, datarows_pair, row):
-        # Match by full_key
-        pair_row = datarows_pair.get(row.key_full, None)
-        if pair_row is not None:
-            return pair_row
-
-        # We want to match by similarity before matching by the key
-        # Match by similarity
-        for _, item in datarows_pair.items():
-            if row.equals(item):
-                return item
-
-        # Match by key
-        for _, item in datarows_pair.items():
-            if row.key == item.key:
-                return item
-
-        # Return None if nothing found
-        return None
+        write_pairs(worksheet, self, pairs, row, fmt_error, cls.write_row)
 
     def new_error(self, msg, line_a='', line_b='', value_a='', value_b='', tab=''):
         return new_error(self.filename, self.pair.filename, msg, line_a, line_b, value_a, value_b, tab)
@@ -518,6 +491,25 @@ class ExecutiveSummary(TaxInvoice):
         df = df.replace('Pmt ', 'Payment ', regex=True)
         return df
 
+    def records_by_id(self, df, field_id):
+        """
+            Yields the record of each row of df in a single pass. A row whose ID was already seen gets
+            the values of the first row with that ID, only its 'line' is its own index.
+        """
+        first_records = {}
+        for index, record in zip(df.index, df.to_dict(orient='records')):
+            drow = dict(first_records.setdefault(record[field_id], record))
+            drow['line'] = index
+            yield drow
+
+    def split_name_id(self, column):
+        """
+            Splits a "Name (ID)" column into a name and an ID column, the ID is NaN where the value
+            has no "(".
+        """
+        parts = column.astype(str).str.rsplit('(', n=1)
+        return parts.str[0].str.strip(), parts.str[1].str[:-1]
+
     def parse_broker_name(self, val):
         if len(val) == 0:
             return val
@@ -615,20 +607,18 @@ class LenderExecutiveSummaryRow(InvoiceRow):
     # endregion
 
     def _generate_key(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(u.sanitize(self.bank).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key(u.sanitize(self.bank), salt)
 
     def _generate_key_full(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(self.bank.encode(ENCODING))
-        sha.update(self.bank_detailed_name.encode(ENCODING))
-        sha.update(str(self.settlement_amount).encode(ENCODING))
-        sha.update(str(self.commission_amount_exc_gst).encode(ENCODING))
-        sha.update(str(self.gst).encode(ENCODING))
-        sha.update(str(self.commission_amount_inc_gst).encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key_full(
+            self.bank,
+            self.bank_detailed_name,
+            str(self.settlement_amount),
+            str(self.commission_amount_exc_gst),
+            str(self.gst),
+            str(self.commission_amount_inc_gst),
+            salt,
+        )
 
     def equals(self, obj):
         if type(obj) != LenderExecutiveSummaryRow:
@@ -643,6 +633,12 @@ class LenderExecutiveSummaryRow(InvoiceRow):
             and self.compare_numbers(self.commission_amount_inc_gst, obj.commission_amount_inc_gst, self.margin)
         )
 
+    def match_identity(self):
+        return (u.sanitize(self.bank), u.sanitize(self.bank_detailed_name))
+
+    def match_amount(self):
+        return self.commission_amount_inc_gst
+
     @staticmethod
     def write_row(worksheet, invoice, element, row, fmt_error, side='left', write_errors=True):
         col = 0
@@ -773,17 +769,10 @@ class ExecutiveSummaryRow(InvoiceRow):
     # endregion
 
     def _generate_key(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(u.sanitize(self.description).encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key(u.sanitize(self.description), salt)
 
     def _generate_key_full(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(self.description.encode(ENCODING))
-        sha.update(str(self.value).encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key_full(self.description, str(self.value), salt)
 
     def equals(self, obj):
         if type(obj) != ExecutiveSummaryRow:
@@ -791,6 +780,12 @@ class ExecutiveSummaryRow(InvoiceRow):
 
         return u.sanitize(self.description) == u.sanitize(obj.description) and self.compare_numbers(self.value, obj.value, self.margin)
 
+    def match_identity(self):
+        return (u.sanitize(self.description),)
+
+    def match_amount(self):
+        return self.value
+
     @staticmethod
     def write_row(worksheet, invoice, element, row, fmt_error, side='left', write_errors=True):
         col = 0
@@ -919,24 +914,19 @@ class ReferrerExecutiveSummaryRow(InvoiceRow):
     # endregion
 
     def _generate_key(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(u.sanitize(self.branch_id).encode(ENCODING))
-        sha.update(u.sanitize(self.branch_name).encode(ENCODING))
-        sha.update(u.sanitize(self.referrer_name).encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key(u.sanitize(self.branch_id), u.sanitize(self.branch_name), u.sanitize(self.referrer_name), salt)
 
     def _generate_key_full(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(u.sanitize(self.branch_id).encode(ENCODING))
-        sha.update(u.sanitize(self.branch_name).encode(ENCODING))
-        sha.update(u.sanitize(self.referrer_name).encode(ENCODING))
-        sha.update(u.sanitize(str(self.opening_balance)).encode(ENCODING))
-        sha.update(u.sanitize(str(self.commission_paid)).encode(ENCODING))
-        sha.update(u.sanitize(str(self.total_amount_banked)).encode(ENCODING))
-        sha.update(u.sanitize(str(self.closing_balance)).encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key_full(
+            u.sanitize(self.branch_id),
+            u.sanitize(self.branch_name),
+            u.sanitize(self.referrer_name),
+            u.sanitize(str(self.opening_balance)),
+            u.sanitize(str(self.commission_paid)),
+            u.sanitize(str(self.total_amount_banked)),
+            u.sanitize(str(self.closing_balance)),
+            salt,
+        )
 
     def equals(self, obj):
         if type(obj) != LenderExecutiveSummaryRow:
@@ -952,6 +942,12 @@ class ReferrerExecutiveSummaryRow(InvoiceRow):
             and self.compare_numbers(self.closing_balance, obj.closing_balance, self.margin)
         )
 
+    def match_identity(self):
+        return (u.sanitize(self.branch_id), u.sanitize(self.branch_name), u.sanitize(self.referrer_name))
+
+    def match_amount(self):
+        return self.commission_paid
+
     @staticmethod
     def write_row(worksheet, invoice, element, row, fmt_error, side='left', write_errors=True):
         col = 0
@@ -1127,26 +1123,22 @@ class DEExecutiveSummaryRow(InvoiceRow):
     # endregion
 
     def _generate_key(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(u.sanitize(self.bsb).encode(ENCODING))
-        sha.update(u.sanitize(self.account).encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key(u.sanitize(self.bsb), u.sanitize(self.account), salt)
 
     def _generate_key_full(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(u.sanitize(self.aggregator).encode(ENCODING))
-        sha.update(u.sanitize(self.aggregator_bsb_number).encode(ENCODING))
-        sha.update(u.sanitize(self.aggregator_acc_number).encode(ENCODING))
-        sha.update(u.sanitize(self.branch_id).encode(ENCODING))
-        sha.update(u.sanitize(self.agent_type).encode(ENCODING))
-        sha.update(u.sanitize(self.company_name).encode(ENCODING))
-        sha.update(u.sanitize(self.bank_account_name).encode(ENCODING))
-        sha.update(u.sanitize(self.bsb).encode(ENCODING))
-        sha.update(u.sanitize(self.account).encode(ENCODING))
-        sha.update(u.sanitize(str(self.amount_banked)).encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key_full(
+            u.sanitize(self.aggregator),
+            u.sanitize(self.aggregator_bsb_number),
+            u.sanitize(self.aggregator_acc_number),
+            u.sanitize(self.branch_id),
+            u.sanitize(self.agent_type),
+            u.sanitize(self.company_name),
+            u.sanitize(self.bank_account_name),
+            u.sanitize(self.bsb),
+            u.sanitize(self.account),
+            u.sanitize(str(self.amount_banked)),
+            salt,
+        )
 
     def equals(self, obj):
         if type(obj) != LenderExecutiveSummaryRow:
@@ -1165,6 +1157,22 @@ class DEExecutiveSummaryRow(InvoiceRow):
             and u.compare_numbers(self.amount_banked, obj.amount_banked, self.margin)
         )
 
+    def match_identity(self):
+        return (
+            u.sanitize(self.aggregator),
+            u.sanitize(self.aggregator_bsb_number),
+            u.sanitize(self.aggregator_acc_number),
+            u.sanitize(self.branch_id),
+            u.sanitize(self.agent_type),
+            u.sanitize(self.company_name),
+            u.sanitize(self.bank_account_name),
+            u.sanitize(self.bsb),
+            u.sanitize(self.account)
+        )
+
+    def match_amount(self):
+        return self.amount_banked
+
     @staticmethod
     def write_row(worksheet, invoice, element, row, fmt_error, side='left', write_errors=True):
         col = 0
@@ -1315,8 +1323,12 @@ def compare_values(val_a, val_b, margin):
         return u.sanitize(val_a) == u.sanitize(val_b)
 
 
-def read_file_exec_summary(file: str):
+def read_file_exec_summary(file: str, tabs=None):
+    """
+        Opens an executive summary file, its tabs are only parsed when the comparison reads them.
+    """
     print(f'Parsing executive summary file {bcolors.BLUE}{file}{bcolors.ENDC}')
     filename = file.split('/')[-1]
     dir_ = '/'.join(file.split('/')[:-1]) + '/'
-    return ExecutiveSummary(dir_, filename)
+    METRICS.count('files_parsed')
+    return ExecutiveSummary(dir_, filename, tabs)
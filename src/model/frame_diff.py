@@ -0,0 +1,57 @@
+import numpy
+
+from src import utils as u
+
+
+def diff_frames(frame_a, frame_b, identity_a, identity_b, key_a, key_b, numeric_columns: list, margin):
+    """
+        Finds the rows of two data tab frames that are equal without creating any row object.
+
+        Only rows the row by row comparison would pair with each other whatever the other rows are
+        taken out here: rows whose identity (match_identity()) and key are not shared with any other
+        row of their frame, joined with the row of the other frame with the same identity and key.
+        All the numeric columns of the joined rows are checked against the margin at once.
+        Returns the (label in frame_a, label in frame_b) arrays of the equal pairs and the labels of
+        the rows left in each frame, which still have to go through the row by row comparison.
+    """
+    position_a, position_b = join_unique(identity_a, identity_b, key_a, key_b)
+
+    values_a = frame_a[numeric_columns].to_numpy(dtype=float)[position_a]
+    values_b = frame_b[numeric_columns].to_numpy(dtype=float)[position_b]
+    equal = u.compare_numbers_batch(values_a, values_b, margin).all(axis=1)
+    position_a = position_a[equal]
+    position_b = position_b[equal]
+
+    left_a = numpy.ones(len(frame_a), dtype=bool)
+    left_a[position_a] = False
+    left_b = numpy.ones(len(frame_b), dtype=bool)
+    left_b[position_b] = False
+
+    equal_pairs = (frame_a.index[position_a], frame_b.index[position_b])
+    return equal_pairs, frame_a.index[left_a], frame_b.index[left_b]
+
+
+def join_unique(identity_a, identity_b, key_a, key_b):
+    """
+        Returns the positions of the rows of identity_a and identity_b that have the same identity
+        and the same key, sorted by the position in identity_a. Rows that share their identity or
+        their key with another row of the same frame are left out, the row by row comparison pairs
+        them by their full key first, which an identity alone does not tell apart.
+    """
+    columns = list(identity_a.columns) + [f'_key_{column}' for column in key_a.columns]
+    left = unique_rows(identity_a, key_a)
+    right = unique_rows(identity_b, key_b)
+    joined = left.merge(right, on=columns, how='inner', suffixes=('_a', '_b'))
+    joined = joined.sort_values('_position_a', kind='stable')
+    return joined['_position_a'].to_numpy(dtype=int), joined['_position_b'].to_numpy(dtype=int)
+
+
+def unique_rows(identity, key):
+    identity = identity.reset_index(drop=True)
+    key = key.reset_index(drop=True)
+    unique = ~identity.duplicated(keep=False) & ~key.duplicated(keep=False)
+    rows = identity.copy()
+    for column in key.columns:
+        rows[f'_key_{column}'] = key[column]
+    rows['_position'] = numpy.arange(len(identity))
+    return rows[unique.to_numpy()]
@@ -0,0 +1,127 @@
+import json
+import os
+import pickle
+from collections import deque
+
+from src.model.metrics import METRICS
+from src.model.parse_cache import file_fingerprint
+
+# Bump this whenever the entries change so manifests of older runs are not reused
+MANIFEST_VERSION = 2
+
+
+class ComparisonManifest:
+    """
+        Record of a directory comparison kept in the PID output directory, so running the same
+        comparison again with that PID only parses and compares the pairs whose files changed.
+
+        Each pair is stored under its invoice key with the name, size, mtime and SHA-256 of both
+        files and the DETAILED file written for it. Its errors are pickled next to the manifest, as
+        the summary spools them, so dates and numbers come back with their own types. A pair is
+        reused when both of its files are still there with the same content and the comparison is
+        run with the same settings, its errors go into the new summary in the position of its
+        Loankit file. Files are only hashed again when their size or mtime changed.
+    """
+
+    def __init__(self, file, settings: dict):
+        self.file = file
+        self.errors_file = os.path.splitext(file)[0] + '_errors.pickle'
+        self.settings = dict(settings, version=MANIFEST_VERSION)
+        self.previous, self.previous_errors = self.load()
+        self.pairs = {}  # Entries of this run, reused and new
+        self.errors = {}  # Errors of each entry of this run
+        self._reused = deque()  # (position of file_a, errors) of the reused pairs not in the summary yet
+        self._positions = {}  # Position of each file_a in its directory listing
+        self._fingerprints = {}  # file_fingerprint() of the files reuse() had to hash
+
+    def load(self):
+        try:
+            with open(self.file) as file:
+                manifest = json.load(file)
+            with open(self.errors_file, 'rb') as file:
+                errors = pickle.load(file)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return {}, {}
+        if manifest.get('settings') != self.settings:
+            return {}, {}
+        return manifest.get('pairs', {}), errors
+
+    def reuse(self, dir_a, files_a: list, dir_b, files_b: list):
+        """
+            Picks the pairs of the previous run whose files did not change. Returns the files of each
+            directory that still have to be parsed.
+        """
+        self._positions = {file: position for position, file in enumerate(files_a)}
+        present_a, present_b = set(files_a), set(files_b)
+        reused = []
+        for key, entry in self.previous.items():
+            if (key in self.previous_errors
+                    and entry['file_a'] in present_a and entry['file_b'] in present_b
+                    and self._unchanged(os.path.join(dir_a, entry['file_a']), entry, 'a')
+                    and self._unchanged(os.path.join(dir_b, entry['file_b']), entry, 'b')
+                    and (entry['detailed_file'] is None or os.path.exists(entry['detailed_file']))):
+                self.pairs[key] = entry
+                self.errors[key] = self.previous_errors[key]
+                reused.append((self._positions[entry['file_a']], self.errors[key]))
+            elif entry['detailed_file'] is not None and os.path.exists(entry['detailed_file']):
+                os.remove(entry['detailed_file'])  # Written again if the new comparison finds errors
+
+        self._reused = deque(sorted(reused, key=lambda item: item[0]))
+        METRICS.count('pairs_reused', len(reused))
+        files_reused_a = {self.pairs[key]['file_a'] for key in self.pairs}
+        files_reused_b = {self.pairs[key]['file_b'] for key in self.pairs}
+        return ([file for file in files_a if file not in files_reused_a],
+                [file for file in files_b if file not in files_reused_b])
+
+    def _unchanged(self, path, entry, side):
+        """
+            Compares a file with its side of the entry, only hashing it when its size or mtime are not
+            the ones recorded. A file touched without changing its content gets its new mtime recorded.
+        """
+        stat = os.stat(path)
+        if [stat.st_size, stat.st_mtime_ns] == entry[f'stat_{side}']:
+            return True
+        self._fingerprints[path] = fingerprint = file_fingerprint(path)
+        if fingerprint[2] != entry[f'sha256_{side}']:
+            return False
+        entry[f'stat_{side}'] = list(fingerprint[:2])
+        return True
+
+    def add(self, invoice, errors: list):
+        size_a, mtime_a, sha256_a = self.fingerprint(invoice)
+        size_b, mtime_b, sha256_b = self.fingerprint(invoice.pair)
+        self.pairs[invoice.key] = {
+            'file_a': invoice.filename,
+            'file_b': invoice.pair.filename,
+            'stat_a': [size_a, mtime_a],
+            'stat_b': [size_b, mtime_b],
+            'sha256_a': sha256_a,
+            'sha256_b': sha256_b,
+            'error_count': len(errors),
+            'detailed_file': invoice.detailed_file,
+        }
+        self.errors[invoice.key] = errors
+
+    def fingerprint(self, invoice):
+        # Taken by the parse cache when the file was parsed, or by reuse() when the file changed
+        if invoice.file_fingerprint is not None:
+            return invoice.file_fingerprint
+        fingerprint = self._fingerprints.get(invoice.full_path, None)
+        if fingerprint is not None:
+            return fingerprint
+        return file_fingerprint(invoice.full_path)
+
+    def reused_errors(self, file_a=None):
+        """
+            Yields the errors of the reused pairs that come before file_a in the Loankit directory, or
+            of all the ones left without file_a.
+        """
+        position = self._positions.get(file_a, len(self._positions))
+        while self._reused and (file_a is None or self._reused[0][0] < position):
+            yield from self._reused.popleft()[1]
+
+    def write(self):
+        with open(self.errors_file, 'wb') as file:
+            pickle.dump(self.errors, file, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(self.file, 'w') as file:
+            json.dump({'settings': self.settings, 'pairs': self.pairs}, file, indent=2)
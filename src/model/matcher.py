@@ -0,0 +1,96 @@
+import math
+from collections import deque
+
+from src import utils as u
+from src.model.metrics import METRICS
+
+
+class RowMatcher:
+    """
+        Index over one section of the pair invoice so that find_pair_row does not have
+        to scan the whole section for every unmatched row.
+
+        The index is built once per section and keeps the lookup order of the original scans:
+            1. Row with the same key_full
+            2. First row (in file order) where row.equals(item), looked up by the sanitized
+               identity fields of the row and the bucket of its main amount
+            3. First row (in file order) with the same key
+
+        Rows are removed from the section dict by the caller once they get matched, the index
+        skips them lazily by checking they are still in the dict.
+    """
+
+    def __init__(self, datarows: dict, margin=0):
+        self.datarows = datarows
+        # Two rows within the margin always fall in the same or in adjacent buckets
+        self.bucket_width = 2 * (margin + u.MARGIN_EPSILON)
+        self.by_key = {}
+        self.by_identity = {}
+
+        for position, item in enumerate(datarows.values()):
+            entry = (position, item)
+            self.by_key.setdefault(item.key, deque()).append(entry)
+            for bucket_key in self._bucket_keys(item, neighbours=False):
+                self.by_identity.setdefault(bucket_key, deque()).append(entry)
+
+    def find(self, row):
+        # Match by full_key
+        pair_row = self.datarows.get(row.key_full, None)
+        if pair_row is not None:
+            METRICS.count('match_key_full')
+            return pair_row
+
+        # We want to match by similarity before matching by the key
+        # Match by similarity
+        found = None
+        for bucket_key in self._bucket_keys(row, neighbours=True):
+            entries = self._prune(self.by_identity.get(bucket_key, None))
+            for position, item in entries:
+                if found is not None and position > found[0]:
+                    break
+                if self._alive(item) and row.equals(item):
+                    found = (position, item)
+                    break
+        if found is not None:
+            METRICS.count('match_similarity')
+            return found[1]
+
+        # Match by key
+        for _, item in self._prune(self.by_key.get(row.key, None)):
+            if self._alive(item):
+                METRICS.count('match_key')
+                return item
+
+        # Return None if nothing found
+        METRICS.count('match_none')
+        return None
+
+    def _alive(self, item):
+        return self.datarows.get(item.key_full, None) is item
+
+    def _prune(self, entries):
+        if entries is None:
+            return ()
+        while entries and not self._alive(entries[0][1]):
+            entries.popleft()
+        return entries
+
+    def _bucket_keys(self, row, neighbours):
+        identity = (type(row), row.match_identity())
+        bucket = amount_bucket(row.match_amount(), self.bucket_width)
+        if neighbours and isinstance(bucket, int):
+            return [(identity, bucket - 1), (identity, bucket), (identity, bucket + 1)]
+        return [(identity, bucket)]
+
+
+def amount_bucket(value, width):
+    """
+        Returns the bucket of a numeric value as an int. Values that are not numbers are only
+        ever equal to themselves in compare_numbers, so they get their own string bucket.
+    """
+    number = u.number_value(value)
+    if number.__class__ is int:
+        number = number / 100  # Whole cents in money cents mode
+    if number.__class__ is not float or not math.isfinite(number):
+        return str(value)
+    return math.floor(number / width)
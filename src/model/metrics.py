@@ -0,0 +1,87 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """
+        Wall and CPU time spent in each phase of a comparison plus counters of the work done in them.
+
+        Phases can nest, each one is timed on its own. The CPU time includes the worker processes
+        that were waited for during the phase. Worker processes collect their own metrics, which are
+        merged back into the ones of the main process, so the times of the phases that run in the
+        workers are summed over all of them.
+    """
+
+    def __init__(self):
+        self.phases = {}  # name: [calls, wall seconds, cpu seconds]
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    def reset(self):
+        self.phases = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        wall, cpu = time.perf_counter(), cpu_time()
+        try:
+            yield
+        finally:
+            self.add_phase(name, 1, time.perf_counter() - wall, cpu_time() - cpu)
+
+    def add_phase(self, name, calls, wall, cpu):
+        phase = self.phases.setdefault(name, [0, 0.0, 0.0])
+        phase[0] += calls
+        phase[1] += wall
+        phase[2] += cpu
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def serialize(self):
+        return {
+            'elapsed': time.perf_counter() - self.started,
+            'phases': {name: {'calls': calls, 'wall': wall, 'cpu': cpu}
+                       for name, (calls, wall, cpu) in self.phases.items()},
+            'counters': dict(self.counters),
+        }
+
+    def merge(self, metrics: dict):
+        """
+            Adds the serialized metrics of another process to these.
+        """
+        for name, phase in metrics['phases'].items():
+            self.add_phase(name, phase['calls'], phase['wall'], phase['cpu'])
+        for name, value in metrics['counters'].items():
+            self.count(name, value)
+
+    def report(self):
+        print(f'{"Phase":<24}{"Calls":>7}{"Wall":>10}{"CPU":>10}')
+        for name, (calls, wall, cpu) in self.phases.items():
+            print(f'{name:<24}{calls:>7}{wall:>9.2f}s{cpu:>9.2f}s')
+        for name, value in self.counters.items():
+            print(f'{name:<24}{value:>17,}')
+        print(f'{"elapsed":<24}{time.perf_counter() - self.started:>16.2f}s')
+
+    def write(self, file):
+        with open(file, 'w') as metrics_file:
+            json.dump(self.serialize(), metrics_file, indent=2)
+
+
+def cpu_time():
+    # Children times only grow once the worker processes have been waited for
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+METRICS = Metrics()
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+# Bump this whenever a parser or a row class changes so old entries are not loaded anymore
+CACHE_VERSION = 9
+# The switch lives in the environment so worker processes see it too
+CACHE_ENV = 'RCTI_PARSE_CACHE'
+DEFAULT_MAX_BYTES = 1024 ** 3
+ENTRY_SUFFIX = '.pickle'
+
+
+class ParseCache:
+    """
+        On disk cache of parsed files, one pickle per input file.
+        Entries are keyed by the size, mtime and SHA-256 of the file plus the class that parsed it
+        and the variant of the parse, if any.
+        When the cache grows over max_bytes the least recently used entries are removed first.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self):
+        return os.environ.get(CACHE_ENV, '1') != '0'
+
+    @enabled.setter
+    def enabled(self, enabled):
+        os.environ[CACHE_ENV] = '1' if enabled else '0'
+
+    def key(self, path, cls, variant='', fingerprint=None):
+        """
+            Key of the entry of a file, from its file_fingerprint() when it was already taken.
+        """
+        size, mtime_ns, sha256 = fingerprint if fingerprint is not None else file_fingerprint(path)
+        sha = hashlib.sha256()
+        sha.update(str(CACHE_VERSION).encode())
+        sha.update(f'{cls.__module__}.{cls.__qualname__}'.encode())
+        sha.update(variant.encode())
+        sha.update(str(size).encode())
+        sha.update(str(mtime_ns).encode())
+        sha.update(sha256.encode())
+        return sha.hexdigest()
+
+    def sub_key(self, key, name):
+        """
+            Key of a part of a file, for files whose parts are parsed and cached on their own.
+        """
+        return hashlib.sha256(f'{key}:{name}'.encode()).hexdigest()
+
+    def load(self, key):
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as file:
+                state = pickle.load(file)
+            os.utime(path)  # Mark the entry as recently used
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+        return state
+
+    def store(self, key, state):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path_tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path_tmp, self._entry_path(key))
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            # Not being able to cache a file must never stop the comparison
+            if os.path.exists(path_tmp):
+                os.remove(path_tmp)
+            return
+        self.evict()
+
+    def evict(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(ENTRY_SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Already removed by another process
+            total -= size
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+
+def file_fingerprint(path):
+    """
+        (size, mtime in nanoseconds, SHA-256 hex digest) of a file.
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns, file_sha256(path).hexdigest()
+
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha
@@ -2,12 +2,24 @@ import calendar
 import time
 import hashlib
 import os.path
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
+import pandas
+import xlrd
 import xlsxwriter
 from src import utils as u
+from src.model.matcher import RowMatcher
+from src.model.metrics import METRICS, file_size
+from src.model.parse_cache import ParseCache, file_fingerprint
+from src.utils import bcolors
 
 ENCODING = 'utf-8'
-PID = str(calendar.timegm(time.gmtime()))
+# Worker processes read the PID from the environment so they write into the same output directory
+PID_ENV = 'RCTI_COMPARISON_PID'
+PID = os.environ.get(PID_ENV, str(calendar.timegm(time.gmtime())))
 
 # OUTPUT_DIR = '/var/www/mystro.com/data/rcti_comparison/'
 OUTPUT_DIR = './Output/'
@@ -18,6 +30,21 @@ OUTPUT_DIR_BRANCH = OUTPUT_DIR_PID + 'branch_rctis/'
 OUTPUT_DIR_SUMMARY = OUTPUT_DIR_PID + 'summary/'
 OUTPUT_DIR_EXEC_SUMMARY = OUTPUT_DIR_PID + 'executive_summary/'
 OUTPUT_DIR_ABA = OUTPUT_DIR_PID + 'aba_file/'
+OUTPUT_DIR_CACHE = OUTPUT_DIR + 'parse_cache/'
+
+PARSE_CACHE = ParseCache(OUTPUT_DIR_CACHE)
+# Attributes that depend on the file name and not on its content, so they are never cached
+PARSE_CACHE_EXCLUDED = ('directory', 'filename', '_key', 'detailed_file', 'file_fingerprint')
+
+# DETAILED workbooks are written in constant_memory mode so only the current row is kept in memory.
+# Rows have to be written in order in that mode, set the variable to 0 to use the default mode.
+LOW_MEMORY_ENV = 'RCTI_LOW_MEMORY'
+
+# First item of the row key tuples, see row_key()
+ROW_KEY = 'key'
+ROW_KEY_FULL = 'key_full'
+# Key of an empty amount in row_key_full(), the text the keys hashed before they were tuples
+NAN_KEY = 'nan'
 
 
 class TaxInvoice:
@@ -25,6 +52,8 @@ class TaxInvoice:
     def __init__(self, directory, filename):
         self.directory = directory
         self.filename = filename
+        self.detailed_file = None  # Path of the DETAILED workbook once create_workbook() is called
+        self.file_fingerprint = None  # file_fingerprint() of the file once parse_cached() takes it
         self._key = self.__generate_key()
 
     @property
@@ -45,26 +74,201 @@ class TaxInvoice:
         if self.directory[-1] != '/':
             self.directory += '/'
 
+    def parse_cached(self):
+        """
+            Restores everything parse() builds from the parse cache, only parsing the file
+            when it is not in the cache yet.
+        """
+        if not PARSE_CACHE.enabled:
+            self.parse()
+            return
+
+        # Rows keep their numbers as whole cents in money cents mode, so each mode has its own entries
+        self.file_fingerprint = file_fingerprint(self.full_path)
+        key = PARSE_CACHE.key(self.full_path, type(self), 'cents' if u.MONEY_CENTS else '', self.file_fingerprint)
+        state = PARSE_CACHE.load(key)
+        if state is not None:
+            self.__dict__.update(state)
+            return
+
+        self.parse()
+        state = {k: v for k, v in self.__dict__.items() if k not in PARSE_CACHE_EXCLUDED}
+        PARSE_CACHE.store(key, state)
+
+    def process_comparison(self, margin=0.000001, always_write_detail=False):
+        """
+            Runs the comparison of the file with its own pair.
+            compare() pairs the rows and finds the errors without touching any workbook, the
+            DETAILED file is only written afterwards for pairs with errors or when always_write_detail
+            is set. Returns the Summary information.
+        """
+        if self.pair is None:
+            return None
+        assert type(self.pair) == type(self), "self.pair is not of the correct type"
+
+        with METRICS.phase('compare'):
+            self.compare(margin)
+        if len(self.summary_errors) > 0 or always_write_detail:
+            with METRICS.phase('write_detailed'):
+                self.write_detailed()
+            METRICS.count('detailed_files')
+            METRICS.count('bytes_written', file_size(self.detailed_file))
+        return self.summary_errors
+
+    def match_rows(self, datarows: dict, datarows_pair: dict, margin) -> list:
+        """
+            Pairs each row of a section with a row of the same section of the pair file.
+            Returns (row, pair row) tuples in the order they are written to the DETAILED file,
+            rows only found in the pair file come last as (None, pair row).
+        """
+        with METRICS.phase('match_rows'):
+            return self._match_rows(datarows, datarows_pair, margin)
+
+    def _match_rows(self, datarows: dict, datarows_pair: dict, margin) -> list:
+        keys_unmatched = set(datarows_pair.keys() - set(datarows.keys()))
+        matcher = RowMatcher(datarows_pair, margin)
+        pairs = []
+
+        for key_full in datarows.keys():
+            self_row = datarows[key_full]
+            self_row.margin = margin
+
+            pair_row = self.find_pair_row(self_row, matcher)
+            self_row.pair = pair_row
+
+            if pair_row is not None:
+                # delete from pair list so it doesn't get matched again
+                del datarows_pair[pair_row.key_full]
+                # Remove the key from the keys_unmatched if it is there
+                if pair_row.key_full in keys_unmatched:
+                    keys_unmatched.remove(pair_row.key_full)
+
+                pair_row.margin = margin
+                pair_row.pair = self_row
+            pairs.append((self_row, pair_row))
+
+        # Unmatched records keep the order of the pair file
+        for key in datarows_pair.keys():
+            if key in keys_unmatched:
+                pairs.append((None, datarows_pair[key]))
+        return pairs
+
+    def find_pair_row(self, row, matcher):
+        return matcher.find(row)
+
     def create_workbook(self, dir_):
         filename = self.filename
         if filename.endswith('.xls'):
             filename = filename[:-4]
-        return xlsxwriter.Workbook(f"{dir_}DETAILED_{filename}.xlsx")
+        options = {'constant_memory': os.environ.get(LOW_MEMORY_ENV, '1') != '0'}
+        self.detailed_file = f"{dir_}DETAILED_{filename}.xlsx"
+        return xlsxwriter.Workbook(self.detailed_file, options)
 
     def compare_numbers(self, n1, n2, margin):
         return u.compare_numbers(n1, n2, margin)
 
+    def row_count(self):
+        """
+            Number of rows parsed from the file. Sections are dicts of rows or DataFrames, the
+            dicts of ints next to them are the counters of duplicated keys and are left out.
+        """
+        count = 0
+        for value in self.__dict__.values():
+            if isinstance(value, pandas.DataFrame):
+                count += len(value)
+            elif isinstance(value, dict) and len(value) > 0 and not isinstance(next(iter(value.values())), int):
+                count += len(value)
+        return count
+
+
+class WorkbookReader:
+    """
+        Opens an excel file only once and decodes each sheet the first time it is asked for.
+        Decoded sheets are kept so all the tab parsers of a file share the same handle.
+        Old .xls files are opened on demand so xlrd only reads the sheets that are asked for.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._excel_file = None
+        self._sheets = {}
+
+    def parse(self, sheet_name):
+        if sheet_name not in self._sheets:
+            if self._excel_file is None:
+                engine_kwargs = {'on_demand': True} if xlrd.inspect_format(self.path) == 'xls' else None
+                self._excel_file = pandas.ExcelFile(self.path, engine_kwargs=engine_kwargs)
+            self._sheets[sheet_name] = self._excel_file.parse(sheet_name)
+        return self._sheets[sheet_name]
+
+    def close(self):
+        if self._excel_file is not None:
+            self._excel_file.close()
+        self._excel_file = None
+        self._sheets = {}
+
+
+class NullWorksheet:
+    """
+        Worksheet that ignores every write. The comparison runs the write_row helpers against it
+        to collect the errors of a pair before deciding whether a DETAILED file is needed.
+    """
+
+    def write(self, *args, **kwargs):
+        pass
+
+    def write_row(self, *args, **kwargs):
+        pass
+
+
+NULL_WORKSHEET = NullWorksheet()
+
 
 class InvoiceRow:
 
+    # Subclasses that list their own __slots__ have no per instance __dict__
+    __slots__ = ()
+
     def __init__(self):
         pass
 
     def compare_numbers(self, n1, n2, margin):
         return u.compare_numbers(n1, n2, margin)
 
+    def match_identity(self):
+        # Text fields that must be equal for equals() to be True, used to index rows in the RowMatcher
+        return ()
+
+    def match_amount(self):
+        # Numeric field compared with the margin in equals(), used to bucket rows in the RowMatcher
+        return None
+
     def serialize(self):
-        return self.__dict__
+        if hasattr(self, '__dict__'):
+            return self.__dict__
+        return {name: getattr(self, name) for cls in type(self).__mro__ for name in getattr(cls, '__slots__', ())}
+
+
+def row_key(*values):
+    """
+        Key of a row from its normalized identity fields (and the salt of a duplicate).
+
+        Row keys are only used as in-process dict keys, so they are plain tuples instead of digests.
+        The dict hashes the tuple to 64 bits and compares the fields when two hashes collide, so
+        different rows never share a key. The first item keeps a key from ever being equal to a full key.
+    """
+    return (ROW_KEY,) + values
+
+
+def row_key_full(*values):
+    """
+        Key of a row from all its fields.
+
+        Empty amounts are parsed as nan, which is only equal to itself by identity and does not keep
+        its identity through pickling (parse cache, worker processes), so it is keyed as NAN_KEY.
+    """
+    return (ROW_KEY_FULL,) + tuple(NAN_KEY if isinstance(value, float) and value != value else value
+                                   for value in values)
 
 
 def create_dirs():
@@ -93,6 +297,76 @@ def create_dirs():
         os.mkdir(OUTPUT_DIR_ABA)
 
 
+def read_invoices(cls, sources: list, workers=1) -> list:
+    """
+        Parses the files of each (directory, files) source into a {key: invoice} dict.
+        With more than one worker the files of all the sources are parsed at the same time
+        in a process pool. Files missing a column are skipped and reported at the end.
+    """
+    jobs = []
+    for index, (dir_, files) in enumerate(sources):
+        for file in files:
+            if not os.path.isdir(dir_ + file):
+                jobs.append((index, dir_, file))
+
+    invoices = [{} for _ in sources]
+    skipped = []
+    counter = 1
+    with METRICS.phase('read_files'):
+        for (index, dir_, file), (invoice, reason, metrics) in zip(jobs, parse_invoices(cls, jobs, workers)):
+            if metrics is not None:
+                METRICS.merge(metrics)
+            print(f'Parsing {counter} of {len(jobs)} files from {bcolors.BLUE}{dir_}{bcolors.ENDC}', end='\r')
+            if invoice is None:
+                skipped.append((dir_, file, reason))
+            else:
+                invoices[index][invoice.key] = invoice
+                count_parsed(invoice)
+            counter += 1
+    print()
+    METRICS.count('files_skipped', len(skipped))
+
+    for dir_, file, reason in skipped:
+        print(f"{bcolors.YELLOW}Skipped {file} from {bcolors.BLUE}{dir_}{bcolors.YELLOW}: {reason}{bcolors.ENDC}")
+    return invoices
+
+
+def parse_invoices(cls, jobs: list, workers=1):
+    """
+        Yields the (invoice, reason, metrics) of each job. The metrics are the ones a worker
+        process counted while parsing, None when the file was parsed in this process.
+    """
+    if workers <= 1:
+        for _, dir_, file in jobs:
+            yield new_invoice(cls, dir_, file) + (None,)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        dirs = [dir_ for _, dir_, _ in jobs]
+        files = [file for _, _, file in jobs]
+        yield from executor.map(parse_invoice, repeat(cls), dirs, files)
+
+
+def count_parsed(invoice):
+    METRICS.count('files_parsed')
+    METRICS.count('rows_parsed', invoice.row_count())
+
+
+def parse_invoice(cls, dir_, file):
+    # Each task sends back only its own metrics, the worker may have parsed other files before
+    METRICS.reset()
+    invoice, reason = new_invoice(cls, dir_, file)
+    return invoice, reason, METRICS.serialize()
+
+
+def new_invoice(cls, dir_, file):
+    try:
+        return cls(dir_, file), None
+    except IndexError as e:
+        # handle exception when there is a column missing in the file.
+        return None, f'IndexError: {e}'
+
+
 def new_error(file_a, file_b, msg, line_a='', line_b='', value_a='', value_b='', tab=''):
     return {
         'file_a': file_a,
@@ -106,6 +380,60 @@ def new_error(file_a, file_b, msg, line_a='', line_b='', value_a='', value_b='',
     }
 
 
+class SummaryWriter:
+    """
+        Builds a summary workbook without keeping all the errors in memory.
+        Errors are spooled to a temporary file as they are produced while a running count is kept.
+        On close they are streamed into the workbook in constant_memory mode, which only allows
+        writing rows in order, so the spool is what lets the number of issues go above them.
+    """
+
+    def __init__(self, file, title, filepath_a, filepath_b, sheet_name='Summary'):
+        self.file = file
+        self.title = title
+        self.filepath_a = filepath_a
+        self.filepath_b = filepath_b
+        self.sheet_name = sheet_name
+        self.count = 0
+        self._spool = tempfile.TemporaryFile()
+
+    def add(self, error):
+        pickle.dump(error, self._spool, protocol=pickle.HIGHEST_PROTOCOL)
+        self.count += 1
+
+    def extend(self, errors):
+        for error in errors:
+            self.add(error)
+
+    def errors(self):
+        self._spool.seek(0)
+        while True:
+            try:
+                yield pickle.load(self._spool)
+            except EOFError:
+                return
+
+    def close(self):
+        with METRICS.phase('write_errors'):
+            self._write()
+        METRICS.count('errors', self.count)
+        METRICS.count('bytes_written', file_size(self.file))
+
+    def _write(self):
+        workbook = xlsxwriter.Workbook(self.file, {'constant_memory': True})
+        worksheet = workbook.add_worksheet(self.sheet_name)
+        fmt_title = get_title_format(workbook)
+        fmt_table_header = get_header_format(workbook)
+        worksheet.merge_range('A1:I1', self.title, fmt_title)
+        row = 1
+        col = 0
+        worksheet.write(row, col, f"Number of issues: {str(self.count)}")
+        row += 2
+        write_errors(self.errors(), worksheet, row, col, fmt_table_header, self.filepath_a, self.filepath_b)
+        workbook.close()
+        self._spool.close()
+
+
 def write_errors(errors: list, worksheet, row, col, header_fmt, filepath_a, filepath_b):
     # Write summary header
     worksheet.write(row, col, f'File Path A: {filepath_a}', header_fmt)
@@ -133,6 +461,21 @@ def write_errors(errors: list, worksheet, row, col, header_fmt, filepath_a, file
     return worksheet
 
 
+def write_pairs(worksheet, invoice, pairs: list, row, fmt_error, write_row) -> list:
+    """
+        Writes (row, pair row) tuples side by side, one line each starting at row, and returns
+        the errors reported by write_row.
+    """
+    errors = []
+    for self_row, pair_row in pairs:
+        if pair_row is not None:
+            errors += write_row(worksheet, invoice, pair_row, row, fmt_error, side='right', write_errors=False)
+        if self_row is not None:
+            errors += write_row(worksheet, invoice, self_row, row, fmt_error)
+        row += 1
+    return errors
+
+
 def worksheet_write(worksheet, row, col, label, fmt_label, value, fmt_value):
     worksheet.write(row, col, label, fmt_label)
     worksheet.write(row, col + 1, value, fmt_value)
@@ -1,15 +1,18 @@
 import os
 import numpy
 import hashlib
+from functools import partial
 
 import pandas
+
 from xlrd.biffh import XLRDError
 
-from src.model.taxinvoice import (TaxInvoice, InvoiceRow, ENCODING, OUTPUT_DIR_BRANCH, new_error,
-                                  get_header_format, get_error_format)
+from src.model.taxinvoice import (TaxInvoice, InvoiceRow, WorkbookReader, ENCODING, OUTPUT_DIR_BRANCH, NULL_WORKSHEET,
+                                  new_error, get_header_format, get_error_format, read_invoices, write_pairs, row_key,
+                                  row_key_full)
+from src.model.frame_diff import diff_frames
 
 from src import utils as u
-from src.utils import bcolors
 
 HEADER_VBI = ['Broker', 'Lender', 'Client', 'Ref #', 'Settled Loan',
               'Settlement Date', 'Commission', 'GST', 'Fee/Commission Split',
@@ -21,6 +24,13 @@ HEADER_TRAIL = ['Broker', 'Lender', 'Client', 'Ref #', 'Loan Balance',
                 'Settlement Date', 'Commission', 'GST', 'Fee/Commission Split',
                 'Fees GST', 'Remitted/Net', 'Paid To Broker', 'Paid To Referrer', 'Retained']
 
+# Columns of the data tabs compared with the margin
+NUMERIC_VBI = ['Settled Loan', 'Commission', 'GST', 'Fee/Commission Split', 'Fees GST', 'Remitted/Net',
+               'Paid To Broker', 'Paid To Referrer', 'Retained']
+
+NUMERIC_TRAIL = ['Loan Balance', 'Commission', 'GST', 'Fee/Commission Split', 'Fees GST', 'Remitted/Net',
+                 'Paid To Broker', 'Paid To Referrer', 'Retained']
+
 HEADER_TAXINVOICE = ['Description', 'Amount', 'Gst', 'Total', 'Comments']
 
 HEADER_RCTI = ['Description', 'Amount', 'Gst', 'Total']
@@ -36,6 +46,10 @@ TAB_UPFRONT_DATA = 'Upfront Data'
 TAB_TRAIL_DATA = 'Trail Data'
 TAB_VBI_DATA = 'Vbi Data'
 
+# When set to 1 the Upfront, Trail and VBI tabs are diffed as whole DataFrames and only the rows that
+# differ become row objects. The engine is picked through the environment so worker processes see it.
+VECTOR_ENGINE_ENV = 'RCTI_VECTOR_ENGINE'
+
 
 class BranchTaxInvoice(TaxInvoice):
 
@@ -44,14 +58,17 @@ class BranchTaxInvoice(TaxInvoice):
         self.pair = None
 
         # VBI Data tab fields
+        self.vbi_frame = None
         self.vbi_data_rows = {}
         self.vbi_data_rows_count = {}
 
         # Trail Data tab fields
+        self.trail_frame = None
         self.trail_data_rows = {}
         self.trail_data_rows_count = {}
 
         # Upfront Data tab fields
+        self.upfront_frame = None
         self.upfront_data_rows = {}
         self.upfront_data_rows_count = {}
 
@@ -87,82 +104,67 @@ class BranchTaxInvoice(TaxInvoice):
         self.summary_from = ''
         self.summary_to = ''
 
+        # Pairs of rows found by compare() for each tab
+        self.pairs_summary = []
+        self.pairs_rcti = []
+        self.pairs_tax_invoice_a = []
+        self.pairs_tax_invoice_b = []
+        self.pairs_upfront = []
+        self.pairs_trail = []
+        self.pairs_vbi = []
+        self.equal_pairs = {}  # Labels of the rows the vector engine found equal, by tab
+
+        self.margin = 0
         self.summary_errors = []
         self._key = self._generate_key()
-        self.parse()
+        self.parse_cached()
 
     def parse(self):
-        self.parse_tab_vbi_data(TAB_VBI_DATA)
-        self.parse_tab_trail_data()
-        self.parse_tab_vbi_data(TAB_UPFRONT_DATA)  # VBI and Upfront have the same strurcture, therefore we can reuse.
-        self.parse_tab_tax_invoice()
-        self.parse_tab_rcti()
-        self.parse_tab_summary()
-
-    def parse_tab_vbi_data(self, tab):
+        xl = WorkbookReader(self.full_path)  # Open the file once for all tabs
+        try:
+            self.parse_tab_vbi_data(xl, TAB_VBI_DATA)
+            self.parse_tab_trail_data(xl)
+            self.parse_tab_vbi_data(xl, TAB_UPFRONT_DATA)  # VBI and Upfront have the same strurcture, therefore we can reuse.
+            self.parse_tab_tax_invoice(xl)
+            self.parse_tab_rcti(xl)
+            self.parse_tab_summary(xl)
+        finally:
+            xl.close()
+
+    def parse_tab_vbi_data(self, xl, tab):
         try:
-            df = pandas.read_excel(self.full_path, sheet_name=tab)
+            df = xl.parse(tab)
             df = df.dropna(how='all')
             df = df.replace(numpy.nan, '', regex=True)
             df = df.replace('--', ' ', regex=True)
             if df.columns[0] != 'Broker':
                 df = df.rename(columns=df.iloc[0]).drop(df.index[0])
 
-            for index, row in df.iterrows():
-                vbidatarow = VBIDataRow(
-                    row['Broker'],
-                    row['Lender'],
-                    row['Client'],
-                    row['Ref #'],
-                    # row['Referrer'],
-                    float(row['Settled Loan']),
-                    row['Settlement Date'],
-                    float(row['Commission']),
-                    float(row['GST']),
-                    float(row['Fee/Commission Split']),
-                    float(row['Fees GST']),
-                    float(row['Remitted/Net']),
-                    float(row['Paid To Broker']),
-                    float(row['Paid To Referrer']),
-                    float(row['Retained']),
-                    index)
-                if tab == TAB_VBI_DATA:
-                    self.__add_datarow(self.vbi_data_rows, self.vbi_data_rows_count, vbidatarow)
-                elif tab == TAB_UPFRONT_DATA:
-                    self.__add_datarow(self.upfront_data_rows, self.upfront_data_rows_count, vbidatarow)
+            # Row objects are only created when the tab is compared, see load_data_rows
+            frame = df[HEADER_VBI].copy()
+            frame[NUMERIC_VBI] = frame[NUMERIC_VBI].astype(float)
+            if tab == TAB_VBI_DATA:
+                self.vbi_frame = frame
+            elif tab == TAB_UPFRONT_DATA:
+                self.upfront_frame = frame
         except XLRDError:
             pass
 
-    def parse_tab_trail_data(self):
-        df = pandas.read_excel(self.full_path, sheet_name=TAB_TRAIL_DATA)
+    def parse_tab_trail_data(self, xl):
+        df = xl.parse(TAB_TRAIL_DATA)
         df = df.dropna(how='all')
         df = df.replace(numpy.nan, '', regex=True)
         df = df.replace('--', ' ', regex=True)
         if df.columns[0] != 'Broker':
             df = df.rename(columns=df.iloc[0]).drop(df.index[0])
 
-        for index, row in df.iterrows():
-            traildatarow = TrailDataRow(
-                row['Broker'],
-                row['Lender'],
-                row['Client'],
-                row['Ref #'],
-                # row['Referrer'],
-                float(row['Loan Balance']),
-                row['Settlement Date'],
-                float(row['Commission']),
-                float(row['GST']),
-                float(row['Fee/Commission Split']),
-                float(row['Fees GST']),
-                float(row['Remitted/Net']),
-                float(row['Paid To Broker']),
-                float(row['Paid To Referrer']),
-                float(row['Retained']),
-                index)
-            self.__add_datarow(self.trail_data_rows, self.trail_data_rows_count, traildatarow)
-
-    def parse_tab_tax_invoice(self):
-        df = pandas.read_excel(self.full_path, sheet_name=TAB_TAX_INVOICE)
+        # Row objects are only created when the tab is compared, see load_data_rows
+        frame = df[HEADER_TRAIL].copy()
+        frame[NUMERIC_TRAIL] = frame[NUMERIC_TRAIL].astype(float)
+        self.trail_frame = frame
+
+    def parse_tab_tax_invoice(self, xl):
+        df = xl.parse(TAB_TAX_INVOICE)
         if df.iloc[1]['Tax Invoice Summary'] == 'Date:':
             df = df.drop(index=1)
 
@@ -171,13 +173,13 @@ class BranchTaxInvoice(TaxInvoice):
         df = df.replace(numpy.nan, '', regex=True)
 
         print(self.full_path)
-        if df.iloc[0][1]:
-            self.tax_invoice_from = df.iloc[0][1].strip()
+        if df.iloc[0].iloc[1]:
+            self.tax_invoice_from = df.iloc[0].iloc[1].strip()
         else:
             self.tax_invoice_from = ""
-        self.tax_invoice_from_abn = df.iloc[1][1].strip()
-        self.tax_invoice_to = df.iloc[2][1].strip()
-        self.tax_invoice_to_abn = df.iloc[3][1].strip()
+        self.tax_invoice_from_abn = df.iloc[1].iloc[1].strip()
+        self.tax_invoice_to = df.iloc[2].iloc[1].strip()
+        self.tax_invoice_to_abn = df.iloc[3].iloc[1].strip()
 
         section1_end = None
         section2_start = None
@@ -186,10 +188,10 @@ class BranchTaxInvoice(TaxInvoice):
         current_section = 1
         index = 0
         for i, row in df.iterrows():
-            if row[0].lower().endswith('software fee breakdown'):
+            if row.iloc[0].lower().endswith('software fee breakdown'):
                 current_section = 2
                 section2_start = index + 1
-            elif row[0].lower() == 'total':
+            elif row.iloc[0].lower() == 'total':
                 if current_section == 1:
                     section1_end = index + 1
                 elif current_section == 2:
@@ -200,43 +202,43 @@ class BranchTaxInvoice(TaxInvoice):
         df_b = df[section2_start:section2_end]
 
         for index, row in df_a.iterrows():
-            invoicerow = TaxInvoiceDataRow(row[0], row[1], row[2], row[3], row[4], index)
+            invoicerow = TaxInvoiceDataRow(row.iloc[0], row.iloc[1], row.iloc[2], row.iloc[3], row.iloc[4], index)
             self.__add_datarow(self.tax_invoice_data_rows_a, self.tax_invoice_data_rows_a_count, invoicerow)
 
         if section2_start is not None:
             for index, row in df_b.iterrows():
-                invoicerow = TaxInvoiceDataRow(' '.join(row[0].split()), row[1], row[2], row[3], row[4], index)
+                invoicerow = TaxInvoiceDataRow(' '.join(row.iloc[0].split()), row.iloc[1], row.iloc[2], row.iloc[3], row.iloc[4], index)
                 self.__add_datarow(self.tax_invoice_data_rows_b, self.tax_invoice_data_rows_b_count, invoicerow)
 
-    def parse_tab_rcti(self):
-        df = pandas.read_excel(self.full_path, sheet_name=TAB_RCTI)
+    def parse_tab_rcti(self, xl):
+        df = xl.parse(TAB_RCTI)
         df = df.replace(' ', numpy.nan, regex=False)
         df = df.dropna(how='all')
         df = df.replace(numpy.nan, '', regex=True)
 
-        self.rcti_from = str(df.iloc[1][1]).strip()
-        self.rcti_from_abn = str(df.iloc[2][1]).strip()
-        self.rcti_to = str(df.iloc[3][1]).strip()
-        self.rcti_to_abn = str(df.iloc[4][1]).strip()
+        self.rcti_from = str(df.iloc[1].iloc[1]).strip()
+        self.rcti_from_abn = str(df.iloc[2].iloc[1]).strip()
+        self.rcti_to = str(df.iloc[3].iloc[1]).strip()
+        self.rcti_to_abn = str(df.iloc[4].iloc[1]).strip()
 
         df = df[7:len(df)]
 
         for index, row in df.iterrows():
-            rctirow = RCTIDataRow(row[0], row[1], row[2], row[3], index)
+            rctirow = RCTIDataRow(row.iloc[0], row.iloc[1], row.iloc[2], row.iloc[3], index)
             self.__add_datarow(self.rcti_data_rows, self.rcti_data_rows_count, rctirow)
 
-    def parse_tab_summary(self):
-        df = pandas.read_excel(self.full_path, sheet_name=TAB_SUMMARY)
+    def parse_tab_summary(self, xl):
+        df = xl.parse(TAB_SUMMARY)
         df = df.replace('  ', '', regex=False)
         df = df.replace(' ', numpy.nan, regex=False)
         df = df.dropna(how='all')
         df = df.replace(numpy.nan, '', regex=True)
 
-        if df.iloc[0][0].strip() == 'Date:':
+        if df.iloc[0].iloc[0].strip() == 'Date:':
             df = df.drop(index=1)
 
-        self.summary_from = df.iloc[1][1].strip()
-        self.summary_to = df.iloc[2][1].strip()
+        self.summary_from = df.iloc[1].iloc[1].strip()
+        self.summary_to = df.iloc[2].iloc[1].strip()
 
         # Firstly we need to find out what are each section's start and end indexes
         df1_start = None
@@ -253,26 +255,26 @@ class BranchTaxInvoice(TaxInvoice):
         current_df = 0
         index = 0
         for i, row in df.iterrows():
-            if row[0].lower() == 'carried forward balance':
+            if row.iloc[0].lower() == 'carried forward balance':
                 current_df = 1
                 df1_start = index
-            elif row[0].lower().startswith('payment to brokers from'):
+            elif row.iloc[0].lower().startswith('payment to brokers from'):
                 current_df = 2
                 df2_start = index + 1
-            elif row[0].lower().startswith('payment to referrers from'):
+            elif row.iloc[0].lower().startswith('payment to referrers from'):
                 current_df = 3
                 df3_start = index + 1
-            elif row[0].lower() == 'money owed by brokers to branch':
+            elif row.iloc[0].lower() == 'money owed by brokers to branch':
                 current_df = 4
                 df4_start = index + 1
-            elif row[0].lower() == 'money owed by referrers to branch':
+            elif row.iloc[0].lower() == 'money owed by referrers to branch':
                 current_df = 5
                 df5_start = index + 1
 
-            elif row[0].lower() == '# of admin ids':
+            elif row.iloc[0].lower() == '# of admin ids':
                 df1_end = index + 1
 
-            elif row[0].lower() == 'total':
+            elif row.iloc[0].lower() == 'total':
                 if current_df == 2:
                     df2_end = index + 1
                 elif current_df == 3:
@@ -294,40 +296,118 @@ class BranchTaxInvoice(TaxInvoice):
         # Iterate through each section and create the rows.
         # In this case we can use the RCTIDataRow bc the data matches it HURRAY!!!
         for index, row in df1.iterrows():
-            summaryrow = RCTIDataRow(row[0], row[1], row[2], row[3], index)
+            summaryrow = RCTIDataRow(row.iloc[0], row.iloc[1], row.iloc[2], row.iloc[3], index)
             self.__add_datarow(self.summary_summary, self.summary_summary_count, summaryrow)
 
         if df2_start is not None:
             for index, row in df2.iterrows():
-                summaryrow = RCTIDataRow(row[0], row[1], row[2], row[3], index)
+                summaryrow = RCTIDataRow(row.iloc[0], row.iloc[1], row.iloc[2], row.iloc[3], index)
                 self.__add_datarow(self.summary_ptbff, self.summary_ptbff_count, summaryrow)
 
         if df3_start is not None:
             for index, row in df3.iterrows():
-                summaryrow = RCTIDataRow(row[0], row[1], row[2], row[3], index)
+                summaryrow = RCTIDataRow(row.iloc[0], row.iloc[1], row.iloc[2], row.iloc[3], index)
                 self.__add_datarow(self.summary_mobbtb, self.summary_mobbtb_count, summaryrow)
 
         if df4_start is not None:
             for index, row in df4.iterrows():
-                summaryrow = RCTIDataRow(row[0], row[1], row[2], row[3], index)
+                summaryrow = RCTIDataRow(row.iloc[0], row.iloc[1], row.iloc[2], row.iloc[3], index)
                 self.__add_datarow(self.summary_ptrff, self.summary_ptrff_count, summaryrow)
 
         if df5_start is not None:
             for index, row in df5.iterrows():
-                summaryrow = RCTIDataRow(row[0], row[1], row[2], row[3], index)
+                summaryrow = RCTIDataRow(row.iloc[0], row.iloc[1], row.iloc[2], row.iloc[3], index)
                 self.__add_datarow(self.summary_mobrtb, self.summary_mobrtb_count, summaryrow)
 
     # OH GOD WHY?
-    def process_comparison(self, margin=0.000001):
+    def compare(self, margin):
         """
-            Runs the comparison of the file with its own pair.
-            If the comaprison is successfull it creates a DETAILED file and returns the
-            Summary information.
+            Pairs the rows of every tab with the pair file and collects the Summary information.
+            Nothing is written here, the pairs are kept for write_detailed.
         """
-        if self.pair is None:
-            return None
-        assert type(self.pair) == type(self), "self.pair is not of the correct type"
+        self.margin = margin
+
+        # region Summary Section
+        if not self.equal_summary_from:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'From does not match', '', '', self.summary_from, self.pair.summary_from, tab=TAB_SUMMARY))
+        if not self.equal_summary_to:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'To does not match', '', '', self.summary_to, self.pair.summary_to, tab=TAB_SUMMARY))
 
+        sections = [self.summary_summary, self.summary_ptbff, self.summary_mobbtb, self.summary_ptrff, self.summary_mobrtb]
+        sections_pairs = [self.pair.summary_summary, self.pair.summary_ptbff, self.pair.summary_mobbtb, self.pair.summary_ptrff, self.pair.summary_mobrtb]
+        self.pairs_summary = []
+        for sec_index, section in enumerate(sections):
+            pairs = self.match_rows(section, sections_pairs[sec_index], margin)
+            self.pairs_summary.append(pairs)
+            self.summary_errors += write_pairs(
+                NULL_WORKSHEET, self, pairs, 0, None, summary_row_writer(sec_index))
+        # endregion
+
+        # region RCTI Section
+        if not self.equal_rcti_from:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'From does not match', '', '', self.rcti_from, self.pair.rcti_from, tab=TAB_RCTI))
+        if not self.equal_rcti_from_abn:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'From ABN does not match', '', '', self.rcti_from_abn, self.pair.rcti_from_abn, tab=TAB_RCTI))
+        if not self.equal_rcti_to:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'To does not match', '', '', self.rcti_to, self.pair.rcti_to, tab=TAB_RCTI))
+        if not self.equal_rcti_to_abn:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'To ABN does not match', '', '', self.rcti_to_abn, self.pair.rcti_to_abn, tab=TAB_RCTI))
+
+        self.pairs_rcti = self.match_rows(self.rcti_data_rows, self.pair.rcti_data_rows, margin)
+        self.summary_errors += write_pairs(
+            NULL_WORKSHEET, self, self.pairs_rcti, 0, None, partial(RCTIDataRow.write_row, tab=TAB_RCTI))
+        # endregion
+
+        # region Tax Invoice Section
+        if not self.equal_tax_invoice_from:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'From does not match', '', '', self.tax_invoice_from, self.pair.tax_invoice_from, tab=TAB_TAX_INVOICE))
+        if not self.equal_tax_invoice_from_abn:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'From ABN does not match', '', '', self.tax_invoice_from_abn, self.pair.tax_invoice_from_abn, tab=TAB_TAX_INVOICE))
+        if not self.equal_tax_invoice_to:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'To does not match', '', '', self.tax_invoice_to, self.pair.tax_invoice_to, tab=TAB_TAX_INVOICE))
+        if not self.equal_tax_invoice_to_abn:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'To ABN does not match', '', '', self.tax_invoice_to_abn, self.pair.tax_invoice_to_abn, tab=TAB_TAX_INVOICE))
+
+        self.pairs_tax_invoice_a = self.match_rows(self.tax_invoice_data_rows_a, self.pair.tax_invoice_data_rows_a, margin)
+        self.summary_errors += write_pairs(
+            NULL_WORKSHEET, self, self.pairs_tax_invoice_a, 0, None, TaxInvoiceDataRow.write_row)
+        self.pairs_tax_invoice_b = self.match_rows(self.tax_invoice_data_rows_b, self.pair.tax_invoice_data_rows_b, margin)
+        self.summary_errors += write_pairs(
+            NULL_WORKSHEET, self, self.pairs_tax_invoice_b, 0, None, TaxInvoiceDataRow.write_row)
+        # endregion
+
+        # region Upfront Data Section
+        self.pairs_upfront = self.compare_data_tab(TAB_UPFRONT_DATA, margin)
+        self.summary_errors += write_pairs(
+            NULL_WORKSHEET, self, self.pairs_upfront, 0, None, partial(VBIDataRow.write_row, tabname=TAB_UPFRONT_DATA))
+        # endregion
+
+        # region Trail Data Section
+        self.pairs_trail = self.compare_data_tab(TAB_TRAIL_DATA, margin)
+        self.summary_errors += write_pairs(
+            NULL_WORKSHEET, self, self.pairs_trail, 0, None, TrailDataRow.write_row)
+        # endregion
+
+        # region Vbi Data Section
+        self.pairs_vbi = self.compare_data_tab(TAB_VBI_DATA, margin)
+        self.summary_errors += write_pairs(
+            NULL_WORKSHEET, self, self.pairs_vbi, 0, None, partial(VBIDataRow.write_row, tabname=TAB_VBI_DATA))
+        # endregion
+
+    def write_detailed(self):
+        """
+            Writes the DETAILED file from the pairs found by compare.
+        """
         workbook = self.create_workbook(OUTPUT_DIR_BRANCH)
         fmt_table_header = get_header_format(workbook)
         fmt_error = get_error_format(workbook)
@@ -338,74 +418,30 @@ class BranchTaxInvoice(TaxInvoice):
         col_a = 0
         col_b = 5
 
+        # Both sides of a row are written before moving to the next one, rows can only go forward
         format_ = fmt_error if not self.equal_summary_from else None
         worksheet_summary.write(row, col_a, 'From')
         worksheet_summary.write(row, col_a + 1, self.summary_from, format_)
+        worksheet_summary.write(row, col_b, 'From')
+        worksheet_summary.write(row, col_b + 1, self.pair.summary_from, format_)
         row += 1
         format_ = fmt_error if not self.equal_summary_to else None
         worksheet_summary.write(row, col_a, 'To')
         worksheet_summary.write(row, col_a + 1, self.summary_to, format_)
+        worksheet_summary.write(row, col_b, 'To')
+        worksheet_summary.write(row, col_b + 1, self.pair.summary_to, format_)
+        row += 1
         row += 1
 
-        if self.pair is not None:
-            row = 0
-            format_ = fmt_error if not self.equal_summary_from else None
-            worksheet_summary.write(row, col_b, 'From')
-            worksheet_summary.write(row, col_b + 1, self.pair.summary_from, format_)
-            row += 1
-            format_ = fmt_error if not self.equal_summary_to else None
-            worksheet_summary.write(row, col_b, 'To')
-            worksheet_summary.write(row, col_b + 1, self.pair.summary_to, format_)
-            row += 1
-
-            if not self.equal_summary_from:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'From does not match', '', '', self.summary_from, self.pair.summary_from, tab=TAB_SUMMARY))
-            if not self.equal_summary_to:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'To does not match', '', '', self.summary_to, self.pair.summary_to, tab=TAB_SUMMARY))
-            row += 1
-
-        sections = [self.summary_summary, self.summary_ptbff, self.summary_mobbtb, self.summary_ptrff, self.summary_mobrtb]
-        sections_pairs = [self.pair.summary_summary, self.pair.summary_ptbff, self.pair.summary_mobbtb, self.pair.summary_ptrff, self.pair.summary_mobrtb]
         use_header = HEADER_SUMMARY
-        for sec_index, section in enumerate(sections):
+        for sec_index, pairs in enumerate(self.pairs_summary):
             for index, item in enumerate(use_header):
                 worksheet_summary.write(row, col_a + index, item, fmt_table_header)
                 worksheet_summary.write(row, col_b + index, item, fmt_table_header)
             row += 1
 
-            keys_unmatched = set(sections_pairs[sec_index].keys() - set(section.keys()))
-
-            ignore_last_two = sec_index > 0
-
-            for key in section.keys():
-                self_row = section[key]
-                self_row.margin = margin
-
-                pair_row = self.find_pair_row(self_row, sections_pairs[sec_index])
-                self_row.pair = pair_row
-
-                if pair_row is not None:
-                    # delete from pair list so it doesn't get matched again
-                    del sections_pairs[sec_index][pair_row.key_full]
-                    # Remove the key from the keys_unmatched if it is there
-                    if pair_row.key_full in keys_unmatched:
-                        keys_unmatched.remove(pair_row.key_full)
-
-                    pair_row.margin = margin
-                    pair_row.pair = self_row
-                    self.summary_errors += RCTIDataRow.write_row(
-                        worksheet_summary, self, pair_row, row, fmt_error, TAB_SUMMARY, 'right', ignore_last_two, write_errors=False)
-
-                self.summary_errors += RCTIDataRow.write_row(
-                    worksheet_summary, self, self_row, row, fmt_error, TAB_SUMMARY, ignore_last_two=ignore_last_two)
-                row += 1
-
-            for key in keys_unmatched:
-                self.summary_errors += RCTIDataRow.write_row(
-                    worksheet_summary, self, sections_pairs[sec_index][key], row, fmt_error, TAB_SUMMARY, 'right', ignore_last_two, write_errors=False)
-                row += 1
+            write_pairs(worksheet_summary, self, pairs, row, fmt_error, summary_row_writer(sec_index))
+            row += len(pairs)
 
             use_header = HEADER_SUMMARY_SHORTENED
             row += 2
@@ -417,53 +453,30 @@ class BranchTaxInvoice(TaxInvoice):
         col_a = 0
         col_b = 5
 
+        # Both sides of a row are written before moving to the next one, rows can only go forward
         format_ = fmt_error if not self.equal_rcti_from else None
         worksheet_rcti.write(row, col_a, 'From')
         worksheet_rcti.write(row, col_a + 1, self.rcti_from, format_)
+        worksheet_rcti.write(row, col_b, 'From')
+        worksheet_rcti.write(row, col_b + 1, self.pair.rcti_from, format_)
         row += 1
         format_ = fmt_error if not self.equal_rcti_from_abn else None
         worksheet_rcti.write(row, col_a, 'From ABN')
         worksheet_rcti.write(row, col_a + 1, self.rcti_from_abn, format_)
+        worksheet_rcti.write(row, col_b, 'From ABN')
+        worksheet_rcti.write(row, col_b + 1, self.pair.rcti_from_abn, format_)
         row += 1
         format_ = fmt_error if not self.equal_rcti_to else None
         worksheet_rcti.write(row, col_a, 'To')
         worksheet_rcti.write(row, col_a + 1, self.rcti_to, format_)
+        worksheet_rcti.write(row, col_b, 'To')
+        worksheet_rcti.write(row, col_b + 1, self.pair.rcti_to, format_)
         row += 1
         format_ = fmt_error if not self.equal_rcti_to_abn else None
         worksheet_rcti.write(row, col_a, 'To ABN')
         worksheet_rcti.write(row, col_a + 1, self.rcti_to_abn, format_)
-
-        if self.pair is not None:
-            row = 0
-            format_ = fmt_error if not self.equal_rcti_from else None
-            worksheet_rcti.write(row, col_b, 'From')
-            worksheet_rcti.write(row, col_b + 1, self.pair.rcti_from, format_)
-            row += 1
-            format_ = fmt_error if not self.equal_rcti_from_abn else None
-            worksheet_rcti.write(row, col_b, 'From ABN')
-            worksheet_rcti.write(row, col_b + 1, self.pair.rcti_from_abn, format_)
-            row += 1
-            format_ = fmt_error if not self.equal_rcti_to else None
-            worksheet_rcti.write(row, col_b, 'To')
-            worksheet_rcti.write(row, col_b + 1, self.pair.rcti_to, format_)
-            row += 1
-            format_ = fmt_error if not self.equal_rcti_to_abn else None
-            worksheet_rcti.write(row, col_b, 'To ABN')
-            worksheet_rcti.write(row, col_b + 1, self.pair.rcti_to_abn, format_)
-
-            if not self.equal_rcti_from:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'From does not match', '', '', self.rcti_from, self.pair.rcti_from, tab=TAB_RCTI))
-            if not self.equal_rcti_from_abn:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'From ABN does not match', '', '', self.rcti_from_abn, self.pair.rcti_from_abn, tab=TAB_RCTI))
-            if not self.equal_rcti_to:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'To does not match', '', '', self.rcti_to, self.pair.rcti_to, tab=TAB_RCTI))
-            if not self.equal_rcti_to_abn:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'To ABN does not match', '', '', self.rcti_to_abn, self.pair.rcti_to_abn, tab=TAB_RCTI))
-
+        worksheet_rcti.write(row, col_b, 'To ABN')
+        worksheet_rcti.write(row, col_b + 1, self.pair.rcti_to_abn, format_)
         row += 2
 
         for index, item in enumerate(HEADER_RCTI):
@@ -471,34 +484,7 @@ class BranchTaxInvoice(TaxInvoice):
             worksheet_rcti.write(row, col_b + index, item, fmt_table_header)
         row += 1
 
-        keys_unmatched = set(self.pair.rcti_data_rows.keys() - set(self.rcti_data_rows.keys()))
-
-        for key in self.rcti_data_rows.keys():
-            self_row = self.rcti_data_rows[key]
-            self_row.margin = margin
-
-            pair_row = self.find_pair_row(self_row, self.pair.rcti_data_rows)
-            self_row.pair = pair_row
-
-            if pair_row is not None:
-                # delete from pair list so it doesn't get matched again
-                del self.pair.rcti_data_rows[pair_row.key_full]
-                # Remove the key from the keys_unmatched if it is there
-                if pair_row.key_full in keys_unmatched:
-                    keys_unmatched.remove(pair_row.key_full)
-
-                pair_row.margin = margin
-                pair_row.pair = self_row
-                self.summary_errors += RCTIDataRow.write_row(
-                    worksheet_rcti, self, pair_row, row, fmt_error, TAB_RCTI, 'right', write_errors=False)
-
-            self.summary_errors += RCTIDataRow.write_row(worksheet_rcti, self, self_row, row, fmt_error, TAB_RCTI)
-            row += 1
-
-        for key in keys_unmatched:
-            self.summary_errors += RCTIDataRow.write_row(
-                worksheet_rcti, self, self.pair.rcti_data_rows[key], row, fmt_error, TAB_RCTI, 'right', write_errors=False)
-            row += 1
+        write_pairs(worksheet_rcti, self, self.pairs_rcti, row, fmt_error, partial(RCTIDataRow.write_row, tab=TAB_RCTI))
         # endregion
 
         # region Tax Invoice Section
@@ -507,53 +493,30 @@ class BranchTaxInvoice(TaxInvoice):
         col_a = 0
         col_b = 6
 
+        # Both sides of a row are written before moving to the next one, rows can only go forward
         format_ = fmt_error if not self.equal_tax_invoice_from else None
         worksheet_tax_invoice.write(row, col_a, 'From')
         worksheet_tax_invoice.write(row, col_a + 1, self.tax_invoice_from, format_)
+        worksheet_tax_invoice.write(row, col_b, 'From')
+        worksheet_tax_invoice.write(row, col_b + 1, self.pair.tax_invoice_from, format_)
         row += 1
         format_ = fmt_error if not self.equal_tax_invoice_from_abn else None
         worksheet_tax_invoice.write(row, col_a, 'From ABN')
         worksheet_tax_invoice.write(row, col_a + 1, self.tax_invoice_from_abn, format_)
+        worksheet_tax_invoice.write(row, col_b, 'From ABN')
+        worksheet_tax_invoice.write(row, col_b + 1, self.pair.tax_invoice_from_abn, format_)
         row += 1
         format_ = fmt_error if not self.equal_tax_invoice_to else None
         worksheet_tax_invoice.write(row, col_a, 'To')
         worksheet_tax_invoice.write(row, col_a + 1, self.tax_invoice_to, format_)
+        worksheet_tax_invoice.write(row, col_b, 'To')
+        worksheet_tax_invoice.write(row, col_b + 1, self.pair.tax_invoice_to, format_)
         row += 1
         format_ = fmt_error if not self.equal_tax_invoice_to_abn else None
         worksheet_tax_invoice.write(row, col_a, 'To ABN')
         worksheet_tax_invoice.write(row, col_a + 1, self.tax_invoice_to_abn, format_)
-
-        if self.pair is not None:
-            row = 0
-            format_ = fmt_error if not self.equal_tax_invoice_from else None
-            worksheet_tax_invoice.write(row, col_b, 'From')
-            worksheet_tax_invoice.write(row, col_b + 1, self.pair.tax_invoice_from, format_)
-            row += 1
-            format_ = fmt_error if not self.equal_tax_invoice_from_abn else None
-            worksheet_tax_invoice.write(row, col_b, 'From ABN')
-            worksheet_tax_invoice.write(row, col_b + 1, self.pair.tax_invoice_from_abn, format_)
-            row += 1
-            format_ = fmt_error if not self.equal_tax_invoice_to else None
-            worksheet_tax_invoice.write(row, col_b, 'To')
-            worksheet_tax_invoice.write(row, col_b + 1, self.pair.tax_invoice_to, format_)
-            row += 1
-            format_ = fmt_error if not self.equal_tax_invoice_to_abn else None
-            worksheet_tax_invoice.write(row, col_b, 'To ABN')
-            worksheet_tax_invoice.write(row, col_b + 1, self.pair.tax_invoice_to_abn, format_)
-
-            if not self.equal_tax_invoice_from:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'From does not match', '', '', self.tax_invoice_from, self.pair.tax_invoice_from, tab=TAB_TAX_INVOICE))
-            if not self.equal_tax_invoice_from_abn:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'From ABN does not match', '', '', self.tax_invoice_from_abn, self.pair.tax_invoice_from_abn, tab=TAB_TAX_INVOICE))
-            if not self.equal_tax_invoice_to:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'To does not match', '', '', self.tax_invoice_to, self.pair.tax_invoice_to, tab=TAB_TAX_INVOICE))
-            if not self.equal_tax_invoice_to_abn:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'To ABN does not match', '', '', self.tax_invoice_to_abn, self.pair.tax_invoice_to_abn, tab=TAB_TAX_INVOICE))
-
+        worksheet_tax_invoice.write(row, col_b, 'To ABN')
+        worksheet_tax_invoice.write(row, col_b + 1, self.pair.tax_invoice_to_abn, format_)
         row += 2
 
         # Part A
@@ -562,34 +525,8 @@ class BranchTaxInvoice(TaxInvoice):
             worksheet_tax_invoice.write(row, col_b + index, item, fmt_table_header)
         row += 1
 
-        keys_unmatched = set(self.pair.tax_invoice_data_rows_a.keys() - set(self.tax_invoice_data_rows_a.keys()))
-
-        for key_full in self.tax_invoice_data_rows_a.keys():
-            self_row = self.tax_invoice_data_rows_a[key_full]
-            self_row.margin = margin
-
-            pair_row = self.find_pair_row(self_row, self.pair.tax_invoice_data_rows_a)
-            self_row.pair = pair_row
-
-            if pair_row is not None:
-                # delete from pair list so it doesn't get matched again
-                del self.pair.tax_invoice_data_rows_a[pair_row.key_full]
-                # Remove the key from the keys_unmatched if it is there
-                if pair_row.key_full in keys_unmatched:
-                    keys_unmatched.remove(pair_row.key_full)
-
-                pair_row.margin = margin
-                pair_row.pair = self_row
-                self.summary_errors += TaxInvoiceDataRow.write_row(
-                    worksheet_tax_invoice, self, pair_row, row, fmt_error, 'right', write_errors=False)
-
-            self.summary_errors += TaxInvoiceDataRow.write_row(worksheet_tax_invoice, self, self_row, row, fmt_error)
-            row += 1
-
-        for key in keys_unmatched:
-            self.summary_errors += TaxInvoiceDataRow.write_row(
-                worksheet_tax_invoice, self, self.pair.tax_invoice_data_rows_a[key], row, fmt_error, 'right', write_errors=False)
-            row += 1
+        write_pairs(worksheet_tax_invoice, self, self.pairs_tax_invoice_a, row, fmt_error, TaxInvoiceDataRow.write_row)
+        row += len(self.pairs_tax_invoice_a)
         row += 2
 
         # Part B
@@ -598,34 +535,7 @@ class BranchTaxInvoice(TaxInvoice):
             worksheet_tax_invoice.write(row, col_b + index, item, fmt_table_header)
         row += 1
 
-        keys_unmatched = set(self.pair.tax_invoice_data_rows_b.keys() - set(self.tax_invoice_data_rows_b.keys()))
-
-        for key_full in self.tax_invoice_data_rows_b.keys():
-            self_row = self.tax_invoice_data_rows_b[key_full]
-            self_row.margin = margin
-
-            pair_row = self.find_pair_row(self_row, self.pair.tax_invoice_data_rows_b)
-            self_row.pair = pair_row
-
-            if pair_row is not None:
-                # delete from pair list so it doesn't get matched again
-                del self.pair.tax_invoice_data_rows_b[pair_row.key_full]
-                # Remove the key from the keys_unmatched if it is there
-                if pair_row.key_full in keys_unmatched:
-                    keys_unmatched.remove(pair_row.key_full)
-
-                pair_row.margin = margin
-                pair_row.pair = self_row
-                self.summary_errors += TaxInvoiceDataRow.write_row(
-                    worksheet_tax_invoice, self, pair_row, row, fmt_error, 'right', write_errors=False)
-
-            self.summary_errors += TaxInvoiceDataRow.write_row(worksheet_tax_invoice, self, self_row, row, fmt_error)
-            row += 1
-
-        for key in keys_unmatched:
-            self.summary_errors += TaxInvoiceDataRow.write_row(
-                worksheet_tax_invoice, self, self.pair.tax_invoice_data_rows_b[key], row, fmt_error, 'right', write_errors=False)
-            row += 1
+        write_pairs(worksheet_tax_invoice, self, self.pairs_tax_invoice_b, row, fmt_error, TaxInvoiceDataRow.write_row)
         # endregion
 
         # region Upfront Data Section
@@ -640,36 +550,8 @@ class BranchTaxInvoice(TaxInvoice):
             worksheet_upfront.write(row, col_b + index, item, fmt_table_header)
         row += 1
 
-        keys_unmatched = set(self.pair.upfront_data_rows.keys() - set(self.upfront_data_rows.keys()))
-
-        # Code below is just to find the errors and write them into the spreadsheets
-        for key_full in self.upfront_data_rows.keys():
-            self_row = self.upfront_data_rows[key_full]
-            self_row.margin = margin
-
-            pair_row = self.find_pair_row(self_row, self.pair.upfront_data_rows)
-            self_row.pair = pair_row
-
-            if pair_row is not None:
-                # delete from pair list so it doesn't get matched again
-                del self.pair.upfront_data_rows[pair_row.key_full]
-                # Remove the key from the keys_unmatched if it is there
-                if pair_row.key_full in keys_unmatched:
-                    keys_unmatched.remove(pair_row.key_full)
-
-                pair_row.margin = margin
-                pair_row.pair = self_row
-                self.summary_errors += VBIDataRow.write_row(
-                    worksheet_upfront, self, pair_row, row, fmt_error, TAB_UPFRONT_DATA, 'right', write_errors=False)
-
-            self.summary_errors += VBIDataRow.write_row(worksheet_upfront, self, self_row, row, fmt_error, TAB_UPFRONT_DATA)
-            row += 1
-
-        # Write unmatched records
-        for key in keys_unmatched:
-            self.summary_errors += VBIDataRow.write_row(
-                worksheet_upfront, self, self.pair.upfront_data_rows[key], row, fmt_error, TAB_UPFRONT_DATA, 'right', write_errors=False)
-            row += 1
+        write_pairs(worksheet_upfront, self, self.data_tab_pairs(TAB_UPFRONT_DATA, self.pairs_upfront), row, fmt_error,
+                    partial(VBIDataRow.write_row, tabname=TAB_UPFRONT_DATA))
         # endregion
 
         # region Trail Data Section
@@ -684,36 +566,8 @@ class BranchTaxInvoice(TaxInvoice):
             worksheet_trail.write(row, col_b + index, item, fmt_table_header)
         row += 1
 
-        keys_unmatched = set(self.pair.trail_data_rows.keys() - set(self.trail_data_rows.keys()))
-
-        # Code below is just to find the errors and write them into the spreadsheets
-        for key_full in self.trail_data_rows.keys():
-            self_row = self.trail_data_rows[key_full]
-            self_row.margin = margin
-
-            pair_row = self.find_pair_row(self_row, self.pair.trail_data_rows)
-            self_row.pair = pair_row
-
-            if pair_row is not None:
-                # delete from pair list so it doesn't get matched again
-                del self.pair.trail_data_rows[pair_row.key_full]
-                # Remove the key from the keys_unmatched if it is there
-                if pair_row.key_full in keys_unmatched:
-                    keys_unmatched.remove(pair_row.key_full)
-
-                pair_row.margin = margin
-                pair_row.pair = self_row
-                self.summary_errors += TrailDataRow.write_row(
-                    worksheet_trail, self, pair_row, row, fmt_error, 'right', write_errors=False)
-
-            self.summary_errors += TrailDataRow.write_row(worksheet_trail, self, self_row, row, fmt_error)
-            row += 1
-
-        # Write unmatched records
-        for key in keys_unmatched:
-            self.summary_errors += TrailDataRow.write_row(
-                worksheet_trail, self, self.pair.trail_data_rows[key], row, fmt_error, 'right', write_errors=False)
-            row += 1
+        write_pairs(worksheet_trail, self, self.data_tab_pairs(TAB_TRAIL_DATA, self.pairs_trail), row, fmt_error,
+                    TrailDataRow.write_row)
         # endregion
 
         # region Vbi Data Section
@@ -728,43 +582,70 @@ class BranchTaxInvoice(TaxInvoice):
             worksheet_vbi.write(row, col_b + index, item, fmt_table_header)
         row += 1
 
-        keys_unmatched = set(self.pair.vbi_data_rows.keys() - set(self.vbi_data_rows.keys()))
-
-        # Code below is just to find the errors and write them into the spreadsheets
-        for key_full in self.vbi_data_rows.keys():
-            self_row = self.vbi_data_rows[key_full]
-            self_row.margin = margin
-
-            pair_row = self.pair.vbi_data_rows.get(key, None)
-            self_row.pair = pair_row
-
-            if pair_row is not None:
-                # delete from pair list so it doesn't get matched again
-                del self.pair.vbi_data_rows[pair_row.key_full]
-                # Remove the key from the keys_unmatched if it is there
-                if pair_row.key_full in keys_unmatched:
-                    keys_unmatched.remove(pair_row.key_full)
+        write_pairs(worksheet_vbi, self, self.data_tab_pairs(TAB_VBI_DATA, self.pairs_vbi), row, fmt_error,
+                    partial(VBIDataRow.write_row, tabname=TAB_VBI_DATA))
+        # endregion
 
-                pair_row.margin = margin
-                pair_row.pair = self_row
-                self.summary_errors += VBIDataRow.write_row(
-                    worksheet_vbi, self, pair_row, row, fmt_error, TAB_VBI_DATA, 'right', write_errors=False)
+        workbook.close()
 
-            self.summary_errors += VBIDataRow.write_row(worksheet_vbi, self, self_row, row, fmt_error, TAB_VBI_DATA)
-            row += 1
+    def data_tab(self, tab):
+        """
+            Returns the frame, the rows dict, the rows counter and the row class of a data tab.
+        """
+        if tab == TAB_UPFRONT_DATA:
+            return self.upfront_frame, self.upfront_data_rows, self.upfront_data_rows_count, VBIDataRow
+        if tab == TAB_TRAIL_DATA:
+            return self.trail_frame, self.trail_data_rows, self.trail_data_rows_count, TrailDataRow
+        return self.vbi_frame, self.vbi_data_rows, self.vbi_data_rows_count, VBIDataRow
 
-        # Write unmatched records
-        for key in keys_unmatched:
-            self.summary_errors += VBIDataRow.write_row(
-                worksheet_vbi, self, self.pair.vbi_data_rows[key], row, fmt_error, TAB_VBI_DATA, 'right', write_errors=False)
-            row += 1
-        # endregion
+    def load_data_rows(self, tab, labels=None):
+        """
+            Creates the row objects of a data tab from its frame. When labels are given only the
+            rows with those frame labels are created.
+        """
+        frame, datarows, counter, cls = self.data_tab(tab)
+        for datarow in rows_from_frame(frame, cls, labels):
+            self.__add_datarow(datarows, counter, datarow)
+        return datarows
+
+    def compare_data_tab(self, tab, margin):
+        frame, _, _, cls = self.data_tab(tab)
+        frame_pair = self.pair.data_tab(tab)[0]
+
+        labels = None
+        labels_pair = None
+        if os.environ.get(VECTOR_ENGINE_ENV, '0') == '1' and frame is not None and frame_pair is not None:
+            self.equal_pairs[tab], labels, labels_pair = diff_frames(
+                frame, frame_pair, cls.frame_identity(frame), cls.frame_identity(frame_pair), cls.frame_key(frame),
+                cls.frame_key(frame_pair), cls.NUMERIC_COLUMNS, margin)
+
+        datarows = self.load_data_rows(tab, labels)
+        datarows_pair = self.pair.load_data_rows(tab, labels_pair)
+        return self.match_rows(datarows, datarows_pair, margin)
+
+    def data_tab_pairs(self, tab, pairs):
+        """
+            Puts the rows the vector engine found equal back into the pairs of a data tab, in file
+            order, so the DETAILED file still shows every row. Their objects are only created here.
+        """
+        equal_pairs = self.equal_pairs.get(tab, None)
+        if equal_pairs is None:
+            return pairs
+
+        labels, labels_pair = equal_pairs
+        frame, _, _, cls = self.data_tab(tab)
+        frame_pair = self.pair.data_tab(tab)[0]
+        pairs_all = [pair for pair in pairs if pair[0] is not None]
+        for self_row, pair_row in zip(rows_from_frame(frame, cls, labels), rows_from_frame(frame_pair, cls, labels_pair)):
+            self_row.margin = self.margin
+            self_row.pair = pair_row
+            pair_row.margin = self.margin
+            pair_row.pair = self_row
+            pairs_all.append((self_row, pair_row))
+        pairs_all.sort(key=lambda pair: pair[0].document_row)
 
-        if len(self.summary_errors) > 0:
-            workbook.close()
-        else:
-            del workbook
-        return self.summary_errors
+        # Rows only found in the pair file stay at the end
+        return pairs_all + [pair for pair in pairs if pair[0] is None]
 
     def __add_datarow(self, datarows_dict, counter_dict, row):
         if row.key_full in datarows_dict.keys():  # If the row already exists
@@ -837,26 +718,6 @@ class BranchTaxInvoice(TaxInvoice):
         return self.summary_to == self.pair.summary_to
     # endregion
 
-    def find_pair_row(self, row, pair_datarows):
-        # Match by full_key
-        pair_row = pair_datarows.get(row.key_full, None)
-        if pair_row is not None:
-            return pair_row
-
-        # We want to match by similarity before matching by the key
-        # Match by similarity
-        for _, item in pair_datarows.items():
-            if row.equals(item):
-                return item
-
-        # Match by key
-        for _, item in pair_datarows.items():
-            if row.key == item.key:
-                return item
-
-        # Return None if nothing found
-        return None
-
     def _generate_key(self):
         sha = hashlib.sha256()
 
@@ -870,6 +731,15 @@ class BranchTaxInvoice(TaxInvoice):
 
 class VBIDataRow(InvoiceRow):
 
+    NUMERIC_COLUMNS = NUMERIC_VBI
+    __slots__ = ('broker', 'lender', 'client', 'ref_no', 'referrer', 'settled_loan', 'settlement_date', 'commission',
+                 'gst', 'commission_split', 'fees_gst', 'remitted', 'paid_to_broker', 'paid_to_referrer', 'retained',
+                 '_pair', '_margin', '_document_row', '_key', '_key_full', '_sanitized_broker', '_sanitized_lender',
+                 '_sanitized_client', '_sanitized_ref_no', '_sanitized_referrer', '_sanitized_settlement_date',
+                 '_number_settled_loan', '_number_commission', '_number_gst', '_number_commission_split',
+                 '_number_fees_gst', '_number_remitted', '_number_paid_to_broker', '_number_paid_to_referrer',
+                 '_number_retained')
+
     def __init__(self, broker, lender, client, ref_no, settled_loan, settlement_date,
                  commission, gst, commission_split, fees_gst, remitted, paid_to_broker,
                  paid_to_referrer, retained, document_row=None):
@@ -895,6 +765,23 @@ class VBIDataRow(InvoiceRow):
         self._margin = 0
         self._document_row = document_row + 2 if document_row is not None else document_row
 
+        # Values compared by equals() and the equal_* properties, normalized once
+        self._sanitized_broker = u.sanitize(self.broker)
+        self._sanitized_lender = u.sanitize(self.lender)
+        self._sanitized_client = u.sanitize(self.client)
+        self._sanitized_ref_no = u.sanitize(self.ref_no)
+        self._sanitized_referrer = u.sanitize(self.referrer)
+        self._sanitized_settlement_date = u.sanitize(self.settlement_date)
+        self._number_settled_loan = u.number_value(self.settled_loan)
+        self._number_commission = u.number_value(self.commission)
+        self._number_gst = u.number_value(self.gst)
+        self._number_commission_split = u.number_value(self.commission_split)
+        self._number_fees_gst = u.number_value(self.fees_gst)
+        self._number_remitted = u.number_value(self.remitted)
+        self._number_paid_to_broker = u.number_value(self.paid_to_broker)
+        self._number_paid_to_referrer = u.number_value(self.paid_to_referrer)
+        self._number_retained = u.number_value(self.retained)
+
         self._key = self._generate_key()
         self._key_full = self._generate_key_full()
 
@@ -939,119 +826,151 @@ class VBIDataRow(InvoiceRow):
     def equal_referrer(self):
         if self.pair is None:
             return False
-        return u.sanitize(self.referrer) == u.sanitize(self.pair.referrer)
+        return self._sanitized_referrer == self.pair._sanitized_referrer
 
     @property
     def equal_settled_loan(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.settled_loan, self.pair.settled_loan, self.margin)
+        return u.compare_number_values(self._number_settled_loan, self.pair._number_settled_loan, self.margin)
 
     @property
     def equal_settlement_date(self):
         if self.pair is None:
             return False
-        return u.sanitize(self.settlement_date) == u.sanitize(self.pair.settlement_date)
+        return self._sanitized_settlement_date == self.pair._sanitized_settlement_date
 
     @property
     def equal_commission(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.commission, self.pair.commission, self.margin)
+        return u.compare_number_values(self._number_commission, self.pair._number_commission, self.margin)
 
     @property
     def equal_gst(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.gst, self.pair.gst, self.margin)
+        return u.compare_number_values(self._number_gst, self.pair._number_gst, self.margin)
 
     @property
     def equal_commission_split(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.commission_split, self.pair.commission_split, self.margin)
+        return u.compare_number_values(self._number_commission_split, self.pair._number_commission_split, self.margin)
 
     @property
     def equal_fees_gst(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.fees_gst, self.pair.fees_gst, self.margin)
+        return u.compare_number_values(self._number_fees_gst, self.pair._number_fees_gst, self.margin)
 
     @property
     def equal_remitted(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.remitted, self.pair.remitted, self.margin)
+        return u.compare_number_values(self._number_remitted, self.pair._number_remitted, self.margin)
 
     @property
     def equal_paid_to_broker(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.paid_to_broker, self.pair.paid_to_broker, self.margin)
+        return u.compare_number_values(self._number_paid_to_broker, self.pair._number_paid_to_broker, self.margin)
 
     @property
     def equal_paid_to_referrer(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.paid_to_referrer, self.pair.paid_to_referrer, self.margin)
+        return u.compare_number_values(self._number_paid_to_referrer, self.pair._number_paid_to_referrer, self.margin)
 
     @property
     def equal_retained(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.retained, self.pair.retained, self.margin)
+        return u.compare_number_values(self._number_retained, self.pair._number_retained, self.margin)
     # endregion
 
     def _generate_key(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(u.sanitize(self.broker).encode(ENCODING))
-        sha.update(u.sanitize(self.lender).encode(ENCODING))
-        sha.update(u.sanitize(self.client).encode(ENCODING))
-        sha.update(self.ref_no.lower().encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-
-        return sha.hexdigest()
+        return row_key(
+            self._sanitized_broker,
+            self._sanitized_lender,
+            self._sanitized_client,
+            self.ref_no.lower(),
+            salt,
+        )
 
     def _generate_key_full(self):
-        sha = hashlib.sha256()
-        sha.update(str(self.broker).encode(ENCODING))
-        sha.update(str(self.lender).encode(ENCODING))
-        sha.update(str(self.client).encode(ENCODING))
-        sha.update(str(self.ref_no).encode(ENCODING))
-        # sha.update(str(self.referrer).encode(ENCODING))
-        sha.update(str(self.settled_loan).encode(ENCODING))
-        sha.update(str(self.settlement_date).encode(ENCODING))
-        sha.update(str(self.commission).encode(ENCODING))
-        sha.update(str(self.gst).encode(ENCODING))
-        sha.update(str(self.commission_split).encode(ENCODING))
-        sha.update(str(self.fees_gst).encode(ENCODING))
-        sha.update(str(self.remitted).encode(ENCODING))
-        sha.update(str(self.paid_to_broker).encode(ENCODING))
-        sha.update(str(self.paid_to_referrer).encode(ENCODING))
-        sha.update(str(self.retained).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key_full(
+            str(self.broker),
+            str(self.lender),
+            str(self.client),
+            str(self.ref_no),
+            # str(self.referrer)
+            self._number_settled_loan,
+            str(self.settlement_date),
+            self._number_commission,
+            self._number_gst,
+            self._number_commission_split,
+            self._number_fees_gst,
+            self._number_remitted,
+            self._number_paid_to_broker,
+            self._number_paid_to_referrer,
+            self._number_retained,
+        )
 
     def equals(self, obj):
         if type(obj) != VBIDataRow:
             return False
 
         return (
-            u.sanitize(self.broker) == u.sanitize(obj.broker)
-            and u.sanitize(self.lender) == u.sanitize(obj.lender)
-            and u.sanitize(self.client) == u.sanitize(obj.client)
-            and u.sanitize(self.ref_no) == u.sanitize(obj.ref_no)
+            self._sanitized_broker == obj._sanitized_broker
+            and self._sanitized_lender == obj._sanitized_lender
+            and self._sanitized_client == obj._sanitized_client
+            and self._sanitized_ref_no == obj._sanitized_ref_no
             and self.settlement_date == obj.settlement_date
-            and self.compare_numbers(self.settled_loan, obj.settled_loan, self.margin)
-            and self.compare_numbers(self.commission, obj.commission, self.margin)
-            and self.compare_numbers(self.gst, obj.gst, self.margin)
-            and self.compare_numbers(self.commission_split, obj.commission_split, self.margin)
-            and self.compare_numbers(self.fees_gst, obj.fees_gst, self.margin)
-            and self.compare_numbers(self.remitted, obj.remitted, self.margin)
-            and self.compare_numbers(self.paid_to_broker, obj.paid_to_broker, self.margin)
-            and self.compare_numbers(self.paid_to_referrer, obj.paid_to_referrer, self.margin)
-            and self.compare_numbers(self.retained, obj.retained, self.margin)
+            and u.compare_number_values(self._number_settled_loan, obj._number_settled_loan, self.margin)
+            and u.compare_number_values(self._number_commission, obj._number_commission, self.margin)
+            and u.compare_number_values(self._number_gst, obj._number_gst, self.margin)
+            and u.compare_number_values(self._number_commission_split, obj._number_commission_split, self.margin)
+            and u.compare_number_values(self._number_fees_gst, obj._number_fees_gst, self.margin)
+            and u.compare_number_values(self._number_remitted, obj._number_remitted, self.margin)
+            and u.compare_number_values(self._number_paid_to_broker, obj._number_paid_to_broker, self.margin)
+            and u.compare_number_values(self._number_paid_to_referrer, obj._number_paid_to_referrer, self.margin)
+            and u.compare_number_values(self._number_retained, obj._number_retained, self.margin)
+        )
+
+    def match_identity(self):
+        return (
+            self._sanitized_broker,
+            self._sanitized_lender,
+            self._sanitized_client,
+            self._sanitized_ref_no,
+            self.settlement_date
         )
 
+    def match_amount(self):
+        return self.commission
+
+    @staticmethod
+    def frame_identity(frame):
+        # match_identity() of every row of an Upfront or VBI frame
+        return pandas.DataFrame({
+            'broker': frame['Broker'].map(u.sanitize),
+            'lender': frame['Lender'].map(u.sanitize),
+            'client': frame['Client'].map(u.sanitize),
+            'ref_no': frame['Ref #'].map(lambda ref_no: u.sanitize(str(ref_no).strip().split('.')[0])),
+            'settlement_date': frame['Settlement Date'],
+        })
+
+    @staticmethod
+    def frame_key(frame):
+        # key of every row of an Upfront or VBI frame, without the salt of a duplicate
+        return pandas.DataFrame({
+            'broker': frame['Broker'].map(u.sanitize),
+            'lender': frame['Lender'].map(u.sanitize),
+            'client': frame['Client'].map(u.sanitize),
+            'ref_no': frame['Ref #'].map(lambda ref_no: str(ref_no).strip().split('.')[0].lower()),
+        })
+
     @staticmethod
     def write_row(worksheet, invoice, element, row, fmt_error, tabname, side='left', write_errors=True):
         col = 0
@@ -1132,6 +1051,15 @@ class VBIDataRow(InvoiceRow):
 
 class TrailDataRow(InvoiceRow):
 
+    NUMERIC_COLUMNS = NUMERIC_TRAIL
+    __slots__ = ('broker', 'lender', 'client', 'ref_no', 'referrer', 'loan_balance', 'settlement_date', 'commission',
+                 'gst', 'commission_split', 'fees_gst', 'remitted', 'paid_to_broker', 'paid_to_referrer', 'retained',
+                 '_pair', '_margin', '_document_row', '_key', '_key_full', '_sanitized_broker', '_sanitized_lender',
+                 '_sanitized_client', '_sanitized_ref_no', '_sanitized_referrer', '_sanitized_settlement_date',
+                 '_number_loan_balance', '_number_commission', '_number_gst', '_number_commission_split',
+                 '_number_fees_gst', '_number_remitted', '_number_paid_to_broker', '_number_paid_to_referrer',
+                 '_number_retained')
+
     def __init__(self, broker, lender, client, ref_no, loan_balance, settlement_date,
                  commission, gst, commission_split, fees_gst, remitted, paid_to_broker,
                  paid_to_referrer, retained, document_row=None):
@@ -1157,6 +1085,23 @@ class TrailDataRow(InvoiceRow):
         self._margin = 0
         self._document_row = document_row + 2 if document_row is not None else document_row
 
+        # Values compared by equals() and the equal_* properties, normalized once
+        self._sanitized_broker = u.sanitize(self.broker)
+        self._sanitized_lender = u.sanitize(self.lender)
+        self._sanitized_client = u.sanitize(self.client)
+        self._sanitized_ref_no = u.sanitize(self.ref_no)
+        self._sanitized_referrer = u.sanitize(self.referrer)
+        self._sanitized_settlement_date = u.sanitize(self.settlement_date)
+        self._number_loan_balance = u.number_value(self.loan_balance)
+        self._number_commission = u.number_value(self.commission)
+        self._number_gst = u.number_value(self.gst)
+        self._number_commission_split = u.number_value(self.commission_split)
+        self._number_fees_gst = u.number_value(self.fees_gst)
+        self._number_remitted = u.number_value(self.remitted)
+        self._number_paid_to_broker = u.number_value(self.paid_to_broker)
+        self._number_paid_to_referrer = u.number_value(self.paid_to_referrer)
+        self._number_retained = u.number_value(self.retained)
+
         self._key = self._generate_key()
         self._key_full = self._generate_key_full()
 
@@ -1201,19 +1146,19 @@ class TrailDataRow(InvoiceRow):
     def equal_lender(self):
         if self.pair is None:
             return False
-        return u.sanitize(self.lender) == u.sanitize(self.pair.lender)
+        return self._sanitized_lender == self.pair._sanitized_lender
 
     @property
     def equal_referrer(self):
         if self.pair is None:
             return False
-        return u.sanitize(self.referrer) == u.sanitize(self.pair.referrer)
+        return self._sanitized_referrer == self.pair._sanitized_referrer
 
     @property
     def equal_loan_balance(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.loan_balance, self.pair.loan_balance, self.margin)
+        return u.compare_number_values(self._number_loan_balance, self.pair._number_loan_balance, self.margin)
 
     @property
     def equal_settlement_date(self):
@@ -1225,99 +1170,126 @@ class TrailDataRow(InvoiceRow):
     def equal_commission(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.commission, self.pair.commission, self.margin)
+        return u.compare_number_values(self._number_commission, self.pair._number_commission, self.margin)
 
     @property
     def equal_gst(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.gst, self.pair.gst, self.margin)
+        return u.compare_number_values(self._number_gst, self.pair._number_gst, self.margin)
 
     @property
     def equal_commission_split(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.commission_split, self.pair.commission_split, self.margin)
+        return u.compare_number_values(self._number_commission_split, self.pair._number_commission_split, self.margin)
 
     @property
     def equal_fees_gst(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.fees_gst, self.pair.fees_gst, self.margin)
+        return u.compare_number_values(self._number_fees_gst, self.pair._number_fees_gst, self.margin)
 
     @property
     def equal_remitted(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.remitted, self.pair.remitted, self.margin)
+        return u.compare_number_values(self._number_remitted, self.pair._number_remitted, self.margin)
 
     @property
     def equal_paid_to_broker(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.paid_to_broker, self.pair.paid_to_broker, self.margin)
+        return u.compare_number_values(self._number_paid_to_broker, self.pair._number_paid_to_broker, self.margin)
 
     @property
     def equal_paid_to_referrer(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.paid_to_referrer, self.pair.paid_to_referrer, self.margin)
+        return u.compare_number_values(self._number_paid_to_referrer, self.pair._number_paid_to_referrer, self.margin)
 
     @property
     def equal_retained(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.retained, self.pair.retained, self.margin)
+        return u.compare_number_values(self._number_retained, self.pair._number_retained, self.margin)
     # endregion
 
     def _generate_key(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(u.sanitize(self.broker).encode(ENCODING))
-        sha.update(u.sanitize(self.client).encode(ENCODING))
-        sha.update(self.ref_no.lower().encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key(self._sanitized_broker, self._sanitized_client, self.ref_no.lower(), salt)
 
     def _generate_key_full(self):
-        sha = hashlib.sha256()
-        sha.update(str(self.broker).encode(ENCODING))
-        sha.update(str(self.lender).encode(ENCODING))
-        sha.update(str(self.client).encode(ENCODING))
-        sha.update(str(self.ref_no).encode(ENCODING))
-        # sha.update(str(self.referrer).encode(ENCODING))
-        sha.update(str(self.loan_balance).encode(ENCODING))
-        sha.update(str(self.settlement_date).encode(ENCODING))
-        sha.update(str(self.commission).encode(ENCODING))
-        sha.update(str(self.gst).encode(ENCODING))
-        sha.update(str(self.commission_split).encode(ENCODING))
-        sha.update(str(self.fees_gst).encode(ENCODING))
-        sha.update(str(self.remitted).encode(ENCODING))
-        sha.update(str(self.paid_to_broker).encode(ENCODING))
-        sha.update(str(self.paid_to_referrer).encode(ENCODING))
-        sha.update(str(self.retained).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key_full(
+            str(self.broker),
+            str(self.lender),
+            str(self.client),
+            str(self.ref_no),
+            # str(self.referrer)
+            self._number_loan_balance,
+            str(self.settlement_date),
+            self._number_commission,
+            self._number_gst,
+            self._number_commission_split,
+            self._number_fees_gst,
+            self._number_remitted,
+            self._number_paid_to_broker,
+            self._number_paid_to_referrer,
+            self._number_retained,
+        )
 
     def equals(self, obj):
         if type(obj) != TrailDataRow:
             return False
 
         return (
-            u.sanitize(self.broker) == u.sanitize(obj.broker)
-            and u.sanitize(self.lender) == u.sanitize(obj.lender)
-            and u.sanitize(self.client) == u.sanitize(obj.client)
-            and u.sanitize(self.ref_no) == u.sanitize(obj.ref_no)
-            and self.compare_numbers(self.loan_balance, obj.loan_balance, self.margin)
+            self._sanitized_broker == obj._sanitized_broker
+            and self._sanitized_lender == obj._sanitized_lender
+            and self._sanitized_client == obj._sanitized_client
+            and self._sanitized_ref_no == obj._sanitized_ref_no
+            and u.compare_number_values(self._number_loan_balance, obj._number_loan_balance, self.margin)
             and self.settlement_date == obj.settlement_date
-            and self.compare_numbers(self.commission, obj.commission, self.margin)
-            and self.compare_numbers(self.gst, obj.gst, self.margin)
-            and self.compare_numbers(self.commission_split, obj.commission_split, self.margin)
-            and self.compare_numbers(self.fees_gst, obj.fees_gst, self.margin)
-            and self.compare_numbers(self.remitted, obj.remitted, self.margin)
-            and self.compare_numbers(self.paid_to_broker, obj.paid_to_broker, self.margin)
-            and self.compare_numbers(self.paid_to_referrer, obj.paid_to_referrer, self.margin)
-            and self.compare_numbers(self.retained, obj.retained, self.margin)
+            and u.compare_number_values(self._number_commission, obj._number_commission, self.margin)
+            and u.compare_number_values(self._number_gst, obj._number_gst, self.margin)
+            and u.compare_number_values(self._number_commission_split, obj._number_commission_split, self.margin)
+            and u.compare_number_values(self._number_fees_gst, obj._number_fees_gst, self.margin)
+            and u.compare_number_values(self._number_remitted, obj._number_remitted, self.margin)
+            and u.compare_number_values(self._number_paid_to_broker, obj._number_paid_to_broker, self.margin)
+            and u.compare_number_values(self._number_paid_to_referrer, obj._number_paid_to_referrer, self.margin)
+            and u.compare_number_values(self._number_retained, obj._number_retained, self.margin)
+        )
+
+    def match_identity(self):
+        return (
+            self._sanitized_broker,
+            self._sanitized_lender,
+            self._sanitized_client,
+            self._sanitized_ref_no,
+            self.settlement_date
         )
 
+    def match_amount(self):
+        return self.commission
+
+    @staticmethod
+    def frame_identity(frame):
+        # match_identity() of every row of a Trail frame
+        return pandas.DataFrame({
+            'broker': frame['Broker'].map(u.sanitize),
+            'lender': frame['Lender'].map(u.sanitize),
+            'client': frame['Client'].map(u.sanitize),
+            'ref_no': frame['Ref #'].map(u.sanitize),
+            'settlement_date': frame['Settlement Date'],
+        })
+
+    @staticmethod
+    def frame_key(frame):
+        # key of every row of a Trail frame, without the salt of a duplicate
+        return pandas.DataFrame({
+            'broker': frame['Broker'].map(u.sanitize),
+            'client': frame['Client'].map(u.sanitize),
+            'ref_no': frame['Ref #'].map(lambda ref_no: str(ref_no).strip().lower()),
+        })
+
     @staticmethod
     def write_row(worksheet, invoice, element, row, fmt_error, side='left', write_errors=True):
         col = 0
@@ -1402,6 +1374,10 @@ class TrailDataRow(InvoiceRow):
 
 class TaxInvoiceDataRow(InvoiceRow):
 
+    __slots__ = ('description', 'amount', 'gst', 'total', 'comments', '_pair', '_margin', '_document_row', '_key',
+                 '_key_full', '_sanitized_description', '_sanitized_comments', '_number_amount', '_number_gst',
+                 '_number_total')
+
     def __init__(self, description, amount, gst, total, comments, document_row=None):
         InvoiceRow.__init__(self)
 
@@ -1415,6 +1391,13 @@ class TaxInvoiceDataRow(InvoiceRow):
         self._margin = 0
         self._document_row = document_row + 2 if document_row is not None else document_row
 
+        # Values compared by equals() and the equal_* properties, normalized once
+        self._sanitized_description = u.sanitize(self.description)
+        self._sanitized_comments = u.sanitize(self.comments)
+        self._number_amount = u.number_value(self.amount)
+        self._number_gst = u.number_value(self.gst)
+        self._number_total = u.number_value(self.total)
+
         self._key = self._generate_key()
         self._key_full = self._generate_key_full()
 
@@ -1459,60 +1442,57 @@ class TaxInvoiceDataRow(InvoiceRow):
     def equal_description(self):
         if self.pair is None:
             return False
-        return u.sanitize(self.description) == u.sanitize(self.pair.description)
+        return self._sanitized_description == self.pair._sanitized_description
 
     @property
     def equal_amount(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.amount, self.pair.amount, self.margin)
+        return u.compare_number_values(self._number_amount, self.pair._number_amount, self.margin)
 
     @property
     def equal_gst(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.gst, self.pair.gst, self.margin)
+        return u.compare_number_values(self._number_gst, self.pair._number_gst, self.margin)
 
     @property
     def equal_total(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.total, self.pair.total, self.margin)
+        return u.compare_number_values(self._number_total, self.pair._number_total, self.margin)
 
     @property
     def equal_comments(self):
         if self.pair is None:
             return False
-        return u.sanitize(self.comments) == u.sanitize(self.pair.comments)
+        return self._sanitized_comments == self.pair._sanitized_comments
     # endregion
 
     def _generate_key(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(u.sanitize(self.description).encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key(self._sanitized_description, salt)
 
     def _generate_key_full(self):
-        sha = hashlib.sha256()
-        sha.update(str(self.description).encode(ENCODING))
-        sha.update(str(self.amount).encode(ENCODING))
-        sha.update(str(self.gst).encode(ENCODING))
-        sha.update(str(self.total).encode(ENCODING))
-        sha.update(str(self.comments).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key_full(str(self.description), self._number_amount, self._number_gst, self._number_total, str(self.comments))
 
     def equals(self, obj):
         if type(obj) != TaxInvoiceDataRow:
             return False
 
         return (
-            u.sanitize(self.description) == u.sanitize(obj.description)
-            and u.sanitize(self.comments) == u.sanitize(obj.comments)
-            and self.compare_numbers(self.amount, obj.amount, self.margin)
-            and self.compare_numbers(self.gst, obj.gst, self.margin)
-            and self.compare_numbers(self.total, obj.total, self.margin)
+            self._sanitized_description == obj._sanitized_description
+            and self._sanitized_comments == obj._sanitized_comments
+            and u.compare_number_values(self._number_amount, obj._number_amount, self.margin)
+            and u.compare_number_values(self._number_gst, obj._number_gst, self.margin)
+            and u.compare_number_values(self._number_total, obj._number_total, self.margin)
         )
 
+    def match_identity(self):
+        return (self._sanitized_description, self._sanitized_comments)
+
+    def match_amount(self):
+        return self.total
+
     @staticmethod
     def write_row(worksheet, invoice, element, row, fmt_error, side='left', write_errors=True):
         col = 0
@@ -1558,6 +1538,9 @@ class TaxInvoiceDataRow(InvoiceRow):
 
 class RCTIDataRow(InvoiceRow):
 
+    __slots__ = ('description', 'amount', 'gst', 'total', '_pair', '_margin', '_document_row', '_key', '_key_full',
+                 '_sanitized_description', '_number_amount', '_number_gst', '_number_total')
+
     def __init__(self, description, amount, gst, total, document_row=None):
         InvoiceRow.__init__(self)
         print(f"""description: {description}, amount:{amount}, gst:{gst}, total: {total}, document_row: {document_row}""")
@@ -1572,6 +1555,12 @@ class RCTIDataRow(InvoiceRow):
         self._margin = 0
         self._document_row = document_row + 2 if document_row is not None else document_row
 
+        # Values compared by equals() and the equal_* properties, normalized once
+        self._sanitized_description = u.sanitize(self.description)
+        self._number_amount = u.number_value(self.amount)
+        self._number_gst = u.number_value(self.gst)
+        self._number_total = u.number_value(self.total)
+
         self._key = self._generate_key()
         self._key_full = self._generate_key_full()
 
@@ -1616,52 +1605,50 @@ class RCTIDataRow(InvoiceRow):
     def equal_description(self):
         if self.pair is None:
             return False
-        return u.sanitize(self.description) == u.sanitize(self.pair.description)
+        return self._sanitized_description == self.pair._sanitized_description
 
     @property
     def equal_amount(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.amount, self.pair.amount, self.margin)
+        return u.compare_number_values(self._number_amount, self.pair._number_amount, self.margin)
 
     @property
     def equal_gst(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.gst, self.pair.gst, self.margin)
+        return u.compare_number_values(self._number_gst, self.pair._number_gst, self.margin)
 
     @property
     def equal_total(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.total, self.pair.total, self.margin)
+        return u.compare_number_values(self._number_total, self.pair._number_total, self.margin)
     # endregion
 
     def _generate_key(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(u.sanitize(self.description).encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key(self._sanitized_description, salt)
 
     def _generate_key_full(self):
-        sha = hashlib.sha256()
-        sha.update(str(self.description).encode(ENCODING))
-        sha.update(str(self.amount).encode(ENCODING))
-        sha.update(str(self.gst).encode(ENCODING))
-        sha.update(str(self.total).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key_full(str(self.description), self._number_amount, self._number_gst, self._number_total)
 
     def equals(self, obj):
         if type(obj) != RCTIDataRow:
             return False
 
         return (
-            u.sanitize(self.description) == u.sanitize(obj.description)
-            and self.compare_numbers(self.amount, obj.amount, self.margin)
-            and self.compare_numbers(self.gst, obj.gst, self.margin)
-            and self.compare_numbers(self.total, obj.total, self.margin)
+            self._sanitized_description == obj._sanitized_description
+            and u.compare_number_values(self._number_amount, obj._number_amount, self.margin)
+            and u.compare_number_values(self._number_gst, obj._number_gst, self.margin)
+            and u.compare_number_values(self._number_total, obj._number_total, self.margin)
         )
 
+    def match_identity(self):
+        return (self._sanitized_description,)
+
+    def match_amount(self):
+        return self.total
+
     @staticmethod
     def write_row(worksheet, invoice, element, row, fmt_error, tab, side='left', ignore_last_two=False, write_errors=True):
         col = 0
@@ -1702,19 +1689,19 @@ class RCTIDataRow(InvoiceRow):
         return errors
 
 
-def read_files_branch(dir_: str, files: list) -> dict:
-    keys = {}
-    counter = 1
-    for file in files:
-        print(f'Parsing {counter} of {len(files)} files from {bcolors.BLUE}{dir_}{bcolors.ENDC}', end='\r')
-        if os.path.isdir(dir_ + file):
-            continue
-        try:
-            ti = BranchTaxInvoice(dir_, file)
-            keys[ti.key] = ti
-        except IndexError:
-            # handle exception when there is a column missing in the file.
-            pass
-        counter += 1
-    print()
-    return keys
+def rows_from_frame(frame, cls, labels=None):
+    if frame is None:
+        return
+    if labels is not None:
+        frame = frame.loc[labels]
+    for index, values in zip(frame.index, frame.itertuples(index=False, name=None)):
+        yield cls(*values, index)
+
+
+def summary_row_writer(sec_index):
+    # Only the first section of the Summary tab has the Gst and Total columns
+    return partial(RCTIDataRow.write_row, tab=TAB_SUMMARY, ignore_last_two=sec_index > 0)
+
+
+def read_files_branch(dir_: str, files: list, workers=1) -> dict:
+    return read_invoices(BranchTaxInvoice, [(dir_, files)], workers)[0]
@@ -1,14 +1,13 @@
-import os
 import pdb
 import numpy
 import hashlib
 
 import pandas
 
-from src.model.taxinvoice import (TaxInvoice, InvoiceRow, ENCODING, OUTPUT_DIR_BROKER, new_error,
-                                  get_header_format, get_error_format)
+from src.model.taxinvoice import (TaxInvoice, InvoiceRow, ENCODING, OUTPUT_DIR_BROKER, NULL_WORKSHEET, new_error,
+                                  get_header_format, get_error_format, read_invoices, write_pairs, row_key,
+                                  row_key_full)
 from src import utils as u
-from src.utils import bcolors
 
 HEADER_BROKER = ['Commission Type', 'Client', 'Commission Ref ID', 'Bank', 'Loan Balance',
                  'Amount Paid', 'GST Paid', 'Total Amount Paid', 'Comments']
@@ -22,8 +21,9 @@ class BrokerTaxInvoice(TaxInvoice):
         self.datarows = {}
         self.datarows_count = {}
         self.summary_errors = []
+        self.pairs = []
         self._key = self.__generate_key()
-        self.parse()
+        self.parse_cached()
 
     def parse(self):
         print(self.full_path)
@@ -32,7 +32,7 @@ class BrokerTaxInvoice(TaxInvoice):
         dataframe_info = dataframe.replace(numpy.nan, '', regex=True)
         dataframe_broker_info = dataframe_info.iloc[2:5, 0:2]
 
-        account_info = dataframe_info.iloc[len(dataframe_info.index) - 1][1]
+        account_info = dataframe_info.iloc[len(dataframe_info.index) - 1].iloc[1]
         account_info_parts = str(account_info).split(':')
         #pdb.set_trace()
         bsb = account_info_parts[1].strip().split('/')[0][1:]
@@ -41,9 +41,9 @@ class BrokerTaxInvoice(TaxInvoice):
         if account[-1] == ')':
             account = account[:-1]
 
-        self.from_ = dataframe_broker_info.iloc[0][1]
-        self.to = dataframe_broker_info.iloc[1][1]
-        self.abn = dataframe_broker_info.iloc[2][1]
+        self.from_ = dataframe_broker_info.iloc[0].iloc[1]
+        self.to = dataframe_broker_info.iloc[1].iloc[1]
+        self.abn = dataframe_broker_info.iloc[2].iloc[1]
         self.bsb = bsb
         self.account = account
 
@@ -62,11 +62,27 @@ class BrokerTaxInvoice(TaxInvoice):
                 row['Total Amount Paid'], row['Comments'], index + 2)
             self.__add_datarow(invoice_row)
 
-    def process_comparison(self, margin=0.000001):
-        if self.pair is None:
-            return None
-        assert type(self.pair) == type(self), "self.pair is not of the correct type"
+    def compare(self, margin):
+        if not self.equal_from:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'From does not match', '', '', self.from_, self.pair.from_))
+        if not self.equal_to:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'To does not match', '', '', self.to, self.pair.to))
+        if not self.equal_abn:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'ABN does not match', '', '', self.abn, self.pair.abn))
+        if not self.equal_bsb:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'BSB does not match', '', '', self.bsb, self.pair.bsb))
+        if not self.equal_account:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'Account does not match', '', '', self.account, self.pair.account))
 
+        self.pairs = self.match_rows(self.datarows, self.pair.datarows, margin)
+        self.summary_errors += write_pairs(NULL_WORKSHEET, self, self.pairs, 0, None, BrokerInvoiceRow.write_row)
+
+    def write_detailed(self):
         workbook = self.create_workbook(OUTPUT_DIR_BROKER)
         fmt_table_header = get_header_format(workbook)
         fmt_error = get_error_format(workbook)
@@ -106,22 +122,6 @@ class BrokerTaxInvoice(TaxInvoice):
         worksheet.write(row, col_b, 'Account')
         worksheet.write(row, col_b + 1, self.pair.account, format_)
 
-        if not self.equal_from:
-            self.summary_errors.append(new_error(
-                self.filename, self.pair.filename, 'From does not match', '', '', self.from_, self.pair.from_))
-        if not self.equal_to:
-            self.summary_errors.append(new_error(
-                self.filename, self.pair.filename, 'To does not match', '', '', self.to, self.pair.to))
-        if not self.equal_abn:
-            self.summary_errors.append(new_error(
-                self.filename, self.pair.filename, 'ABN does not match', '', '', self.abn, self.pair.abn))
-        if not self.equal_bsb:
-            self.summary_errors.append(new_error(
-                self.filename, self.pair.filename, 'BSB does not match', '', '', self.bsb, self.pair.bsb))
-        if not self.equal_account:
-            self.summary_errors.append(new_error(
-                self.filename, self.pair.filename, 'Account does not match', '', '', self.account, self.pair.account))
-
         row += 2
 
         for index, item in enumerate(HEADER_BROKER):
@@ -129,62 +129,8 @@ class BrokerTaxInvoice(TaxInvoice):
             worksheet.write(row, col_b + index, item, fmt_table_header)
         row += 1
 
-        keys_unmatched = set(self.pair.datarows.keys() - set(self.datarows.keys()))
-
-        # Code below is just to find the errors and write them into the spreadsheets
-        for key_full in self.datarows.keys():
-            self_row = self.datarows[key_full]
-            self_row.margin = margin
-
-            pair_row = self.find_pair_row(self_row)
-            self_row.pair = pair_row
-
-            if pair_row is not None:
-                # delete from pair list so it doesn't get matched again
-                del self.pair.datarows[pair_row.key_full]
-                # Remove the key from the keys_unmatched if it is there
-                if pair_row.key_full in keys_unmatched:
-                    keys_unmatched.remove(pair_row.key_full)
-
-                pair_row.margin = margin
-                pair_row.pair = self_row
-                self.summary_errors += BrokerInvoiceRow.write_row(
-                    worksheet, self, pair_row, row, fmt_error, 'right', write_errors=False)
-
-            self.summary_errors += BrokerInvoiceRow.write_row(worksheet, self, self_row, row, fmt_error)
-            row += 1
-
-        # Write unmatched records
-        for key in keys_unmatched:
-            self.summary_errors += BrokerInvoiceRow.write_row(
-                worksheet, self, self.pair.datarows[key], row, fmt_error, 'right', write_errors=False)
-            row += 1
-
-        if len(self.summary_errors) > 0:
-            workbook.close()
-        else:
-            del workbook
-        return self.summary_errors
-
-    def find_pair_row(self, row):
-        # Match by full_key
-        pair_row = self.pair.datarows.get(row.key_full, None)
-        if pair_row is not None:
-            return pair_row
-
-        # We want to match by similarity before matching by the key
-        # Match by similarity
-        for _, item in self.pair.datarows.items():
-            if row.equals(item):
-                return item
-
-        # Match by key
-        for _, item in self.pair.datarows.items():
-            if row.key == item.key:
-                return item
-
-        # Return None if nothing found
-        return None
+        write_pairs(worksheet, self, self.pairs, row, fmt_error, BrokerInvoiceRow.write_row)
+        workbook.close()
 
     def __generate_key(self):
         sha = hashlib.sha256()
@@ -238,6 +184,12 @@ class BrokerTaxInvoice(TaxInvoice):
 
 class BrokerInvoiceRow(InvoiceRow):
 
+    __slots__ = ('commission_type', 'client', 'reference_id', 'bank', 'loan_balance', 'amount_paid', 'gst_paid',
+                 'total_amount_paid', 'comments', 'row_number', '_pair', '_margin', '_key', '_key_full',
+                 '_sanitized_commission_type', '_sanitized_client', '_sanitized_reference_id',
+                 '_sanitized_bank_fullname', '_sanitized_comments', '_number_loan_balance', '_number_amount_paid',
+                 '_number_gst_paid', '_number_total_amount_paid')
+
     def __init__(self, commission_type, client, reference_id, bank, loan_balance, amount_paid,
                  gst_paid, total_amount_paid, comments, row_number):
         InvoiceRow.__init__(self)
@@ -255,6 +207,17 @@ class BrokerInvoiceRow(InvoiceRow):
         self.comments = str(comments)
         self.row_number = str(row_number)
 
+        # Values compared by equals() and the equal_* properties, normalized once
+        self._sanitized_commission_type = u.sanitize(self.commission_type)
+        self._sanitized_client = u.sanitize(self.client)
+        self._sanitized_reference_id = u.sanitize(self.reference_id)
+        self._sanitized_bank_fullname = u.sanitize(u.bank_fullname(self.bank))
+        self._sanitized_comments = u.sanitize(self.comments)
+        self._number_loan_balance = u.number_value(self.loan_balance)
+        self._number_amount_paid = u.number_value(self.amount_paid)
+        self._number_gst_paid = u.number_value(self.gst_paid)
+        self._number_total_amount_paid = u.number_value(self.total_amount_paid)
+
         self._key = self._generate_key()
         self._key_full = self._generate_key_full()
 
@@ -295,78 +258,82 @@ class BrokerInvoiceRow(InvoiceRow):
     def equal_bank(self):
         if self.pair is None:
             return False
-        bank_a = u.bank_fullname(self.bank)
-        bank_b = u.bank_fullname(self.pair.bank)
-        return u.sanitize(bank_a) == u.sanitize(bank_b)
+        return self._sanitized_bank_fullname == self.pair._sanitized_bank_fullname
 
     @property
     def equal_loan_balance(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.loan_balance, self.pair.loan_balance, self.margin)
+        return u.compare_number_values(self._number_loan_balance, self.pair._number_loan_balance, self.margin)
 
     @property
     def equal_amount_paid(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.amount_paid, self.pair.amount_paid, self.margin)
+        return u.compare_number_values(self._number_amount_paid, self.pair._number_amount_paid, self.margin)
 
     @property
     def equal_gst_paid(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.gst_paid, self.pair.gst_paid, self.margin)
+        return u.compare_number_values(self._number_gst_paid, self.pair._number_gst_paid, self.margin)
 
     @property
     def equal_total_amount_paid(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.total_amount_paid, self.pair.total_amount_paid, self.margin)
+        return u.compare_number_values(self._number_total_amount_paid, self.pair._number_total_amount_paid, self.margin)
 
     @property
     def equal_comments(self):
         if self.pair is None:
             return False
-        return u.sanitize(self.comments) == u.sanitize(self.pair.comments)
+        return self._sanitized_comments == self.pair._sanitized_comments
     # endregion
 
     def _generate_key(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(u.sanitize(self.commission_type).encode(ENCODING))
-        sha.update(u.sanitize(self.client).encode(ENCODING))
-        sha.update(self.reference_id.encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key(self._sanitized_commission_type, self._sanitized_client, self.reference_id, salt)
 
     def _generate_key_full(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(self.commission_type.encode(ENCODING))
-        sha.update(self.client.encode(ENCODING))
-        sha.update(self.reference_id.encode(ENCODING))
-        # sha.update(self.bank.encode(ENCODING))
-        sha.update(self.loan_balance.encode(ENCODING))
-        sha.update(self.amount_paid.encode(ENCODING))
-        sha.update(self.gst_paid.encode(ENCODING))
-        sha.update(self.total_amount_paid.encode(ENCODING))
-        sha.update(self.comments.encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key_full(
+            self.commission_type,
+            self.client,
+            self.reference_id,
+            # self.bank
+            self.loan_balance,
+            self.amount_paid,
+            self.gst_paid,
+            self.total_amount_paid,
+            self.comments,
+            salt,
+        )
 
     def equals(self, obj):
         if type(obj) != BrokerInvoiceRow:
             return False
 
         return (
-            u.sanitize(self.commission_type) == u.sanitize(obj.commission_type)
-            and u.sanitize(self.client) == u.sanitize(obj.client)
-            and u.sanitize(self.reference_id) == u.sanitize(obj.reference_id)
-            and u.sanitize(u.bank_fullname(self.bank)) == u.sanitize(u.bank_fullname(obj.bank))
-            and self.compare_numbers(self.loan_balance, obj.loan_balance, self.margin)
-            and self.compare_numbers(self.amount_paid, obj.amount_paid, self.margin)
-            and self.compare_numbers(self.gst_paid, obj.gst_paid, self.margin)
-            and self.compare_numbers(self.total_amount_paid, obj.total_amount_paid, self.margin)
+            self._sanitized_commission_type == obj._sanitized_commission_type
+            and self._sanitized_client == obj._sanitized_client
+            and self._sanitized_reference_id == obj._sanitized_reference_id
+            and self._sanitized_bank_fullname == obj._sanitized_bank_fullname
+            and u.compare_number_values(self._number_loan_balance, obj._number_loan_balance, self.margin)
+            and u.compare_number_values(self._number_amount_paid, obj._number_amount_paid, self.margin)
+            and u.compare_number_values(self._number_gst_paid, obj._number_gst_paid, self.margin)
+            and u.compare_number_values(self._number_total_amount_paid, obj._number_total_amount_paid, self.margin)
         )
 
+    def match_identity(self):
+        return (
+            self._sanitized_commission_type,
+            self._sanitized_client,
+            self._sanitized_reference_id,
+            self._sanitized_bank_fullname
+        )
+
+    def match_amount(self):
+        return self.total_amount_paid
+
     @staticmethod
     def write_row(worksheet, invoice, element, row, fmt_error, side='left', write_errors=True):
         col = 0
@@ -435,19 +402,5 @@ class BrokerInvoiceRow(InvoiceRow):
         return errors
 
 
-def read_files_broker(dir_: str, files: list) -> dict:
-    keys = {}
-    counter = 1
-    for file in files:
-        print(f'Parsing {counter} of {len(files)} files from {bcolors.BLUE}{dir_}{bcolors.ENDC}', end='\r')
-        if os.path.isdir(dir_ + file):
-            continue
-        try:
-            ti = BrokerTaxInvoice(dir_, file)
-            keys[ti.key] = ti
-        except IndexError:
-            # handle exception when there is a column missing in the file.
-            pass
-        counter += 1
-    print()
-    return keys
+def read_files_broker(dir_: str, files: list, workers=1) -> dict:
+    return read_invoices(BrokerTaxInvoice, [(dir_, files)], workers)[0]
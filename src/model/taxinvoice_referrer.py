@@ -1,13 +1,14 @@
-import os
 import hashlib
+from html.parser import HTMLParser
 
 from bs4 import BeautifulSoup
 
-from src.model.taxinvoice import (TaxInvoice, InvoiceRow, ENCODING, OUTPUT_DIR_REFERRER, new_error,
-                                  get_header_format, get_error_format)
+from src.model.taxinvoice import (TaxInvoice, InvoiceRow, ENCODING, OUTPUT_DIR_REFERRER, NULL_WORKSHEET, new_error,
+                                  get_header_format, get_error_format, read_invoices, write_pairs, row_key,
+                                  row_key_full)
+from src.model.metrics import METRICS
 
 from src import utils as u
-from src.utils import bcolors
 
 HEADER_REFERRER = ['Commission Type', 'Client', 'Referrer Name', 'Amount Paid', 'GST Paid', 'Total Amount Paid']
 
@@ -16,102 +17,49 @@ class ReferrerTaxInvoice(TaxInvoice):
 
     def __init__(self, directory, filename):
         TaxInvoice.__init__(self, directory, filename)
-        self.filetext = self.get_file_text()
         self.pair = None
         self.datarows = {}
         self.datarows_count = {}
         self.summary_errors = []
+        self.pairs = []
         self.margin = 0
         self._key = self.__generate_key()
-        self.parse()
+        self.parse_cached()
 
     def get_file_text(self):
-        file = open(self.full_path, 'r')
-        return file.read()
+        with open(self.full_path, 'r') as file:
+            return file.read()
 
     # region Parsers
     def parse(self):
-        soup = BeautifulSoup(self.filetext, 'html.parser')
-
-        self._from = self.parse_from(soup)
-        self.from_abn = self.parse_from_abn(soup)
-        self.to = self.parse_to(soup)
-        self.to_abn = self.parse_to_abn(soup)
-        self.bsb = self.parse_bsb(soup)
-        self.account = self.parse_account(soup)
-        self.final_total = self.parse_final_total(soup)
-        self.parse_rows(soup)
-
-    def parse_from(self, soup: BeautifulSoup):
-        parts_info = self._get_parts_info(soup)
-        _from = parts_info[1][:-4]
-        _from = _from.strip()
-        return _from
-
-    def parse_from_abn(self, soup: BeautifulSoup):
-        parts_info = self._get_parts_info(soup)
-        abn = parts_info[2][:-3]
-        abn = abn.strip()
-        return abn
-
-    def parse_to(self, soup: BeautifulSoup):
-        parts_info = self._get_parts_info(soup)
-        to = parts_info[3][:-4]
-        to = to.strip()
-        return to
-
-    def parse_to_abn(self, soup: BeautifulSoup):
-        parts_info = self._get_parts_info(soup)
-        abn = parts_info[4][:-5]
-        abn = abn.strip()
-        return abn
-
-    def parse_bsb(self, soup: BeautifulSoup):
-        parts_account = self._get_parts_account(soup)
-        bsb = parts_account[1].split(' - ')[0].strip()
-        return bsb
-
-    def parse_account(self, soup: BeautifulSoup):
-        parts_account = self._get_parts_account(soup)
-        account = parts_account[2].split('/')[0].strip()
-        return account
-
-    def parse_final_total(self, soup: BeautifulSoup):
-        parts_account = self._get_parts_account(soup)
-        final_total = parts_account[3].strip()
-        return final_total
-
-    def parse_rows(self, soup: BeautifulSoup):
-        header = soup.find('tr')  # Find header
-        header = header.extract()  # Remove header
-        header = header.find_all('th')
-        table_rows = soup.find_all('tr')
+        # The text is only read here so a file loaded from the parse cache is not read at all
+        filetext = self.get_file_text()
+        document = ReferrerDocument(filetext)
+        if document.malformed:
+            METRICS.count('html_fallbacks')
+            document = SoupDocument(filetext)
+
+        header = ReferrerHeader(document)
+        self._from = header._from
+        self.from_abn = header.from_abn
+        self.to = header.to
+        self.to_abn = header.to_abn
+        self.bsb = header.bsb
+        self.account = header.account
+        self.final_total = header.final_total
+        self.parse_rows(document)
+
+    def parse_rows(self, document):
+        header = document.header
         row_number = 0
-        for tr in table_rows:
+        for tds in document.rows:
             row_number += 1
-            tds = tr.find_all('td')
             if len(header) == 6:
-                row = ReferrerInvoiceRow(tds[0].text, tds[1].text, tds[2].text,
-                                         tds[3].text, tds[4].text, tds[5].text, row_number)
+                row = ReferrerInvoiceRow(tds[0], tds[1], tds[2], tds[3], tds[4], tds[5], row_number)
                 self.__add_datarow(row)
             else:
-                row = ReferrerInvoiceRow(tds[0].text, tds[1].text, '',
-                                         tds[2].text, tds[3].text, tds[4].text, row_number)
+                row = ReferrerInvoiceRow(tds[0], tds[1], '', tds[2], tds[3], tds[4], row_number)
                 self.__add_datarow(row)
-
-    def _get_parts_info(self, soup: BeautifulSoup):
-        body = soup.find('body')
-        extracted_info = body.find('p').text
-        info = ' '.join(extracted_info.split())
-        parts_info = info.split(':')
-        return parts_info
-
-    def _get_parts_account(self, soup: BeautifulSoup):
-        body = soup.find('body')
-        extracted_account = body.find('p').find_next('p').text
-        account = ' '.join(extracted_account.split())
-        parts_account = account.split(':')
-        return parts_account
     # endregion
 
     def __generate_key(self):
@@ -128,13 +76,36 @@ class ReferrerTaxInvoice(TaxInvoice):
         sha.update(filename_forkey.encode(ENCODING))
         return sha.hexdigest()
 
-    def process_comparison(self, margin=0.000001):
-        if self.pair is None:
-            return None
-        assert type(self.pair) == type(self), "self.pair is not of the correct type"
+    def compare(self, margin):
         self.margin = margin
         self.pair.margin = margin
 
+        if not self.equal_from:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'From does not match', '', '', self._from, self.pair._from))
+        if not self.equal_from_abn:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'From ABN does not match', '', '', self.from_abn, self.pair.from_abn))
+        if not self.equal_to:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'To does not match', '', '', self.to, self.pair.to))
+        if not self.equal_to_abn:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'To ABN does not match', '', '', self.to_abn, self.pair.to_abn))
+        if not self.equal_bsb:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'BSB does not match', '', '', self.bsb, self.pair.bsb))
+        if not self.equal_account:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'Account does not match', '', '', self.account, self.pair.account))
+        if not self.equal_final_total:
+            self.summary_errors.append(new_error(
+                self.filename, self.pair.filename, 'Total does not match', '', '', self.final_total, self.pair.final_total))
+
+        self.pairs = self.match_rows(self.datarows, self.pair.datarows, margin)
+        self.summary_errors += write_pairs(NULL_WORKSHEET, self, self.pairs, 0, None, ReferrerInvoiceRow.write_row)
+
+    def write_detailed(self):
         workbook = self.create_workbook(OUTPUT_DIR_REFERRER)
         fmt_table_header = get_header_format(workbook)
         fmt_error = get_error_format(workbook)
@@ -144,85 +115,55 @@ class ReferrerTaxInvoice(TaxInvoice):
         col_a = 0
         col_b = 8
 
+        # Both sides of a row are written before moving to the next one, rows can only go forward
         format_ = fmt_error if not self.equal_from else None
         worksheet.write(row, col_a, 'From')
         worksheet.write(row, col_a + 1, self._from, format_)
+        format_ = fmt_error if not self.pair.equal_from else None
+        worksheet.write(row, col_b, 'From')
+        worksheet.write(row, col_b + 1, self.pair._from, format_)
         row += 1
         format_ = fmt_error if not self.equal_from_abn else None
         worksheet.write(row, col_a, 'From ABN')
         worksheet.write(row, col_a + 1, self.from_abn, format_)
+        format_ = fmt_error if not self.pair.equal_from_abn else None
+        worksheet.write(row, col_b, 'From ABN')
+        worksheet.write(row, col_b + 1, self.pair.from_abn, format_)
         row += 1
         format_ = fmt_error if not self.equal_to else None
         worksheet.write(row, col_a, 'To')
         worksheet.write(row, col_a + 1, self.to, format_)
+        format_ = fmt_error if not self.pair.equal_to else None
+        worksheet.write(row, col_b, 'To')
+        worksheet.write(row, col_b + 1, self.pair.to, format_)
         row += 1
         format_ = fmt_error if not self.equal_to_abn else None
         worksheet.write(row, col_a, 'To ABN')
         worksheet.write(row, col_a + 1, self.to_abn, format_)
+        format_ = fmt_error if not self.pair.equal_to_abn else None
+        worksheet.write(row, col_b, 'To ABN')
+        worksheet.write(row, col_b + 1, self.pair.to_abn, format_)
         row += 1
         format_ = fmt_error if not self.equal_bsb else None
         worksheet.write(row, col_a, 'BSB')
         worksheet.write(row, col_a + 1, self.bsb, format_)
+        format_ = fmt_error if not self.pair.equal_bsb else None
+        worksheet.write(row, col_b, 'BSB')
+        worksheet.write(row, col_b + 1, self.pair.bsb, format_)
         row += 1
         format_ = fmt_error if not self.equal_account else None
         worksheet.write(row, col_a, 'Account')
         worksheet.write(row, col_a + 1, self.account, format_)
+        format_ = fmt_error if not self.pair.equal_account else None
+        worksheet.write(row, col_b, 'Account')
+        worksheet.write(row, col_b + 1, self.pair.account, format_)
         row += 1
         format_ = fmt_error if not self.equal_final_total else None
         worksheet.write(row, col_a, 'Total')
         worksheet.write(row, col_a + 1, self.final_total, format_)
-
-        if self.pair is not None:
-            row = 0
-            format_ = fmt_error if not self.pair.equal_from else None
-            worksheet.write(row, col_b, 'From')
-            worksheet.write(row, col_b + 1, self.pair._from, format_)
-            row += 1
-            format_ = fmt_error if not self.pair.equal_from_abn else None
-            worksheet.write(row, col_b, 'From ABN')
-            worksheet.write(row, col_b + 1, self.pair.from_abn, format_)
-            row += 1
-            format_ = fmt_error if not self.pair.equal_to else None
-            worksheet.write(row, col_b, 'To')
-            worksheet.write(row, col_b + 1, self.pair.to, format_)
-            row += 1
-            format_ = fmt_error if not self.pair.equal_to_abn else None
-            worksheet.write(row, col_b, 'To ABN')
-            worksheet.write(row, col_b + 1, self.pair.to_abn, format_)
-            row += 1
-            format_ = fmt_error if not self.pair.equal_bsb else None
-            worksheet.write(row, col_b, 'BSB')
-            worksheet.write(row, col_b + 1, self.pair.bsb, format_)
-            row += 1
-            format_ = fmt_error if not self.pair.equal_account else None
-            worksheet.write(row, col_b, 'Account')
-            worksheet.write(row, col_b + 1, self.pair.account, format_)
-            row += 1
-            format_ = fmt_error if not self.pair.equal_final_total else None
-            worksheet.write(row, col_b, 'Total')
-            worksheet.write(row, col_b + 1, self.pair.final_total, format_)
-
-            if not self.equal_from:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'From does not match', '', '', self._from, self.pair._from))
-            if not self.equal_from_abn:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'From ABN does not match', '', '', self.from_abn, self.pair.from_abn))
-            if not self.equal_to:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'To does not match', '', '', self.to, self.pair.to))
-            if not self.equal_to_abn:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'To ABN does not match', '', '', self.to_abn, self.pair.to_abn))
-            if not self.equal_bsb:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'BSB does not match', '', '', self.bsb, self.pair.bsb))
-            if not self.equal_account:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'Account does not match', '', '', self.account, self.pair.account))
-            if not self.equal_final_total:
-                self.summary_errors.append(new_error(
-                    self.filename, self.pair.filename, 'Total does not match', '', '', self.final_total, self.pair.final_total))
+        format_ = fmt_error if not self.pair.equal_final_total else None
+        worksheet.write(row, col_b, 'Total')
+        worksheet.write(row, col_b + 1, self.pair.final_total, format_)
 
         row += 2
 
@@ -231,62 +172,8 @@ class ReferrerTaxInvoice(TaxInvoice):
             worksheet.write(row, col_b + index, item, fmt_table_header)
         row += 1
 
-        keys_unmatched = set(self.pair.datarows.keys() - set(self.datarows.keys()))
-
-        # Code below is just to find the errors and write them into the spreadsheets
-        for key_full in self.datarows.keys():
-            self_row = self.datarows[key_full]
-            self_row.margin = margin
-
-            pair_row = self.find_pair_row(self_row)
-            self_row.pair = pair_row
-
-            if pair_row is not None:
-                # delete from pair list so it doesn't get matched again
-                del self.pair.datarows[pair_row.key_full]
-                # Remove the key from the keys_unmatched if it is there
-                if pair_row.key_full in keys_unmatched:
-                    keys_unmatched.remove(pair_row.key_full)
-
-                pair_row.margin = margin
-                pair_row.pair = self_row
-                self.summary_errors += ReferrerInvoiceRow.write_row(
-                    worksheet, self, pair_row, row, fmt_error, 'right', write_errors=False)
-
-            self.summary_errors += ReferrerInvoiceRow.write_row(worksheet, self, self_row, row, fmt_error)
-            row += 1
-
-        # Write unmatched records
-        for key in keys_unmatched:
-            self.summary_errors += ReferrerInvoiceRow.write_row(
-                worksheet, self, self.pair.datarows[key], row, fmt_error, 'right', write_errors=False)
-            row += 1
-
-        if len(self.summary_errors) > 0:
-            workbook.close()
-        else:
-            del workbook
-        return self.summary_errors
-
-    def find_pair_row(self, row):
-        # Match by full_key
-        pair_row = self.pair.datarows.get(row.key_full, None)
-        if pair_row is not None:
-            return pair_row
-
-        # We want to match by similarity before matching by the key
-        # Match by similarity
-        for _, item in self.pair.datarows.items():
-            if row.equals(item):
-                return item
-
-        # Match by key
-        for _, item in self.pair.datarows.items():
-            if row.key == item.key:
-                return item
-
-        # Return None if nothing found
-        return None
+        write_pairs(worksheet, self, self.pairs, row, fmt_error, ReferrerInvoiceRow.write_row)
+        workbook.close()
 
     def __add_datarow(self, row):
         if row.key_full in self.datarows.keys():  # If the row already exists
@@ -344,6 +231,10 @@ class ReferrerTaxInvoice(TaxInvoice):
 
 class ReferrerInvoiceRow(InvoiceRow):
 
+    __slots__ = ('commission_type', 'client', 'referrer', 'amount_paid', 'gst_paid', 'total', 'row_number', '_pair',
+                 '_margin', '_key', '_key_full', '_sanitized_commission_type', '_sanitized_client',
+                 '_sanitized_referrer', '_number_amount_paid', '_number_gst_paid', '_number_total')
+
     def __init__(self, commission_type, client, referrer, amount_paid, gst_paid, total, row_number):
         InvoiceRow.__init__(self)
         self._pair = None
@@ -358,6 +249,14 @@ class ReferrerInvoiceRow(InvoiceRow):
 
         self.row_number = row_number
 
+        # Values compared by equals() and the equal_* properties, normalized once
+        self._sanitized_commission_type = u.sanitize(self.commission_type)
+        self._sanitized_client = u.sanitize(self.client)
+        self._sanitized_referrer = u.sanitize(self.referrer)
+        self._number_amount_paid = u.number_value(self.amount_paid)
+        self._number_gst_paid = u.number_value(self.gst_paid)
+        self._number_total = u.number_value(self.total)
+
         self._key = self._generate_key()
         self._key_full = self.__generate_key_full()
 
@@ -398,71 +297,72 @@ class ReferrerInvoiceRow(InvoiceRow):
     def equal_commission_type(self):
         if self.pair is None:
             return False
-        return u.sanitize(self.commission_type) == u.sanitize(self.pair.commission_type)
+        return self._sanitized_commission_type == self.pair._sanitized_commission_type
 
     @property
     def equal_client(self):
         if self.pair is None:
             return False
-        return u.sanitize(self.client) == u.sanitize(self.pair.client)
+        return self._sanitized_client == self.pair._sanitized_client
 
     @property
     def equal_referrer(self):
         if self.pair is None:
             return False
-        return u.sanitize(self.referrer) == u.sanitize(self.pair.referrer)
+        return self._sanitized_referrer == self.pair._sanitized_referrer
 
     @property
     def equal_amount_paid(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.amount_paid, self.pair.amount_paid, self.margin)
+        return u.compare_number_values(self._number_amount_paid, self.pair._number_amount_paid, self.margin)
 
     @property
     def equal_gst_paid(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.gst_paid, self.pair.gst_paid, self.margin)
+        return u.compare_number_values(self._number_gst_paid, self.pair._number_gst_paid, self.margin)
 
     @property
     def equal_total(self):
         if self.pair is None:
             return False
-        return self.compare_numbers(self.total, self.pair.total, self.margin)
+        return u.compare_number_values(self._number_total, self.pair._number_total, self.margin)
     # endregion Properties
 
     def _generate_key(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(u.sanitize(self.commission_type).encode(ENCODING))
-        sha.update(u.sanitize(self.client).encode(ENCODING))
-        sha.update(u.sanitize(self.referrer).encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key(self._sanitized_commission_type, self._sanitized_client, self._sanitized_referrer, salt)
 
     def __generate_key_full(self, salt=''):
-        sha = hashlib.sha256()
-        sha.update(self.commission_type.encode(ENCODING))
-        sha.update(self.client.encode(ENCODING))
-        sha.update(self.referrer.encode(ENCODING))
-        sha.update(self.amount_paid.encode(ENCODING))
-        sha.update(self.gst_paid.encode(ENCODING))
-        sha.update(self.total.encode(ENCODING))
-        sha.update(str(salt).encode(ENCODING))
-        return sha.hexdigest()
+        return row_key_full(
+            self.commission_type,
+            self.client,
+            self.referrer,
+            self.amount_paid,
+            self.gst_paid,
+            self.total,
+            salt,
+        )
 
     def equals(self, obj):
         if type(obj) != ReferrerInvoiceRow:
             return False
 
         return (
-            u.sanitize(self.commission_type) == u.sanitize(obj.commission_type)
-            and u.sanitize(self.client) == u.sanitize(obj.client)
-            and u.sanitize(self.referrer) == u.sanitize(obj.referrer)
-            and self.compare_numbers(self.amount_paid, obj.amount_paid, self.margin)
-            and self.compare_numbers(self.gst_paid, obj.gst_paid, self.margin)
-            and self.compare_numbers(self.total, obj.total, self.margin)
+            self._sanitized_commission_type == obj._sanitized_commission_type
+            and self._sanitized_client == obj._sanitized_client
+            and self._sanitized_referrer == obj._sanitized_referrer
+            and u.compare_number_values(self._number_amount_paid, obj._number_amount_paid, self.margin)
+            and u.compare_number_values(self._number_gst_paid, obj._number_gst_paid, self.margin)
+            and u.compare_number_values(self._number_total, obj._number_total, self.margin)
         )
 
+    def match_identity(self):
+        return (self._sanitized_commission_type, self._sanitized_client, self._sanitized_referrer)
+
+    def match_amount(self):
+        return self.total
+
     @staticmethod
     def write_row(worksheet, invoice, element, row, fmt_error, side='left', write_errors=True):
         col = 0
@@ -507,19 +407,110 @@ class ReferrerInvoiceRow(InvoiceRow):
         return errors
 
 
-def read_files_referrer(dir_: str, files: list) -> dict:
-    keys = {}
-    counter = 1
-    for file in files:
-        print(f'Parsing {counter} of {len(files)} files from {bcolors.BLUE}{dir_}{bcolors.ENDC}', end='\r')
-        if os.path.isdir(dir_ + file):
-            continue
-        try:
-            ti = ReferrerTaxInvoice(dir_, file)
-            keys[ti.key] = ti
-        except IndexError:
-            # handle exception when there is a column missing in the file.
-            pass
-        counter += 1
-    print()
-    return keys
+class ReferrerHeader:
+    """
+        From, To, their ABNs and the payment details of a referrer RCTI. The first paragraph of the
+        document holds From and To, the second one the BSB, account and total. Each paragraph is
+        normalised and split on ':' once and every field is taken from the same parts.
+    """
+
+    def __init__(self, document):
+        parts_info = self.split_paragraph(document.paragraphs[0])
+        self._from = parts_info[1][:-4].strip()
+        self.from_abn = parts_info[2][:-3].strip()
+        self.to = parts_info[3][:-4].strip()
+        self.to_abn = parts_info[4][:-5].strip()
+
+        parts_account = self.split_paragraph(document.paragraphs[1])
+        self.bsb = parts_account[1].split(' - ')[0].strip()
+        self.account = parts_account[2].split('/')[0].strip()
+        self.final_total = parts_account[3].strip()
+
+    @staticmethod
+    def split_paragraph(text):
+        return ' '.join(text.split()).split(':')
+
+
+class ReferrerDocument(HTMLParser):
+    """
+        Paragraphs and table rows of a referrer RCTI, pulled out in a single pass over the HTML
+        without building a tree.
+
+        paragraphs holds the text of the paragraphs of the body in document order, header the text of
+        the th cells of the first table row and rows the text of the td cells of every other row.
+        A document without a body, two paragraphs or a table row, or whose paragraphs, rows and cells
+        are not closed or nested properly is flagged as malformed and is left to SoupDocument.
+    """
+    TAGS = ('p', 'tr', 'th', 'td')
+
+    def __init__(self, text):
+        HTMLParser.__init__(self)
+        self.paragraphs = []
+        self.header = None
+        self.rows = []
+        self.malformed = False
+        self._body = False
+        self._open = []  # (tag, text parts) of the elements of TAGS not closed yet, innermost last
+        self._cells = {}  # th and td texts of the row being read
+        self.feed(text)
+        self.close()
+        if self._open or not self._body or len(self.paragraphs) < 2 or self.header is None:
+            self.malformed = True
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'body':
+            self._body = True
+        if tag not in self.TAGS or self.malformed:
+            return
+        open_tags = [open_tag for open_tag, _ in self._open]
+        if tag in open_tags:
+            self.malformed = True  # p inside p, nested tables or cells, unclosed elements
+        elif tag == 'p' and not self._body:
+            self.malformed = True
+        elif tag in ('th', 'td') and ('tr' not in open_tags or 'th' in open_tags or 'td' in open_tags):
+            self.malformed = True
+        elif tag == 'tr':
+            self._cells = {'th': [], 'td': []}
+        self._open.append((tag, None if tag == 'tr' else []))
+
+    def handle_endtag(self, tag):
+        if tag not in self.TAGS or self.malformed:
+            return
+        if not self._open or self._open[-1][0] != tag:
+            self.malformed = True
+            return
+        _, parts = self._open.pop()
+        if tag == 'p':
+            self.paragraphs.append(''.join(parts))
+        elif tag == 'tr':
+            if self.header is None:
+                self.header = self._cells['th']
+            else:
+                self.rows.append(self._cells['td'])
+        else:
+            self._cells[tag].append(''.join(parts))
+
+    def handle_data(self, data):
+        for _, parts in self._open:
+            if parts is not None:
+                parts.append(data)
+
+
+class SoupDocument:
+    """
+        The same paragraphs and table rows as ReferrerDocument read with BeautifulSoup, which copes
+        with malformed HTML at the cost of building the whole tree.
+    """
+
+    def __init__(self, text):
+        soup = BeautifulSoup(text, 'html.parser')
+        paragraph = soup.find('body').find('p')
+        self.paragraphs = [paragraph.text, paragraph.find_next('p').text]
+        header = soup.find('tr')  # Find header
+        header = header.extract()  # Remove header
+        self.header = [th.text for th in header.find_all('th')]
+        self.rows = [[td.text for td in tr.find_all('td')] for tr in soup.find_all('tr')]
+
+
+def read_files_referrer(dir_: str, files: list, workers=1) -> dict:
+    return read_invoices(ReferrerTaxInvoice, [(dir_, files)], workers)[0]
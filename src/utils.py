@@ -1,3 +1,9 @@
+import os
+from decimal import Decimal
+from functools import lru_cache
+
+import numpy
+
 BANK_LOOKUP = {
     'AAA': 'AAA Commercial',
     'ADC': 'Adelaide Bank Commercial',
@@ -192,6 +198,24 @@ def bank_fullname(code: str):
     return BANK_LOOKUP.get(code, code)
 
 
+NAN = float('nan')
+# Tolerance added to the margin of every number comparison
+MARGIN_EPSILON = 0.000001
+# Types whose float() is the same as parsing their str(), compared without going through the string
+NUMBER_TYPES = (float, int, Decimal, numpy.integer)
+# Distinct strings kept by money_value()
+MONEY_CACHE_SIZE = 2 ** 16
+# Money is compared as whole cents (ints) instead of floats within MARGIN_EPSILON when set to 1.
+# The switch lives in the environment so worker processes see it too, see set_money_cents()
+MONEY_CENTS_ENV = 'RCTI_MONEY_CENTS'
+MONEY_CENTS = os.environ.get(MONEY_CENTS_ENV, '0') == '1'
+
+# Distinct strings kept by sanitize(), the same client, broker and bank names are sanitized over and over
+SANITIZE_CACHE_SIZE = 2 ** 16
+
+
+# typed so 1 and 1.0, which hash the same, do not share an entry ('1' and '10')
+@lru_cache(maxsize=SANITIZE_CACHE_SIZE, typed=True)
 def sanitize(s: str):
     s_sanitized = str(s).strip().split(' ')
     s_sanitized = ''.join(s_sanitized).split('_')
@@ -213,18 +237,113 @@ def money_to_float(value: str):
 
 
 def compare_numbers(n1, n2, margin):
-    n1val = str(n1)
-    n2val = str(n2)
+    if n1.__class__ is float and n2.__class__ is float and not MONEY_CENTS:
+        return abs(n1 - n2) <= margin + MARGIN_EPSILON
+    return compare_number_values(number_value(n1), number_value(n2), margin)
 
+
+def number_value(n):
+    """
+        n parsed the way compare_numbers() parses it: a float, '' when n is empty or None when
+        n is not a number. In money cents mode the float is rounded to whole cents, an int.
+        Rows parse their numeric fields once with it, see compare_number_values().
+    """
+    if n.__class__ is not float:
+        if n.__class__ is str:
+            n = money_value(n)
+        elif isinstance(n, NUMBER_TYPES) and not isinstance(n, bool):
+            # Same float as parsing str(n), without going through the string
+            try:
+                n = float(n)
+            except (ValueError, OverflowError):
+                n = money_value(str(n))
+        else:
+            n = money_value(str(n))
+        if n.__class__ is not float:
+            return n
+
+    if n != n:
+        return NAN  # Empty cells are read as nan
+    return to_cents(n) if MONEY_CENTS else n
+
+
+# The same amounts come up over and over, a string is only parsed (and fails to parse) once
+@lru_cache(maxsize=MONEY_CACHE_SIZE)
+def money_value(value: str):
+    """
+        Float of a money string, '' when it is empty or None when it is not a number.
+    """
+    if value == '':
+        return ''
     try:
-        n1val = money_to_float(n1val)
-        n2val = money_to_float(n2val)
+        return money_to_float(value)
     except ValueError:
-        if n1val == '' or n2val == '':
-            return n1val == n2val
-        return False
+        return None
+
+
+def to_cents(n: float):
+    """
+        Amount rounded to whole cents, half to even like numpy.rint so both comparisons agree.
+        Infinities are returned as they are, they are never equal to anything.
+    """
+    try:
+        return round(n * 100)
+    except OverflowError:
+        return n
+
+
+def set_money_cents(enabled: bool):
+    global MONEY_CENTS
+    os.environ[MONEY_CENTS_ENV] = '1' if enabled else '0'
+    MONEY_CENTS = enabled
+
+
+def compare_number_values(v1, v2, margin):
+    """
+        compare_numbers() for two values already parsed by number_value().
+    """
+    if v1.__class__ is float and v2.__class__ is float:
+        return abs(v1 - v2) <= margin + MARGIN_EPSILON
+    if v1.__class__ is int and v2.__class__ is int:
+        # Whole cents, no epsilon needed
+        return abs(v1 - v2) <= to_cents(margin)
+    # Values that are not numbers are only equal when both are empty
+    return v1 == '' and v2 == ''
+
+
+def compare_numbers_batch(values_a, values_b, margin):
+    """
+        compare_numbers() of every pair of items of two arrays of the same shape at once, as a
+        numpy bool array. Float arrays are compared directly, any other array is parsed item by item.
+    """
+    numbers_a, empty_a = number_array(values_a)
+    numbers_b, empty_b = number_array(values_b)
+    with numpy.errstate(invalid='ignore'):
+        if MONEY_CENTS:
+            finite = numpy.isfinite(numbers_a) & numpy.isfinite(numbers_b)
+            cents_a = numpy.rint(numpy.where(finite, numbers_a, 0) * 100).astype(numpy.int64)
+            cents_b = numpy.rint(numpy.where(finite, numbers_b, 0) * 100).astype(numpy.int64)
+            equal = finite & (numpy.abs(cents_a - cents_b) <= to_cents(margin))
+        else:
+            equal = numpy.abs(numbers_a - numbers_b) <= margin + MARGIN_EPSILON
+    return equal | (empty_a & empty_b)
+
+
+def number_array(values):
+    """
+        Float array of values parsed by number_value(), nan where a value is not a number, and the
+        mask of the empty values.
+    """
+    values = numpy.asarray(values)
+    if values.dtype == float:
+        return values, numpy.zeros(values.shape, dtype=bool)
 
-    return abs(n1val - n2val) <= margin + 0.000001
+    parsed = [number_value(value) for value in values.ravel()]
+    if MONEY_CENTS:
+        parsed = [value / 100 if value.__class__ is int else value for value in parsed]
+    numbers = numpy.array([value if value.__class__ is float else NAN for value in parsed], dtype=float)
+    empty = numpy.array([value == '' for value in parsed], dtype=bool)
+    return numbers.reshape(values.shape), empty.reshape(values.shape)
 
 
 class safelist(list):
@@ -0,0 +1,105 @@
+import pytest
+
+from benchmarks import generators as g
+from src.model.aba import ABARecord, ControlTotals, iter_records, read_file_aba, stream_comparison
+from src.model.parse_cache import CACHE_ENV
+
+DETAILS = [('063-000', '10000001', 1500, 'Payee 1', 'RCTI00000001'),
+           ('063-000', '10000002', 2500, 'Payee 2', 'RCTI00000002')]
+
+
+def record(line):
+    return ABARecord(line.encode() + b'\n')
+
+
+def totals_of(lines):
+    totals = ControlTotals()
+    for line in lines:
+        totals.add(record(line))
+    return totals
+
+
+def details(rows=DETAILS):
+    return [g.aba_detail_record(*row) for row in rows]
+
+
+def debit(line):
+    return line[:18] + '13' + line[20:]
+
+
+def test_totals_of_a_balanced_file():
+    lines = details()
+    totals = totals_of([g.aba_descriptive_record()] + lines + [g.aba_total_record(lines)])
+    assert (totals.credit, totals.debit, totals.net, totals.count) == (4000, 0, 4000, 2)
+    assert totals.errors('a.aba', 'b.aba') == []
+
+
+def test_debits_are_taken_from_the_net_total():
+    lines = details()
+    lines[1] = debit(lines[1])
+    trailer = '7999-999' + ' ' * 12 + f'{1000:010d}{1500:010d}{2500:010d}' + ' ' * 24 + '000002' + ' ' * 40
+    totals = totals_of(lines + [trailer])
+    assert (totals.credit, totals.debit, totals.net) == (1500, 2500, 1000)
+    assert totals.errors('a.aba', 'b.aba') == []
+
+
+def test_totals_that_do_not_match_the_details():
+    lines = details()
+    trailer = g.aba_total_record(lines)
+    trailer = trailer[:30] + f'{4001:010d}' + trailer[40:74] + '000003' + trailer[80:]
+    errors = totals_of(lines + [trailer]).errors('a.aba', 'b.aba', side='b')
+    assert [error['msg'] for error in errors] == ['File credit total does not match the 4000 of the detail records',
+                                                 'File count total does not match the 2 of the detail records']
+    assert [(error['value_a'], error['value_b']) for error in errors] == [('', '0000004001'), ('', '000003')]
+
+
+def test_unreadable_amounts_and_missing_trailer():
+    lines = details()
+    lines[0] = lines[0][:20] + '00000015X0' + lines[0][30:]
+    errors = totals_of(lines + [g.aba_total_record(details())]).errors('a.aba', 'b.aba')
+    assert errors[0]['msg'] == 'Amount of detail records is not a number'
+    assert errors[0]['value_a'] == 1
+
+    errors = totals_of(lines).errors('a.aba', 'b.aba')
+    assert [error['msg'] for error in errors] == ['No file total record found']
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n', '\r'])
+@pytest.mark.parametrize('last', ['', '\n'])
+def test_records_are_split_into_lines_as_text_mode_does(tmp_path, newline, last):
+    lines = [g.aba_descriptive_record()] + details() + ['']
+    path = tmp_path / 'file.aba'
+    path.write_bytes((newline.join(lines) + last).encode())
+    with open(path, encoding='ascii') as file:
+        expected = [line.encode() for line in file]
+    assert [record.line for _, record in iter_records(path)] == expected
+    assert [index for index, _ in iter_records(path)] == list(range(len(expected)))
+
+
+def test_mixed_line_ends(tmp_path):
+    path = tmp_path / 'file.aba'
+    path.write_bytes(b'a\r\nb\rc\n\r\rd')
+    assert [record.line for _, record in iter_records(path)] == [b'a\n', b'b\n', b'c\n', b'\n', b'\n', b'd']
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_stream_comparison_finds_the_errors_of_the_compare(tmp_path, monkeypatch, seed):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(CACHE_ENV, '0')
+    file_loankit, file_infynity = str(tmp_path / 'loankit.aba'), str(tmp_path / 'infynity.aba')
+    mismatches = g.write_aba(file_loankit, file_infynity, 300, 0.1, seed)
+    with open(file_infynity) as file:
+        lines = file.read().split('\n')
+    lines[-2] = lines[-2][:30] + f'{int(lines[-2][30:40]) + 1:010d}' + lines[-2][40:]  # Credit total one cent off
+    with open(file_infynity, 'w') as file:
+        file.write('\n'.join(lines))
+
+    infynity, loankit = read_file_aba(file_infynity), read_file_aba(file_loankit)
+    infynity.pair, loankit.pair = loankit, infynity
+    infynity.compare(0.01)
+
+    errors = list(stream_comparison(file_infynity, file_loankit))
+    assert mismatches.amount + mismatches.missing > 0
+    assert errors == infynity.summary_errors
+    assert errors[-1]['msg'].startswith('File credit total does not match')
+    assert not errors[-2]['msg'].startswith('File ')
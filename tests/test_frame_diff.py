@@ -0,0 +1,98 @@
+import random
+from functools import partial
+
+import pandas
+import pytest
+
+from benchmarks import generators as g
+from src.model.frame_diff import diff_frames
+from src.model.taxinvoice import NULL_WORKSHEET, write_pairs
+from src.model.taxinvoice_branch import (BranchTaxInvoice, VBIDataRow, TrailDataRow, VECTOR_ENGINE_ENV, HEADER_VBI,
+                                         HEADER_TRAIL, NUMERIC_VBI, NUMERIC_TRAIL, TAB_UPFRONT_DATA, TAB_TRAIL_DATA,
+                                         TAB_VBI_DATA)
+
+MARGIN = 0.01
+TABS = [
+    (TAB_UPFRONT_DATA, 'upfront_frame', HEADER_VBI, NUMERIC_VBI, partial(VBIDataRow.write_row, tabname=TAB_UPFRONT_DATA)),
+    (TAB_TRAIL_DATA, 'trail_frame', HEADER_TRAIL, NUMERIC_TRAIL, TrailDataRow.write_row),
+    (TAB_VBI_DATA, 'vbi_frame', HEADER_VBI, NUMERIC_VBI, partial(VBIDataRow.write_row, tabname=TAB_VBI_DATA)),
+]
+
+
+def frame(rows, header, numeric):
+    # The frame parse_tab_vbi_data and parse_tab_trail_data keep of a data tab
+    frame = pandas.DataFrame(rows, columns=header)
+    frame[numeric] = frame[numeric].astype(float)
+    return frame
+
+
+def frames(seed):
+    """
+        Loankit and Infynity rows of a data tab with amounts changed within and over the margin, a
+        settlement date changed, rows only on one side and rows sharing their identity or key.
+    """
+    rnd = random.Random(seed)
+    rows = [g.branch_data_row(rnd, index) for index in range(40)]
+    rows[10] = rows[9][:4] + rows[10][4:]  # Same identity as the row before
+    rows[11] = list(rows[9])  # Same row twice
+    rows[15] = rows[14][:5] + ['03/07/2020'] + rows[15][6:]  # Same key as the row before, another date
+    rows_pair = [list(row) for row in rows]
+    rows_pair[1][6] += 0.005
+    rows_pair[2][6] += 1
+    rows_pair[3][5] = '02/07/2020'
+    rows_pair[9][11] += 1
+    rows_pair[10], rows_pair[9] = rows_pair[9], rows_pair[10]
+    del rows_pair[20]
+    rows_pair.append(g.branch_extra_row(rows[30]))
+    rows_pair[25][12] = rows_pair[25][12] - MARGIN
+    return rows, rows_pair
+
+
+def shell(monkeypatch, filename, rows):
+    monkeypatch.setattr(BranchTaxInvoice, 'parse_cached', lambda self: None)
+    invoice = BranchTaxInvoice('/tmp/', filename)
+    for _, attr, header, numeric, _ in TABS:
+        setattr(invoice, attr, frame(rows, header, numeric))
+    return invoice
+
+
+def data_tab_errors(monkeypatch, vectorised, seed):
+    monkeypatch.setenv(VECTOR_ENGINE_ENV, '1' if vectorised else '0')
+    rows, rows_pair = frames(seed)
+    invoice = shell(monkeypatch, 'loankit.xlsx', rows)
+    invoice.pair = shell(monkeypatch, 'infynity.xlsx', rows_pair)
+    invoice.pair.pair = invoice
+    invoice.margin = MARGIN
+
+    errors = []
+    rows_written = []
+    for tab, _, _, _, write_row in TABS:
+        pairs = invoice.compare_data_tab(tab, MARGIN)
+        errors += write_pairs(NULL_WORKSHEET, invoice, pairs, 0, None, write_row)
+        rows_written.append(len(invoice.data_tab_pairs(tab, pairs)))
+    return errors, rows_written
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_vector_engine_finds_the_errors_of_the_row_engine(monkeypatch, seed):
+    errors, rows_written = data_tab_errors(monkeypatch, False, seed)
+    errors_vector, rows_written_vector = data_tab_errors(monkeypatch, True, seed)
+    assert len(errors) > 0
+    assert errors_vector == errors
+    # The DETAILED file still shows every row
+    assert rows_written_vector == rows_written
+
+
+def test_diff_frames_leaves_shared_identities_and_keys_to_the_row_engine():
+    rows, rows_pair = frames(1)
+    frame_a, frame_b = frame(rows, HEADER_VBI, NUMERIC_VBI), frame(rows_pair, HEADER_VBI, NUMERIC_VBI)
+    (equal_a, equal_b), left_a, left_b = diff_frames(
+        frame_a, frame_b, VBIDataRow.frame_identity(frame_a), VBIDataRow.frame_identity(frame_b),
+        VBIDataRow.frame_key(frame_a), VBIDataRow.frame_key(frame_b), NUMERIC_VBI, MARGIN)
+
+    assert list(equal_a) == sorted(equal_a)
+    assert sorted(list(equal_a) + list(left_a)) == list(frame_a.index)
+    assert sorted(list(equal_b) + list(left_b)) == list(frame_b.index)
+    assert {0, 1, 25}.issubset(equal_a)  # Equal or within the margin
+    assert {2, 3, 20}.issubset(left_a)  # Over the margin, other date, only in frame_a
+    assert {9, 10, 11, 14, 15}.issubset(left_a)  # Identity or key shared with another row
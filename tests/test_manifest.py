@@ -0,0 +1,123 @@
+import datetime
+import os
+
+import pytest
+
+import cli
+from src.model.taxinvoice import TaxInvoice, SummaryWriter, new_error
+
+MARGIN = 0.01
+DATE_A = datetime.datetime(2020, 7, 1)
+DATE_B = datetime.datetime(2020, 7, 2)
+
+
+class StubInvoice(TaxInvoice):
+    """
+        Invoice whose comparison returns the errors given for its file, recording that it ran.
+    """
+
+    def __init__(self, directory, filename, errors, compared):
+        TaxInvoice.__init__(self, directory, filename)
+        self.pair = None
+        self.errors = errors
+        self.compared = compared
+
+    def process_comparison(self, margin=0.000001, always_write_detail=False):
+        if self.pair is None:
+            return None
+        self.compared.append(self.filename)
+        return list(self.errors.get(self.filename, []))
+
+
+class RecordingSummary(SummaryWriter):
+    written = []
+
+    def close(self):
+        RecordingSummary.written = list(self.errors())
+        SummaryWriter.close(self)
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cli, 'SummaryWriter', RecordingSummary)
+    dir_a, dir_b = str(tmp_path / 'loankit') + '/', str(tmp_path / 'infynity') + '/'
+    os.mkdir(dir_a)
+    os.mkdir(dir_b)
+    for name in ['a.html', 'b.html', 'c.html']:
+        write(dir_a + name, f'loankit {name}')
+        write(dir_b + name, f'infynity {name}')
+    write(dir_b + 'alone.html', 'infynity only')
+    return dir_a, dir_b
+
+
+def write(path, text):
+    with open(path, 'w') as file:
+        file.write(text)
+
+
+ERRORS = {
+    'b.html': [new_error('b.html', 'b.html', 'Settlement Date does not match', 2, 2, DATE_A, DATE_B, 'Tab')],
+    'c.html': [new_error('c.html', 'c.html', 'Amount does not match', 3, 3, 10.5, 11, 'Tab')],
+}
+
+
+def compare(dir_a, dir_b, incremental, margin=MARGIN):
+    """
+        The comparison rcti_compare_referrer runs, with stub invoices. Returns the errors written to
+        the summary and the files that were compared.
+    """
+    files_a, files_b = cli.list_files(dir_a), cli.list_files(dir_b)
+    manifest = None
+    if incremental:
+        manifest = cli.new_manifest('stub_summary', margin)
+        files_a, files_b = manifest.reuse(dir_a, files_a, dir_b, files_b)
+    compared = []
+    invoices_a = {invoice.key: invoice for invoice in (StubInvoice(dir_a, f, ERRORS, compared) for f in files_a)}
+    invoices_b = {invoice.key: invoice for invoice in (StubInvoice(dir_b, f, ERRORS, compared) for f in files_b)}
+    cli.run_comparison(invoices_a, invoices_b, margin, 'stub_summary', 'Stub Summary', dir_a, dir_b,
+                       manifest=manifest)
+    return RecordingSummary.written, compared
+
+
+def test_reused_pairs_write_the_summary_of_a_full_run(dirs):
+    full, _ = compare(*dirs, incremental=False)
+    first, _ = compare(*dirs, incremental=True)
+    second, compared = compare(*dirs, incremental=True)
+
+    assert compared == []
+    assert first == full
+    assert second == full
+    date_error = next(error for error in second if error['file_a'] == 'b.html')
+    assert type(date_error['value_a']) is datetime.datetime
+    assert date_error['value_a'] == DATE_A
+
+
+def test_only_changed_pairs_are_compared_again(dirs):
+    dir_a, dir_b = dirs
+    full, _ = compare(dir_a, dir_b, incremental=False)
+    compare(dir_a, dir_b, incremental=True)
+
+    write(dir_b + 'c.html', 'infynity c.html changed')
+    os.utime(dir_a + 'a.html', ns=(0, 0))  # Touched without changing its content
+    summary, compared = compare(dir_a, dir_b, incremental=True)
+    assert compared == ['c.html']
+    assert summary == full
+
+    _, compared = compare(dir_a, dir_b, incremental=True)
+    assert compared == []
+
+
+def test_other_settings_compare_every_pair(dirs):
+    compare(*dirs, incremental=True)
+    _, compared = compare(*dirs, incremental=True, margin=MARGIN * 2)
+    assert sorted(compared) == ['a.html', 'b.html', 'c.html']
+
+
+def test_files_that_are_not_paired_anymore_are_parsed(dirs):
+    dir_a, dir_b = dirs
+    compare(dir_a, dir_b, incremental=True)
+    os.remove(dir_b + 'b.html')
+    summary, compared = compare(dir_a, dir_b, incremental=True)
+    assert compared == []
+    assert any(error['file_a'] == 'b.html' and error['file_b'] == '' for error in summary)
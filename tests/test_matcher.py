@@ -0,0 +1,97 @@
+import random
+
+from src.model.matcher import RowMatcher, amount_bucket
+from src.model.metrics import METRICS
+from src.model.taxinvoice_referrer import ReferrerInvoiceRow
+
+MARGIN = 0.01
+
+
+def row(client, total, amount_paid='1.00', number=0):
+    return ReferrerInvoiceRow('Upfront', client, 'Referrer', amount_paid, '0.00', total, number)
+
+
+def section(*rows):
+    return {item.key_full: item for item in rows}
+
+
+def find(rows, item, margin=MARGIN):
+    item.margin = margin
+    return RowMatcher(rows, margin).find(item)
+
+
+def scan(rows, item):
+    """
+        The lookup find_pair_row used to run over the whole section.
+    """
+    if item.key_full in rows:
+        return rows[item.key_full]
+    for other in rows.values():
+        if item.equals(other):
+            return other
+    for other in rows.values():
+        if item.key == other.key:
+            return other
+    return None
+
+
+def test_full_key_comes_before_similar_rows():
+    rows = section(row('Smith', '10.01'), row('Smith', '10.00'))
+    assert find(rows, row('Smith', '10.00')) is list(rows.values())[1]
+
+
+def test_similar_row_first_in_file_order_across_buckets():
+    # 10.01 falls in the bucket after the one of 10.00 and comes first in the file
+    rows = section(row('Smith', '10.01', '2.00'), row('Smith', '10.00', '2.00'))
+    assert amount_bucket('10.01', 2 * (MARGIN + 0.000001)) != amount_bucket('10.00', 2 * (MARGIN + 0.000001))
+    assert find(rows, row('Smith', '10.00', '1.99')) is list(rows.values())[0]
+
+
+def test_amounts_at_the_margin_edge_are_paired():
+    for total in ['0.01', '-0.01', '9.99', '10.01']:
+        rows = section(row('Smith', total, '2.00'))
+        base = '0.00' if abs(float(total)) < 1 else '10.00'
+        METRICS.reset()
+        assert find(rows, row('Smith', base, '1.99')) is not None
+        assert METRICS.counters == {'match_similarity': 1}
+
+
+def test_amounts_over_the_margin_fall_back_to_the_key():
+    rows = section(row('Jones', '10.00'), row('Smith', '10.02', '2.00'))
+    METRICS.reset()
+    assert find(rows, row('Smith', '10.00', '1.99')) is list(rows.values())[1]
+    assert METRICS.counters == {'match_key': 1}
+
+
+def test_amounts_that_are_not_numbers_get_their_own_bucket():
+    width = 2 * (MARGIN + 0.000001)
+    assert amount_bucket('', width) == ''
+    assert amount_bucket('n/a', width) == 'n/a'
+    rows = section(row('Smith', '10.00', '2.00'), row('Smith', '', '2.00'), row('Smith', 'n/a', '2.00'))
+    METRICS.reset()
+    assert find(rows, row('Smith', '', '1.99')) is list(rows.values())[1]
+    assert METRICS.counters == {'match_similarity': 1}
+    # Text is never equal to anything, not even to itself
+    assert find(rows, row('Smith', 'n/a', '1.99')) is list(rows.values())[0]
+
+
+def test_same_pairs_as_a_linear_scan():
+    rnd = random.Random(2020)
+    totals = [f'{cents / 1000:.3f}' for cents in range(9960, 10060, 5)] + ['', 'n/a']
+
+    def random_row(number):
+        return row(rnd.choice(['Smith', 'Jones', 'Brown']), rnd.choice(totals), rnd.choice(['1.00', '1.005']), number)
+
+    for _ in range(20):
+        rows = section(*(random_row(number) for number in range(60)))
+        reference = dict(rows)
+        matcher = RowMatcher(rows, MARGIN)
+        for number in range(60):
+            item = random_row(number)
+            item.margin = MARGIN
+            expected = scan(reference, item)
+            assert matcher.find(item) is expected
+            if expected is not None:
+                # match_rows removes the paired rows from the section
+                del rows[expected.key_full]
+                del reference[expected.key_full]
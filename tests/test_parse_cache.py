@@ -0,0 +1,103 @@
+import os
+import random
+
+import pytest
+
+from benchmarks import generators as g
+from src.model.parse_cache import ParseCache, CACHE_ENV, ENTRY_SUFFIX
+from src.model.taxinvoice_referrer import ReferrerTaxInvoice
+
+
+class Parsed:
+    pass
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParseCache(str(tmp_path / 'cache'))
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'file.html')
+    write(path, 'abc', 1000)
+    return path
+
+
+def write(path, text, mtime):
+    with open(path, 'w') as file:
+        file.write(text)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_store_and_load(cache, path):
+    key = cache.key(path, Parsed)
+    assert cache.load(key) is None
+    cache.store(key, {'rows': [1, 2]})
+    assert cache.load(key) == {'rows': [1, 2]}
+
+
+def test_key_changes_with_size_mtime_and_content(cache, path):
+    key = cache.key(path, Parsed)
+    assert cache.key(path, Parsed) == key
+
+    write(path, 'abd', 1000)  # Same size and mtime, other content
+    key_content = cache.key(path, Parsed)
+    write(path, 'abd', 2000)
+    key_mtime = cache.key(path, Parsed)
+    write(path, 'abde', 2000)
+    key_size = cache.key(path, Parsed)
+    assert len({key, key_content, key_mtime, key_size}) == 4
+
+
+def test_key_changes_with_class_and_variant(cache, path):
+    keys = {cache.key(path, Parsed), cache.key(path, Parsed, 'cents'), cache.key(path, ParseCache)}
+    assert len(keys) == 3
+
+
+def test_corrupt_entry_is_a_miss(cache, path):
+    key = cache.key(path, Parsed)
+    os.makedirs(cache.directory)
+    with open(os.path.join(cache.directory, key + ENTRY_SUFFIX), 'wb') as file:
+        file.write(b'not a pickle')
+    assert cache.load(key) is None
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    cache.max_bytes = 3500  # Room for three entries
+    for name in ['a', 'b', 'c']:
+        cache.store(name, b'x' * 1000)
+        entry = os.path.join(cache.directory, name + ENTRY_SUFFIX)
+        os.utime(entry, (ord(name), ord(name)))
+    cache.load('a')  # Now the most recently used
+    cache.store('d', b'x' * 1000)
+    assert [cache.load(name) is not None for name in 'abcd'] == [True, False, True, True]
+
+
+def test_invoice_is_loaded_from_the_cache_until_its_file_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(CACHE_ENV, '1')
+    directory = str(tmp_path) + '/'
+    filename = g.referrer_filename(3000, '2020-07', g.LOANKIT_PROCESS_ID)
+    rows = [g.referrer_row(random.Random(2020), row) for row in range(5)]
+    write(directory + filename, g.referrer_html(3000, rows), 1000)
+
+    parsed = ReferrerTaxInvoice(directory, filename)
+    calls = []
+    parse = ReferrerTaxInvoice.parse
+    monkeypatch.setattr(ReferrerTaxInvoice, 'parse', lambda self: calls.append(1) or parse(self))
+    reads = []
+    get_file_text = ReferrerTaxInvoice.get_file_text
+    monkeypatch.setattr(ReferrerTaxInvoice, 'get_file_text', lambda self: reads.append(1) or get_file_text(self))
+
+    cached = ReferrerTaxInvoice(directory, filename)
+    assert calls == []
+    assert reads == []  # A cache hit does not read the file
+    assert 'filetext' not in vars(cached)
+    assert list(cached.datarows) == list(parsed.datarows)
+    assert cached.file_fingerprint == parsed.file_fingerprint
+
+    write(directory + filename, g.referrer_html(3000, rows[:4]), 1000)
+    changed = ReferrerTaxInvoice(directory, filename)
+    assert calls == [1]
+    assert len(changed.datarows) == 4
@@ -0,0 +1,30 @@
+import random
+
+import pytest
+
+from benchmarks import generators as g
+from src.model.metrics import METRICS
+from src.model.parse_cache import CACHE_ENV
+from src.model.taxinvoice import read_invoices
+from src.model.taxinvoice_referrer import ReferrerTaxInvoice
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_metrics_counted_while_parsing_are_kept(tmp_path, monkeypatch, workers):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(CACHE_ENV, '0')
+    directory = str(tmp_path) + '/'
+    files = []
+    for index in range(4):
+        referrer_id = 3000 + index
+        rows = [g.referrer_row(random.Random(index), row) for row in range(5)]
+        files.append(g.referrer_filename(referrer_id, '2020-07', g.LOANKIT_PROCESS_ID))
+        with open(directory + files[-1], 'w') as file:
+            file.write(g.referrer_html(referrer_id, rows).replace('</td>', ''))  # Unclosed cells
+
+    METRICS.reset()
+    METRICS.count('html_fallbacks', 10)  # Counted before, in this process
+    invoices, = read_invoices(ReferrerTaxInvoice, [(directory, files)], workers)
+    assert len(invoices) == 4
+    assert METRICS.counters['html_fallbacks'] == 14
+    assert METRICS.counters['files_parsed'] == 4
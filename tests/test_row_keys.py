@@ -0,0 +1,34 @@
+import pickle
+
+from src.model.matcher import RowMatcher
+from src.model.metrics import METRICS
+from src.model.taxinvoice import row_key_full, NAN_KEY
+from src.model.taxinvoice_branch import TaxInvoiceDataRow
+
+NAN = float('nan')
+
+
+def section(*rows):
+    return {row.key_full: row for row in rows}
+
+
+def test_key_full_of_empty_amount_survives_pickling():
+    key = row_key_full('fee', NAN, 1.0)
+    assert key == row_key_full('fee', float('nan'), 1.0)
+    assert pickle.loads(pickle.dumps(key)) == key
+    assert key[2] == NAN_KEY
+
+
+def test_rows_with_empty_amount_pair_by_key_full_after_pickling():
+    # Each side is pickled on its own, as the parse cache and the worker processes do
+    loankit = pickle.loads(pickle.dumps(section(TaxInvoiceDataRow('Fee', NAN, 0, 0, 'none'))))
+    infynity = pickle.loads(pickle.dumps(section(
+        TaxInvoiceDataRow('Fee', 5.0, 0, 0, 'none'),
+        TaxInvoiceDataRow('Fee', NAN, 0, 0, 'none'),
+    )))
+
+    METRICS.reset()
+    row = next(iter(loankit.values()))
+    pair = RowMatcher(infynity).find(row)
+    assert pair is list(infynity.values())[1]
+    assert METRICS.counters == {'match_key_full': 1}